@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+EduAssist Backend Import-Time Report
+
+Imports main.py in a fresh interpreter with ``-X importtime`` and reports the
+total import time plus the slowest modules, so startup regressions show up
+before they reach production.
+
+Usage:
+    python import_report.py                      # print the report
+    python import_report.py --top 30             # show more modules
+    python import_report.py --save baseline.json # record a baseline
+    python import_report.py --compare baseline.json --max-regression 0.2
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.resolve()
+
+def measure(module: str = "main") -> dict:
+    """Return {module: (self_us, cumulative_us)} for a cold import of `module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def top_level_total(timings: dict) -> int:
+    """Wall time of the import is the cumulative time of the target module"""
+    return timings.get("main", (0, sum(self_us for self_us, _ in timings.values())))[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Report backend import time")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to show")
+    parser.add_argument("--save", type=Path, help="write the measured timings to this file")
+    parser.add_argument("--compare", type=Path, help="baseline file written by --save")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="fail when total import time grows by more than this fraction")
+    args = parser.parse_args()
+
+    timings = measure()
+    total_us = top_level_total(timings)
+
+    print(f"📦 Total import time of main.py: {total_us / 1000:.1f} ms ({len(timings)} modules)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    slowest = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    if args.save:
+        args.save.write_text(json.dumps({"total_us": total_us, "modules": timings}, indent=2))
+        print(f"\n💾 Saved baseline to {args.save}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        baseline_total = baseline["total_us"]
+        change = (total_us - baseline_total) / baseline_total if baseline_total else 0.0
+        print(f"\n📊 Baseline: {baseline_total / 1000:.1f} ms, change: {change:+.1%}")
+
+        new_modules = sorted(set(timings) - set(baseline["modules"]))
+        if new_modules:
+            print(f"🆕 Newly imported at startup: {', '.join(new_modules[:20])}")
+
+        if change > args.max_regression:
+            print(f"❌ Import time regressed by more than {args.max_regression:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
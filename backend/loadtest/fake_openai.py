@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI-compatible server for load tests.
+
+Answers /v1/chat/completions and /v1/audio/transcriptions with canned but
+well-formed content (quiz questions, flashcards and assignments as JSON
+arrays, prose otherwise) after a delay that models a real API: a fixed
+time to first token plus completion tokens / token rate. Point the backend
+at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+WORDS = ("learning process system data model function network energy cell theory "
+         "algorithm structure analysis method concept principle equation value "
+         "history culture language memory design testing result example").split()
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def _quiz_questions(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    questions = []
+    for i in range(count):
+        kind = ("multiple_choice", "true_false", "short_answer")[i % 3]
+        question = {
+            "id": f"q{i + 1}",
+            "type": kind,
+            "question": _sentence(rng, 10).rstrip(".") + "?",
+            "explanation": _sentence(rng),
+            "difficulty": rng.choice(["easy", "medium", "hard"]),
+            "points": 10,
+        }
+        if kind == "multiple_choice":
+            question["options"] = [_sentence(rng, 4) for _ in range(4)]
+            question["correctAnswer"] = rng.choice("ABCD")
+        elif kind == "true_false":
+            question["correctAnswer"] = rng.random() < 0.5
+        else:
+            question["correctAnswer"] = _sentence(rng, 15)
+        questions.append(question)
+    return questions
+
+def _assignment_questions(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    questions = _quiz_questions(rng, count)
+    for question in questions:
+        question.pop("points")
+        question["marks"] = {"multiple_choice": 2, "true_false": 1, "short_answer": 5}[question["type"]]
+        question["markingScheme"] = _sentence(rng)
+        question["learningObjective"] = _sentence(rng, 6)
+    return questions
+
+def _requested_count(prompt: str, default: int = 5) -> int:
+    for word in prompt.replace("\n", " ").split():
+        if word.isdigit():
+            return min(int(word), 50)
+    return default
+
+def build_reply(messages: List[Dict[str, Any]], rng: random.Random) -> str:
+    """Pick a reply shaped like what the calling service parses"""
+    prompt = str(messages[-1].get("content", "")) if messages else ""
+    lowered = prompt.lower()
+    count = _requested_count(prompt)
+    if "flashcards" in lowered:
+        cards = [{"front": _sentence(rng, 6), "back": _sentence(rng)} for _ in range(count)]
+        return json.dumps(cards)
+    if "quiz questions" in lowered:
+        return json.dumps(_quiz_questions(rng, count))
+    if "assignment with" in lowered:
+        return json.dumps(_assignment_questions(rng, count))
+    if "summary" in lowered or "summarize" in lowered:
+        points = "\n".join(f"- {_sentence(rng)}" for _ in range(6))
+        return f"## Summary\n\n{_sentence(rng, 30)}\n\n## Key Points\n\n{points}\n"
+    if "marking scheme" in lowered and "marks:" in lowered:
+        return f"MARKS: {rng.randint(2, 5)}/5 | FEEDBACK: {_sentence(rng)}"
+    return " ".join(_sentence(rng) for _ in range(rng.randint(3, 8)))
+
+def create_app(latency: float = 0.4, tokens_per_second: float = 60.0,
+               jitter: float = 0.2, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    rng = random.Random()
+    stats = {"chat": 0, "transcriptions": 0, "errors": 0}
+
+    async def _delay(completion_tokens: int):
+        base = latency + completion_tokens / tokens_per_second
+        await asyncio.sleep(max(0.0, base * (1 + rng.uniform(-jitter, jitter))))
+
+    def _maybe_fail():
+        if error_rate and rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": "1"},
+                content={"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error"}},
+            )
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        failure = _maybe_fail()
+        if failure:
+            return failure
+        stats["chat"] += 1
+        messages = body.get("messages", [])
+        reply = build_reply(messages, rng)
+        prompt_tokens = sum(_estimate_tokens(str(m.get("content", ""))) for m in messages)
+        completion_tokens = _estimate_tokens(reply)
+        await _delay(completion_tokens)
+        return {
+            "id": f"chatcmpl-{os.urandom(6).hex()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        form = await request.form()
+        upload = form.get("file")
+        size = len(await upload.read()) if upload is not None and hasattr(upload, "read") else 0
+        failure = _maybe_fail()
+        if failure:
+            return failure
+        stats["transcriptions"] += 1
+        text = " ".join(_sentence(rng) for _ in range(20))
+        # Roughly: a bigger file means more audio to transcribe
+        await _delay(_estimate_tokens(text) + size // 16000)
+        if form.get("response_format") == "text":
+            return PlainTextResponse(text)
+        return {"text": text}
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"},
+                                            {"id": "whisper-1", "object": "model"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.4, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="Completion token rate")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative random variation of delays")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 429")
+    args = parser.parse_args()
+
+    import uvicorn
+    print(f"🤖 Fake OpenAI on http://{args.host}:{args.port}/v1 "
+          f"(latency {args.latency}s, {args.tokens_per_second} tok/s, errors {args.error_rate:.0%})")
+    uvicorn.run(create_app(args.latency, args.tokens_per_second, args.jitter, args.error_rate),
+                host=args.host, port=args.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
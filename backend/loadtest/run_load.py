@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+EduAssist end-to-end load test.
+
+Starts the fake OpenAI server and the backend (unless --app-url points at a
+running one), optionally seeds a scratch storage root, then runs a
+closed-loop mix of student actions at each concurrency level and reports
+throughput, p50/p95/p99 latency and error rate per endpoint.
+
+    python loadtest/run_load.py --documents 10000 --concurrency 1,8,32 --duration 30
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+LOADTEST_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = LOADTEST_DIR.parent
+sys.path.insert(0, str(LOADTEST_DIR))
+
+from seed_storage import seed  # noqa: E402
+
+DEFAULT_MIX = "chat=35,quiz=15,flashcards=10,detail=15,browse=20,upload=5"
+QUESTIONS = [
+    "Can you summarize the main ideas?",
+    "Explain the key concepts in simple terms.",
+    "What should I focus on for the exam?",
+    "Give me an example of how this is applied.",
+    "What are the most important definitions here?",
+]
+
+class Recorder:
+    """Collects (endpoint, latency, ok) samples for one concurrency level"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[Tuple[float, bool]]] = {}
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def add(self, endpoint: str, seconds: float, ok: bool):
+        self.samples.setdefault(endpoint, []).append((seconds, ok))
+
+    def elapsed(self) -> float:
+        return max(self.finished - self.started, 1e-9)
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    # Rounded first so float error (0.95 * 100 = 95.00000000000001) cannot bump the rank
+    rank = math.ceil(round(fraction * len(sorted_values), 9))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+def summarize(recorder: Recorder) -> Dict[str, Dict[str, float]]:
+    elapsed = recorder.elapsed()
+    rows = {}
+    everything: List[Tuple[float, bool]] = []
+    for endpoint, samples in sorted(recorder.samples.items()):
+        everything.extend(samples)
+        rows[endpoint] = _stats(samples, elapsed)
+    rows["ALL"] = _stats(everything, elapsed)
+    return rows
+
+def _stats(samples: List[Tuple[float, bool]], elapsed: float) -> Dict[str, float]:
+    latencies = sorted(seconds for seconds, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        "requests": len(samples),
+        "rps": len(samples) / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1] if latencies else 0.0,
+        "errors": errors,
+        "errorRate": errors / len(samples) if samples else 0.0,
+    }
+
+def print_report(concurrency: int, rows: Dict[str, Dict[str, float]]):
+    print(f"\n📊 Concurrency {concurrency}")
+    header = f"{'endpoint':<46} {'reqs':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'err %':>7}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, row in rows.items():
+        print(f"{endpoint:<46} {row['requests']:>6} {row['rps']:>8.2f} {row['p50'] * 1000:>9.1f} "
+              f"{row['p95'] * 1000:>9.1f} {row['p99'] * 1000:>9.1f} {row['max'] * 1000:>9.1f} "
+              f"{row['errorRate'] * 100:>7.2f}")
+
+class Workload:
+    """The student actions a virtual user can take"""
+
+    def __init__(self, client: httpx.AsyncClient, documents: List[str], rng: random.Random):
+        self.client = client
+        self.documents = documents
+        self.rng = rng
+
+    async def call(self, recorder: Recorder, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        response = None
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        recorder.add(endpoint, time.perf_counter() - start, ok)
+        return response
+
+    def _document(self) -> str:
+        return self.rng.choice(self.documents) if self.documents else ""
+
+    async def chat(self, recorder: Recorder):
+        """Two turns in a fresh session about one document"""
+        session_id = None
+        selected = [self._document()] if self.documents else []
+        for _ in range(2):
+            payload = {"message": self.rng.choice(QUESTIONS), "selectedContent": selected}
+            if session_id:
+                payload["sessionId"] = session_id
+            response = await self.call(recorder, "POST /api/chatbot/message", "POST", "/api/chatbot/message", json=payload)
+            if response is None or response.status_code >= 400:
+                return
+            session_id = response.json().get("sessionId", session_id)
+
+    async def quiz(self, recorder: Recorder):
+        """Generate a quiz, open it and submit answers"""
+        response = await self.call(recorder, "POST /api/quiz/generate", "POST", "/api/quiz/generate", json={
+            "contentPath": self._document(),
+            "questionTypes": ["multiple_choice", "true_false", "short_answer"],
+            "questionCount": self.rng.choice([5, 10]),
+        })
+        if response is None or response.status_code >= 400:
+            return
+        quiz_id = response.json()["id"]
+        response = await self.call(recorder, "GET /api/quiz/{quiz_id}", "GET", f"/api/quiz/{quiz_id}")
+        if response is None or response.status_code >= 400:
+            return
+        answers = {}
+        for question in response.json().get("questions", []):
+            if question["type"] == "multiple_choice":
+                answers[question["id"]] = self.rng.randint(0, 3)
+            elif question["type"] == "true_false":
+                answers[question["id"]] = self.rng.random() < 0.5
+            else:
+                answers[question["id"]] = "It describes the main process and how the concept is applied"
+        await self.call(recorder, "POST /api/quiz/{quiz_id}/submit", "POST", f"/api/quiz/{quiz_id}/submit",
+                        json={"answers": answers})
+
+    async def flashcards(self, recorder: Recorder):
+        await self.call(recorder, "POST /api/flashcards/generate", "POST", "/api/flashcards/generate", json={
+            "contentPath": self._document(),
+            "cardCount": 10,
+            "cardType": self.rng.choice(["qa", "term", "concept"]),
+        })
+
+    async def detail(self, recorder: Recorder):
+        if self.documents:
+            await self.call(recorder, "GET /api/processed-content/{path}", "GET",
+                            f"/api/processed-content/{self._document()}")
+
+    async def browse(self, recorder: Recorder):
+        """The listing calls behind the library, quiz and chat pages"""
+        action = self.rng.choice(["processed", "quizzes", "sessions", "uploads"])
+        if action == "processed":
+            await self.call(recorder, "GET /api/processed-content", "GET", "/api/processed-content")
+        elif action == "quizzes":
+            await self.call(recorder, "GET /api/quizzes", "GET", "/api/quizzes")
+        elif action == "sessions":
+            await self.call(recorder, "GET /api/chatbot/sessions", "GET", "/api/chatbot/sessions")
+        else:
+            await self.call(recorder, "GET /api/uploaded-files", "GET", "/api/uploaded-files")
+
+    async def upload(self, recorder: Recorder):
+        """A short audio recording; transcription goes to the fake server"""
+        data = self.rng.randbytes(self.rng.randint(32_000, 256_000))
+        await self.call(recorder, "POST /api/upload", "POST", "/api/upload",
+                        files={"files": (f"lecture-{self.rng.randint(1, 10**6)}.mp3", data, "audio/mpeg")})
+
+def parse_mix(text: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("chat", "quiz", "flashcards", "detail", "browse", "upload"):
+            raise ValueError(f"Unknown scenario in mix: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+async def run_level(base_url: str, documents: List[str], mix: List[Tuple[str, float]], concurrency: int,
+                    duration: float, think_time: float, timeout: float, seed_value: int) -> Recorder:
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+
+        async def virtual_user(index: int):
+            rng = random.Random(seed_value * 1000 + index)
+            workload = Workload(client, documents, rng)
+            while time.perf_counter() < deadline:
+                scenario = rng.choices(names, weights)[0]
+                await getattr(workload, scenario)(recorder)
+                if think_time:
+                    await asyncio.sleep(rng.expovariate(1 / think_time))
+
+        recorder.started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+        recorder.finished = time.perf_counter()
+    return recorder
+
+def wait_for(url: str, process: Optional[subprocess.Popen], timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+def stop(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def load_documents(base_url: str) -> List[str]:
+    """Processed content paths the workload picks from"""
+    response = httpx.get(f"{base_url}/api/processed-content", timeout=300.0)
+    response.raise_for_status()
+    return [item["path"] for item in response.json().get("content", [])]
+
+def main():
+    parser = argparse.ArgumentParser(description="EduAssist end-to-end load test")
+    parser.add_argument("--app-url", help="Use an already running backend instead of starting one")
+    parser.add_argument("--storage", help="Storage root for the started backend (default: a temporary directory)")
+    parser.add_argument("--keep-storage", action="store_true", help="Do not delete a temporary storage root")
+    parser.add_argument("--documents", type=int, default=0, help="Seed this many processed documents first")
+    parser.add_argument("--sessions", type=int, default=None, help="Seeded chat sessions (default: documents / 5)")
+    parser.add_argument("--quizzes", type=int, default=None, help="Seeded quizzes (default: documents / 5)")
+    parser.add_argument("--workers", type=int, default=1, help="Backend worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fake-port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.4, help="Fake LLM time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="Fake LLM completion token rate")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake LLM calls that return 429")
+    parser.add_argument("--record", help="Record the backend's LLM calls to this JSONL file")
+    parser.add_argument("--replay", help="Replay LLM calls from this recording instead of the fake server")
+    parser.add_argument("--replay-latency-scale", type=float, default=1.0,
+                        help="Multiply recorded LLM latencies (0 = no delay)")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated virtual user counts")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per concurrency level")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between actions (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (s)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights, e.g. chat=50,browse=50")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--log", default=str(Path(tempfile.gettempdir()) / "eduassist-load.log"),
+                        help="Output of the started backend and fake server")
+    args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    processes: List[subprocess.Popen] = []
+    temporary_storage = None
+    log_file = None
+
+    try:
+        if args.app_url:
+            base_url = args.app_url.rstrip("/")
+        else:
+            if args.storage:
+                storage = Path(args.storage).resolve()
+            else:
+                storage = temporary_storage = Path(tempfile.mkdtemp(prefix="eduassist-load-"))
+            if args.documents:
+                seed(storage, args.documents,
+                     args.sessions if args.sessions is not None else args.documents // 5,
+                     args.quizzes if args.quizzes is not None else args.documents // 5,
+                     seed_value=args.seed)
+
+            log_file = open(args.log, 'w', encoding='utf-8')
+            env = dict(os.environ,
+                       STORAGE_ROOT=str(storage),
+                       OPENAI_API_KEY="sk-loadtest",
+                       WEB_CONCURRENCY=str(args.workers))
+            if args.replay:
+                # Fully offline: recorded responses and timings, no fake server
+                env.update(LLM_MODE="replay", LLM_RECORDING_PATH=str(Path(args.replay).resolve()),
+                           LLM_REPLAY_LATENCY_SCALE=str(args.replay_latency_scale))
+            else:
+                fake = subprocess.Popen([
+                    sys.executable, str(LOADTEST_DIR / "fake_openai.py"),
+                    "--port", str(args.fake_port), "--latency", str(args.latency),
+                    "--tokens-per-second", str(args.tokens_per_second), "--error-rate", str(args.error_rate),
+                ], stdout=log_file, stderr=subprocess.STDOUT)
+                processes.append(fake)
+                wait_for(f"http://127.0.0.1:{args.fake_port}/v1/models", fake)
+                env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.fake_port}/v1"
+                if args.record:
+                    env.update(LLM_MODE="record", LLM_RECORDING_PATH=str(Path(args.record).resolve()))
+            app = subprocess.Popen([
+                sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+                "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+            ], cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+            processes.append(app)
+            base_url = f"http://127.0.0.1:{args.port}"
+            wait_for(f"{base_url}/api/health", app)
+            print(f"🚀 Backend on {base_url} ({args.workers} worker(s)), storage {storage}, log {args.log}")
+
+        documents = load_documents(base_url)
+        print(f"📚 {len(documents)} processed documents available")
+
+        results = {}
+        for concurrency in levels:
+            print(f"⏱️  Running {concurrency} virtual user(s) for {args.duration:.0f}s...")
+            recorder = asyncio.run(run_level(base_url, documents, mix, concurrency, args.duration,
+                                             args.think_time, args.timeout, args.seed))
+            rows = summarize(recorder)
+            print_report(concurrency, rows)
+            results[str(concurrency)] = rows
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({"mix": dict(mix), "duration": args.duration, "documents": len(documents),
+                           "workers": args.workers, "levels": results}, f, indent=2)
+            print(f"\n💾 Results written to {args.json}")
+    finally:
+        for process in reversed(processes):
+            stop(process)
+        if log_file:
+            log_file.close()
+        if temporary_storage and not args.keep_storage:
+            shutil.rmtree(temporary_storage, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Synthetic storage generator for load tests.
+
+Fills a storage root with the same files the backend writes (processed
+documents with summaries and metadata, upload records, vector index
+entries, chat sessions, quizzes and quiz results) so listing, retrieval and
+grading paths can be measured at realistic scale. Output is deterministic
+for a given --seed.
+"""
+
+import sys
+import json
+import uuid
+import random
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.chunking import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS  # noqa: E402
+from services.vector_search import index_entry, index_file_name  # noqa: E402
+
+TOPICS = {
+    "biology": "cell membrane protein enzyme photosynthesis respiration mitosis gene chromosome evolution ecosystem organism",
+    "physics": "force energy momentum velocity acceleration wave frequency electric field gravity friction quantum",
+    "history": "empire revolution treaty dynasty colony parliament constitution trade migration war reform",
+    "computing": "algorithm data structure compiler network database recursion complexity memory process thread cache",
+    "economics": "market supply demand inflation interest price labour capital growth policy tax",
+}
+FILLER = "the a of and to in is that for with as on by this are from which can be it an".split()
+FILE_TYPES = [("pdf", ".pdf", 0.6), ("video", ".mp4", 0.25), ("audio", ".mp3", 0.15)]
+
+def _paragraph(rng: random.Random, vocabulary: List[str], words: int) -> str:
+    out = []
+    for i in range(words):
+        out.append(rng.choice(vocabulary) if rng.random() < 0.45 else rng.choice(FILLER))
+        if i % 14 == 13:
+            out[-1] += "."
+    text = " ".join(out)
+    return text[0].upper() + text[1:] + "."
+
+def _document(rng: random.Random, topic: str, words: int) -> str:
+    vocabulary = TOPICS[topic].split()
+    paragraphs = []
+    remaining = words
+    while remaining > 0:
+        size = min(remaining, rng.randint(60, 140))
+        paragraphs.append(_paragraph(rng, vocabulary, size))
+        remaining -= size
+    return "\n\n".join(paragraphs)
+
+def _summary(rng: random.Random, topic: str, name: str) -> str:
+    vocabulary = TOPICS[topic].split()
+    points = "\n".join(f"- **{rng.choice(vocabulary).title()}**: {_paragraph(rng, vocabulary, 14)}" for _ in range(5))
+    return f"# Summary of {name}\n\n## Overview\n{_paragraph(rng, vocabulary, 40)}\n\n## Key Points\n{points}\n"
+
+def _write_json(path: Path, data: Any):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+def _pick_type(rng: random.Random):
+    roll = rng.random()
+    for file_type, extension, share in FILE_TYPES:
+        if roll < share:
+            return file_type, extension
+        roll -= share
+    return FILE_TYPES[0][:2]
+
+def seed_documents(root: Path, rng: random.Random, count: int, words: int, days: int) -> List[Dict[str, str]]:
+    """Processed documents plus their upload records and vector index entries"""
+    documents = []
+    vector_dir = root / "vector-search"
+    vector_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now()
+    for i in range(count):
+        file_type, extension = _pick_type(rng)
+        topic = rng.choice(list(TOPICS))
+        file_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        created = now - timedelta(days=rng.randint(0, days), seconds=rng.randint(0, 86400))
+        date_path = created.strftime("%Y/%m/%d")
+        name = f"{topic.title()} lecture {i + 1}{extension}"
+
+        upload_dir = root / "uploads" / file_type / date_path
+        processed_dir = root / "processed" / file_type / date_path
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        processed_dir.mkdir(parents=True, exist_ok=True)
+
+        # Upload record; the original media itself is a small placeholder
+        upload_path = upload_dir / f"{file_id}{extension}"
+        upload_path.write_bytes(b"\0" * 64)
+        _write_json(upload_path.with_suffix(f"{extension}.metadata.json"), {
+            "originalName": name,
+            "fileId": file_id,
+            "fileType": file_type,
+            "uploadDate": created.isoformat(),
+            "size": rng.randint(200_000, 80_000_000),
+            "path": str(upload_path.relative_to(root)).replace('\\', '/'),
+        })
+
+        text = _document(rng, topic, rng.randint(words // 2, words * 3 // 2))
+        summary = _summary(rng, topic, name)
+        text_path = processed_dir / f"{file_id}.txt"
+        text_path.write_text(text, encoding='utf-8')
+        text_path.with_suffix('.summary.md').write_text(summary, encoding='utf-8')
+        length_key = "textLength" if file_type == "pdf" else "transcriptLength"
+        _write_json(text_path.with_suffix('.metadata.json'), {
+            "originalName": name,
+            "fileId": file_id,
+            "fileType": file_type,
+            "processedDate": created.isoformat(),
+            length_key: len(text),
+            "summaryLength": len(summary),
+            "status": "completed",
+        })
+
+        relative = str(text_path.relative_to(root)).replace('\\', '/')
+        entry = index_entry(relative, name, text, DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS)
+        entry["timestamp"] = str(created)
+        _write_json(vector_dir / index_file_name(relative), entry)
+        documents.append({"path": relative, "topic": topic, "name": name})
+
+        if (i + 1) % 1000 == 0:
+            print(f"   📄 {i + 1}/{count} documents")
+    return documents
+
+def seed_sessions(root: Path, rng: random.Random, count: int, documents: List[Dict[str, str]], days: int):
+    chatbot_dir = root / "chatbot"
+    chatbot_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now()
+    for _ in range(count):
+        session_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        created = now - timedelta(days=rng.randint(0, days), seconds=rng.randint(0, 86400))
+        messages = []
+        for turn in range(rng.randint(1, 12)):
+            document = rng.choice(documents) if documents else None
+            vocabulary = TOPICS[document["topic"] if document else "computing"].split()
+            at = (created + timedelta(minutes=turn * 2)).isoformat()
+            messages.append({"role": "user", "content": f"Can you explain {rng.choice(vocabulary)}?", "timestamp": at})
+            messages.append({
+                "role": "assistant",
+                "content": _paragraph(rng, vocabulary, rng.randint(40, 160)),
+                "timestamp": at,
+                "sources": [{"title": document["name"], "path": document["path"]}] if document else [],
+            })
+        _write_json(chatbot_dir / f"{session_id}.json", {
+            "id": session_id,
+            "title": f"Study Session {created.strftime('%Y-%m-%d %H:%M')}",
+            "createdDate": created.isoformat(),
+            "lastActivity": messages[-1]["timestamp"],
+            "messages": messages,
+            "messageCount": len(messages),
+        })
+
+def _question(rng: random.Random, vocabulary: List[str], index: int) -> Dict[str, Any]:
+    kind = ("multiple_choice", "true_false", "short_answer")[index % 3]
+    question = {
+        "id": f"q{index + 1}",
+        "type": kind,
+        "question": f"Which statement best describes {rng.choice(vocabulary)}?",
+        "explanation": _paragraph(rng, vocabulary, 20),
+        "difficulty": rng.choice(["easy", "medium", "hard"]),
+        "points": {"multiple_choice": 10, "true_false": 5, "short_answer": 15}[kind],
+    }
+    if kind == "multiple_choice":
+        question["options"] = [_paragraph(rng, vocabulary, 5) for _ in range(4)]
+        question["correctAnswer"] = rng.randint(0, 3)
+    elif kind == "true_false":
+        question["correctAnswer"] = rng.random() < 0.5
+    else:
+        question["correctAnswer"] = _paragraph(rng, vocabulary, 18)
+    return question
+
+def seed_quizzes(root: Path, rng: random.Random, count: int, results_per_quiz: int,
+                 documents: List[Dict[str, str]], days: int):
+    quizzes_dir = root / "quizzes"
+    quizzes_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now()
+    for _ in range(count):
+        quiz_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        document = rng.choice(documents) if documents else {"path": "", "topic": "computing", "name": "Sample"}
+        vocabulary = TOPICS[document["topic"]].split()
+        created = now - timedelta(days=rng.randint(0, days), seconds=rng.randint(0, 86400))
+        questions = [_question(rng, vocabulary, i) for i in range(rng.choice([5, 10, 15]))]
+        _write_json(quizzes_dir / f"{quiz_id}.json", {
+            "id": quiz_id,
+            "title": f"Quiz from {Path(document['path']).stem}",
+            "contentPath": document["path"],
+            "createdDate": created.isoformat(),
+            "questionTypes": ["multiple_choice", "true_false", "short_answer"],
+            "totalQuestions": len(questions),
+            "questions": questions,
+            "timeLimit": len(questions) * 2,
+            "status": "active",
+        })
+
+        for _ in range(rng.randint(0, results_per_quiz * 2)):
+            result_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            results = []
+            for question in questions:
+                correct = rng.random() < 0.65
+                results.append({
+                    "questionId": question["id"],
+                    "question": question["question"],
+                    "userAnswer": question["correctAnswer"] if correct else None,
+                    "correctAnswer": question["correctAnswer"],
+                    "isCorrect": correct,
+                    "explanation": question["explanation"],
+                    "points": question["points"] if correct else 0,
+                    "maxPoints": question["points"],
+                })
+            total = sum(r["maxPoints"] for r in results)
+            earned = sum(r["points"] for r in results)
+            percentage = earned / total * 100 if total else 0
+            submitted = created + timedelta(hours=rng.randint(1, 240))
+            # Same layout as QuizRepository: results/<quiz id>/<submission time>_<result id>.json
+            result_dir = quizzes_dir / "results" / quiz_id
+            result_dir.mkdir(parents=True, exist_ok=True)
+            _write_json(result_dir / f"{submitted.strftime('%Y%m%dT%H%M%S%f')}_{result_id}.json", {
+                "id": result_id,
+                "quizId": quiz_id,
+                "submissionDate": submitted.isoformat(),
+                "totalQuestions": len(questions),
+                "correctAnswers": sum(1 for r in results if r["isCorrect"]),
+                "totalPoints": total,
+                "earnedPoints": earned,
+                "scorePercentage": round(percentage, 2),
+                "grade": "A" if percentage >= 90 else "B" if percentage >= 80 else "C" if percentage >= 70 else "D" if percentage >= 60 else "F",
+                "results": results,
+            })
+
+def seed(root: Path, documents: int = 10000, sessions: int = 2000, quizzes: int = 2000,
+         results_per_quiz: int = 3, words: int = 800, days: int = 120, seed_value: int = 42) -> List[Dict[str, str]]:
+    """Populate a storage root and return the generated documents"""
+    rng = random.Random(seed_value)
+    root = Path(root)
+    print(f"🌱 Seeding {root}: {documents} documents, {sessions} sessions, {quizzes} quizzes")
+    generated = seed_documents(root, rng, documents, words, days)
+    print(f"   💬 {sessions} chat sessions")
+    seed_sessions(root, rng, sessions, generated, days)
+    print(f"   📝 {quizzes} quizzes (~{results_per_quiz} results each)")
+    seed_quizzes(root, rng, quizzes, results_per_quiz, generated, days)
+    print("✅ Seeding complete")
+    return generated
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic EduAssist storage for load tests")
+    parser.add_argument("root", help="Storage root to fill (use a scratch directory, not real data)")
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--quizzes", type=int, default=2000)
+    parser.add_argument("--results-per-quiz", type=int, default=3, help="Average submissions per quiz")
+    parser.add_argument("--words", type=int, default=800, help="Average words per document")
+    parser.add_argument("--days", type=int, default=120, help="Spread creation dates over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    if (root / "processed").exists() and any((root / "processed").iterdir()):
+        print(f"❌ {root} already has processed content; seed an empty directory")
+        sys.exit(1)
+    seed(root, args.documents, args.sessions, args.quizzes, args.results_per_quiz,
+         args.words, args.days, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,144 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Request, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, FileResponse, PlainTextResponse
+from fastapi.routing import APIRoute
+from fastapi.encoders import jsonable_encoder
+from fastapi.datastructures import DefaultPlaceholder
+from starlette.routing import Match
+from contextlib import asynccontextmanager, suppress
+from functools import lru_cache, wraps
+import inspect
 import uvicorn
-import os
-import json
 import uuid
-from datetime import datetime
+import errno
+import time
+import asyncio
+from datetime import date, datetime
 from pathlib import Path
-import shutil
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict, Set, Tuple
 import logging
-from dotenv import load_dotenv
-import openai
 
-# Load environment variables
-load_dotenv()
+from services.settings import get_settings
+from services.storage import read_json, async_read_text, async_write_bytes, async_write_json
+from services.metrics import (
+    HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, REQUESTS_CANCELLED, observe_stage, render_prometheus,
+    write_snapshot, remove_snapshot
+)
+from services.deadlines import DeadlineExceeded, deadline
+from services.tracing import start_trace, span, TraceLog, RouteProfiler
+from services.single_flight import SingleFlight, generation_key, normalize_content_path
+from services.content_processor import ContentProcessor
+from services.media import AudioExtractor
+from services.transcription import TranscriptionRouter
+from services.extractive import extract_path
+from services.resumable_uploads import ResumableUploads, UploadConflict, UploadNotFound, upload_file_type
+from services.quiz_generator import QuizGenerator
+from services.question_bank import question_bank_path, difficulty_weights
+from services.flashcard_generator import FlashcardGenerator, CARD_TYPES
+from services.spaced_repetition import ReviewStore
+from services.chatbot_engine import ChatbotEngine
+from services.vector_search import VectorSearchService, SearchFilters, FILE_TYPES
+from services.index_builder import IndexBuilder
+from services.teacher_services import TeacherServices
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Loads .env once for the whole process
+settings = get_settings()
+
+# Storage paths
+STORAGE_ROOT = settings.storage_root
+UPLOADS_DIR = STORAGE_ROOT / "uploads"
+PROCESSED_DIR = STORAGE_ROOT / "processed"
+QUIZZES_DIR = STORAGE_ROOT / "quizzes"
+CHATBOT_DIR = STORAGE_ROOT / "chatbot"
+VECTOR_DIR = STORAGE_ROOT / "vector-search"
+METRICS_DIR = STORAGE_ROOT / "metrics"
+PROFILES_DIR = STORAGE_ROOT / "profiles"
+
+trace_log = TraceLog(settings.trace_log_path, settings.trace_sample_rate) if settings.trace_log_path else None
+route_profiler = RouteProfiler(PROFILES_DIR)
+# Admin jobs started by this worker, referenced until they finish
+background_tasks: Set[asyncio.Task] = set()
+
+# With several workers each process publishes its metrics for /metrics to merge
+MULTI_WORKER = settings.workers > 1
+METRICS_SNAPSHOT_INTERVAL = 5
+
+async def _publish_metrics_snapshots():
+    while True:
+        await asyncio.sleep(METRICS_SNAPSHOT_INTERVAL)
+        try:
+            await asyncio.to_thread(write_snapshot, METRICS_DIR)
+        except OSError as e:
+            logger.warning(f"Could not publish metrics snapshot: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Ensure directories exist
+    for directory in [UPLOADS_DIR, PROCESSED_DIR, QUIZZES_DIR, CHATBOT_DIR, VECTOR_DIR, METRICS_DIR]:
+        directory.mkdir(parents=True, exist_ok=True)
+    
+    publisher = asyncio.create_task(_publish_metrics_snapshots()) if MULTI_WORKER else None
+    yield
+    # Reviews still waiting for the next batched write
+    await get_review_store().close()
+    # Local transcription processes, if any were started
+    get_transcription_router().close()
+    if publisher:
+        publisher.cancel()
+        with suppress(asyncio.CancelledError):
+            await publisher
+        remove_snapshot(METRICS_DIR)
+
+try:
+    import orjson  # noqa: F401 - needed by ORJSONResponse
+    JSON_RESPONSE_CLASS = ORJSONResponse
+except ImportError:
+    JSON_RESPONSE_CLASS = JSONResponse
+
+class DirectJSONRoute(APIRoute):
+    """Route that serializes plain dict/list results straight to the response.
+
+    FastAPI otherwise walks every result through jsonable_encoder before
+    serializing it, which costs more than the serialization itself for large
+    sessions, quizzes and transcripts. Results orjson cannot handle still go
+    through jsonable_encoder. Only endpoints without a response model or
+    return annotation are affected.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        if isinstance(response_model, DefaultPlaceholder):
+            response_model = response_model.value
+        if (inspect.iscoroutinefunction(endpoint) and response_model is None
+                and inspect.signature(endpoint).return_annotation is inspect.Signature.empty):
+            endpoint = _direct_json(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+def _direct_json(endpoint):
+    @wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        if not isinstance(result, (dict, list)):
+            return result
+        try:
+            return JSON_RESPONSE_CLASS(result)
+        except TypeError:
+            return JSON_RESPONSE_CLASS(jsonable_encoder(result))
+    return wrapper
+
 app = FastAPI(
     title="EduAssist API",
     description="AI-Powered Educational Content Processor with Real-time APIs",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=JSON_RESPONSE_CLASS
 )
+app.router.route_class = DirectJSONRoute
 
 # CORS middleware
 app.add_middleware(
@@ -36,34 +149,180 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files
-app.mount("/storage", StaticFiles(directory="../storage"), name="storage")
+# Mount static files (the directory is created on startup)
+app.mount("/storage", StaticFiles(directory=STORAGE_ROOT, check_dir=False), name="storage")
 
-# Storage paths
-STORAGE_ROOT = Path("../storage")
-UPLOADS_DIR = STORAGE_ROOT / "uploads"
-PROCESSED_DIR = STORAGE_ROOT / "processed"
-QUIZZES_DIR = STORAGE_ROOT / "quizzes"
-CHATBOT_DIR = STORAGE_ROOT / "chatbot"
-VECTOR_DIR = STORAGE_ROOT / "vector-search"
+def _route_template(scope) -> str:
+    """Route path template (e.g. /api/quiz/{quiz_id}) to keep metric labels bounded"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """Metrics, span tracing (Server-Timing header) and on-demand profiling"""
+    method = request.method
+    route = _route_template(request.scope)
+    HTTP_IN_FLIGHT.inc(method=method, route=route)
+    trace = start_trace(route, method)
+    status = "500"
+    try:
+        if await route_profiler.claim(route):
+            response = await route_profiler.profile(route, lambda: call_next(request))
+        else:
+            response = await call_next(request)
+        status = str(response.status_code)
+        trace.finish()
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers["X-Trace-Id"] = trace.id
+        return response
+    except asyncio.CancelledError:
+        # Client went away (nginx's "client closed request")
+        status = "499"
+        raise
+    finally:
+        trace.finish()
+        HTTP_IN_FLIGHT.dec(method=method, route=route)
+        HTTP_REQUEST_SECONDS.observe(trace.duration, method=method, route=route, status=status)
+        if trace_log:
+            trace_log.record(trace)
 
-# Ensure directories exist
-for directory in [UPLOADS_DIR, PROCESSED_DIR, QUIZZES_DIR, CHATBOT_DIR, VECTOR_DIR]:
-    directory.mkdir(parents=True, exist_ok=True)
+def _request_timeout(scope) -> Optional[float]:
+    """Seconds the client allows (X-Request-Timeout), capped by REQUEST_TIMEOUT_SECONDS"""
+    limit = settings.request_timeout or None
+    for name, value in scope["headers"]:
+        if name == b"x-request-timeout":
+            try:
+                asked = float(value)
+            except ValueError:
+                break
+            if asked > 0:
+                limit = min(asked, limit) if limit else asked
+            break
+    return limit
 
-# Import services
-from services.content_processor import ContentProcessor
-from services.quiz_generator import QuizGenerator
-from services.chatbot_engine import ChatbotEngine
-from services.vector_search import VectorSearchService
-from services.teacher_services import TeacherServices
+class CancelOnDisconnect:
+    """Runs each request under its deadline and cancels it once the client disconnects.
+
+    Cancellation reaches whatever the handler is awaiting: a queued or
+    in-flight LLM call is abandoned instead of finishing for nobody. Routes
+    in `exempt` (path templates, matched exactly) get neither; they are the
+    ones that process uploads, whose results are kept for later.
+    """
+
+    def __init__(self, app, exempt: Tuple[str, ...] = ()):
+        self.app = app
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _route_template(scope) in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        with deadline(_request_timeout(scope)):
+            await self._cancellable(scope, receive, send)
+
+    async def _cancellable(self, scope, receive, send):
+        # Client messages reach the app through a one-slot queue, so watching
+        # for a disconnect never reads a request body ahead into memory
+        messages: asyncio.Queue = asyncio.Queue(maxsize=1)
+        responded = disconnected = False
+
+        async def send_through(message):
+            nonlocal responded
+            # Set first: once the last body part is out, the server reports a disconnect
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                responded = True
+            await send(message)
 
-# Initialize services
-content_processor = ContentProcessor()
-quiz_generator = QuizGenerator()
-chatbot_engine = ChatbotEngine()
-vector_search = VectorSearchService()
-teacher_services = TeacherServices()
+        handler = asyncio.create_task(self.app(scope, messages.get, send_through))
+
+        async def listen():
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect" and not (responded or handler.done()):
+                    disconnected = True
+                    route = _route_template(scope)
+                    REQUESTS_CANCELLED.inc(route=route)
+                    logger.info(f"Client disconnected, cancelling {scope['method']} {route}")
+                    handler.cancel()
+                    return
+                await messages.put(message)
+
+        listener = asyncio.create_task(listen())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not disconnected:
+                raise
+        finally:
+            listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await listener
+
+# Outermost, so the instrumentation above sees cancelled requests too
+app.add_middleware(CancelOnDisconnect, exempt=("/api/upload", "/api/uploads/{upload_id}/finalize"))
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints need ADMIN_TOKEN when set, and are off in production without it"""
+    if settings.admin_token:
+        if x_admin_token != settings.admin_token:
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+    elif settings.environment == "production":
+        raise HTTPException(status_code=403, detail="Admin endpoints require ADMIN_TOKEN")
+
+# Services are built on first use, so importing this module stays cheap
+@lru_cache(maxsize=None)
+def get_content_processor() -> ContentProcessor:
+    return ContentProcessor(settings, flashcard_generator=get_flashcard_generator(),
+                            quiz_generator=get_quiz_generator(), audio_extractor=get_audio_extractor(),
+                            transcriber=get_transcription_router())
+
+@lru_cache(maxsize=None)
+def get_audio_extractor() -> AudioExtractor:
+    return AudioExtractor(settings)
+
+@lru_cache(maxsize=None)
+def get_transcription_router() -> TranscriptionRouter:
+    return TranscriptionRouter(settings)
+
+@lru_cache(maxsize=None)
+def get_resumable_uploads() -> ResumableUploads:
+    return ResumableUploads(settings)
+
+@lru_cache(maxsize=None)
+def get_quiz_generator() -> QuizGenerator:
+    return QuizGenerator(settings)
+
+@lru_cache(maxsize=None)
+def get_vector_search() -> VectorSearchService:
+    return VectorSearchService(settings)
+
+@lru_cache(maxsize=None)
+def get_index_builder() -> IndexBuilder:
+    return IndexBuilder(settings)
+
+@lru_cache(maxsize=None)
+def get_chatbot_engine() -> ChatbotEngine:
+    return ChatbotEngine(settings, vector_search=get_vector_search())
+
+@lru_cache(maxsize=None)
+def get_teacher_services() -> TeacherServices:
+    return TeacherServices(settings)
+
+@lru_cache(maxsize=None)
+def get_flashcard_generator() -> FlashcardGenerator:
+    return FlashcardGenerator(settings)
+
+@lru_cache(maxsize=None)
+def get_review_store() -> ReviewStore:
+    return ReviewStore(settings)
+
+@lru_cache(maxsize=None)
+def get_single_flight() -> SingleFlight:
+    return SingleFlight(settings)
 
 @app.get("/")
 async def root():
@@ -73,9 +332,101 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for the API, processing pipeline, LLM calls and storage"""
+    body = render_prometheus(METRICS_DIR if MULTI_WORKER else None)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Admin endpoints
+@app.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def arm_profiler(request: dict):
+    """Profile the next N requests on a route (e.g. /api/chatbot/message)"""
+    try:
+        route = request.get("route", "")
+        count = int(request.get("count", 1))
+        
+        known_routes = {getattr(r, "path", None) for r in app.router.routes}
+        if route not in known_routes:
+            raise HTTPException(status_code=400, detail=f"Unknown route: {route}")
+        
+        if count > 0:
+            await asyncio.to_thread(route_profiler.arm, route, count)
+        else:
+            await asyncio.to_thread(route_profiler.disarm, route)
+        return {"route": route, "armed": route_profiler.armed}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error arming profiler: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/search-index/rebuild", dependencies=[Depends(require_admin)])
+async def rebuild_search_index(request: dict, index_builder: IndexBuilder = Depends(get_index_builder)):
+    """Start rebuilding the search index from processed documents (resumes an interrupted rebuild)"""
+    try:
+        workers = request.get("workers")
+        fresh = bool(request.get("fresh", False))
+        if workers is not None and int(workers) < 1:
+            raise HTTPException(status_code=400, detail="workers must be at least 1")
+        
+        if await asyncio.to_thread(index_builder.is_running):
+            raise HTTPException(status_code=409, detail="A search index rebuild is already running")
+        task = asyncio.create_task(_run_index_rebuild(index_builder, workers and int(workers), fresh))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        return {"status": "started"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting search index rebuild: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _run_index_rebuild(index_builder: IndexBuilder, workers: Optional[int], fresh: bool):
+    try:
+        await asyncio.to_thread(index_builder.rebuild, workers, fresh)
+    except BlockingIOError:
+        logger.warning("Search index rebuild not started: another one is running")
+    except Exception as e:
+        logger.error(f"Search index rebuild failed: {e}")
+
+@app.get("/api/admin/search-index", dependencies=[Depends(require_admin)])
+async def get_search_index_status(index_builder: IndexBuilder = Depends(get_index_builder),
+                                  vector_search: VectorSearchService = Depends(get_vector_search)):
+    """Live index size and generation, rebuild progress and this worker's result cache"""
+    try:
+        status = await asyncio.to_thread(index_builder.status)
+        return {**status, "cache": vector_search.cache.stats()}
+    except Exception as e:
+        logger.error(f"Error reading search index status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+async def get_profiles():
+    """List recorded profiles and routes still armed"""
+    try:
+        profiles = await asyncio.to_thread(route_profiler.list_profiles)
+        return {"armed": route_profiler.armed, "profiles": profiles}
+    except Exception as e:
+        logger.error(f"Error listing profiles: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/profiles/{name}", dependencies=[Depends(require_admin)])
+async def get_profile(name: str, format: str = "text"):
+    """Get a profile as a text report or as the raw .prof file (format=prof)"""
+    report_path = PROFILES_DIR / f"{Path(name).name}.txt"
+    if not report_path.exists():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "prof":
+        return FileResponse(report_path.with_suffix(".prof"), media_type="application/octet-stream",
+                            filename=f"{report_path.stem}.prof")
+    return PlainTextResponse(await async_read_text(report_path))
+
 # Content endpoints
 @app.post("/api/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
+async def upload_files(files: List[UploadFile] = File(...),
+                       content_processor: ContentProcessor = Depends(get_content_processor),
+                       vector_search: VectorSearchService = Depends(get_vector_search)):
     """Upload and process files with real-time AI"""
     try:
         results = []
@@ -89,11 +440,8 @@ async def upload_files(files: List[UploadFile] = File(...)):
             file_extension = Path(file.filename).suffix.lower()
             
             # Determine file type and directory
-            if file_extension == '.pdf':
-                file_type = 'pdf'
-                upload_dir = UPLOADS_DIR / file_type
-            elif file_extension in ['.mp4', '.avi', '.mov', '.wmv', '.mp3', '.wav', '.m4a']:
-                file_type = 'video' if file_extension in ['.mp4', '.avi', '.mov', '.wmv'] else 'audio'
+            file_type = upload_file_type(file.filename)
+            if file_type is not None:
                 upload_dir = UPLOADS_DIR / file_type
             else:
                 results.append({
@@ -110,9 +458,8 @@ async def upload_files(files: List[UploadFile] = File(...)):
             
             # Save file
             file_path = full_upload_dir / f"{file_id}{file_extension}"
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
+            content = await file.read()
+            await async_write_bytes(file_path, content)
             
             # Save metadata
             metadata = {
@@ -125,31 +472,10 @@ async def upload_files(files: List[UploadFile] = File(...)):
             }
             
             metadata_path = file_path.with_suffix(f"{file_extension}.metadata.json")
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            await async_write_json(metadata_path, metadata)
             
-            # Process file with real-time AI
-            try:
-                await content_processor.process_file(file_path, file.filename)
-                
-                # Add to vector search
-                processed_path = PROCESSED_DIR / file_type / date_path / f"{file_id}.txt"
-                if processed_path.exists():
-                    vector_search.add_content(str(processed_path), "", file.filename)
-                
-                results.append({
-                    "filename": file.filename,
-                    "status": "processed",
-                    "fileId": file_id,
-                    "message": "File uploaded and processed successfully"
-                })
-            except Exception as e:
-                logger.error(f"Error processing file {file.filename}: {e}")
-                results.append({
-                    "filename": file.filename,
-                    "status": "error",
-                    "message": f"Processing failed: {str(e)}"
-                })
+            results.append(await _process_upload(file_path, file.filename, file_type, file_id,
+                                                 content_processor, vector_search))
         
         # Format response to match frontend expectations
         success_count = len([r for r in results if r["status"] == "processed"])
@@ -164,65 +490,189 @@ async def upload_files(files: List[UploadFile] = File(...)):
         logger.error(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _process_upload(file_path: Path, filename: str, file_type: str, file_id: str,
+                          content_processor: ContentProcessor, vector_search: VectorSearchService) -> Dict[str, Any]:
+    """Process a saved upload with real-time AI and index its text; returns its result entry"""
+    try:
+        with span("process", file_type=file_type):
+            processed = await content_processor.process_file(file_path, filename)
+        
+        # Add to vector search
+        processed_path = STORAGE_ROOT / (processed.get("textFile") or processed.get("transcriptFile"))
+        if processed_path.exists():
+            with observe_stage("index", file_type):
+                text = await async_read_text(processed_path)
+                await asyncio.to_thread(vector_search.add_content, str(processed_path), text, filename)
+        
+        return {
+            "filename": filename,
+            "status": "processed",
+            "fileId": file_id,
+            "message": "File uploaded and processed successfully"
+        }
+    except Exception as e:
+        logger.error(f"Error processing file {filename}: {e}")
+        return {
+            "filename": filename,
+            "status": "error",
+            "message": f"Processing failed: {str(e)}"
+        }
+
+# Resumable uploads: create, PUT chunks (any order, in parallel), check progress, finalize
+@app.post("/api/uploads")
+async def create_upload(request: dict, uploads: ResumableUploads = Depends(get_resumable_uploads)):
+    """Start a resumable upload; the response gives the chunk size and count"""
+    try:
+        size = request.get("size")
+        if not isinstance(size, int):
+            raise HTTPException(status_code=400, detail="size (bytes) is required")
+        return await asyncio.to_thread(uploads.create, request.get("filename", ""), size, request.get("sha256"))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise HTTPException(status_code=507, detail="Not enough storage space for this upload")
+        logger.error(f"Error creating upload: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str, uploads: ResumableUploads = Depends(get_resumable_uploads)):
+    """Progress of a resumable upload: committed offset and the chunks still missing"""
+    try:
+        return await asyncio.to_thread(uploads.status, upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@app.put("/api/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request,
+                           x_chunk_sha256: Optional[str] = Header(None),
+                           uploads: ResumableUploads = Depends(get_resumable_uploads)):
+    """Store chunk `index` (raw body); X-Chunk-SHA256 is the hex SHA-256 of the body"""
+    try:
+        if not x_chunk_sha256:
+            raise HTTPException(status_code=400, detail="X-Chunk-SHA256 header is required")
+        expected = await asyncio.to_thread(uploads.chunk_length, upload_id, index)
+        data = bytearray()
+        async for part in request.stream():
+            data += part
+            if len(data) > expected:
+                raise HTTPException(status_code=413, detail=f"Chunk {index} must be {expected} bytes")
+        return await asyncio.to_thread(uploads.write_chunk, upload_id, index, bytes(data), x_chunk_sha256)
+    except HTTPException:
+        raise
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error storing upload chunk: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, uploads: ResumableUploads = Depends(get_resumable_uploads),
+                          content_processor: ContentProcessor = Depends(get_content_processor),
+                          vector_search: VectorSearchService = Depends(get_vector_search)):
+    """Assemble a fully uploaded file and process it like /api/upload; repeating it returns the result"""
+    try:
+        async with uploads.claim(upload_id):
+            status = await asyncio.to_thread(uploads.status, upload_id)
+            if status["status"] == "finalized":
+                return status["result"]
+            file_path, metadata = await asyncio.to_thread(uploads.finalize, upload_id)
+            result = await _process_upload(file_path, metadata["originalName"], metadata["fileType"],
+                                           metadata["fileId"], content_processor, vector_search)
+            await asyncio.to_thread(uploads.complete, upload_id, result)
+            return result
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error finalizing upload: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_upload(upload_id: str, uploads: ResumableUploads = Depends(get_resumable_uploads)):
+    """Abandon a resumable upload and free its space"""
+    try:
+        await asyncio.to_thread(uploads.abort, upload_id)
+        return {"message": "Upload aborted"}
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+def _scan_uploaded_files() -> List[Dict[str, Any]]:
+    """Uploaded files with their metadata (runs in a worker thread)"""
+    files = []
+    for upload_type in ['pdf', 'video', 'audio']:
+        type_dir = UPLOADS_DIR / upload_type
+        if type_dir.exists():
+            for file_path in type_dir.rglob("*"):
+                if file_path.is_file() and not file_path.name.endswith('.metadata.json'):
+                    # Get metadata
+                    metadata_path = file_path.with_suffix(f"{file_path.suffix}.metadata.json")
+                    if metadata_path.exists():
+                        metadata = read_json(metadata_path)
+                        
+                        files.append({
+                            "name": metadata.get("originalName", file_path.name),
+                            "type": upload_type,
+                            "size": metadata.get("size", 0),
+                            "uploadDate": metadata.get("uploadDate", ""),
+                            "path": str(file_path.relative_to(STORAGE_ROOT)).replace('\\', '/'),
+                            "fileId": metadata.get("fileId", "")
+                        })
+    return files
+
 @app.get("/api/uploaded-files")
 async def get_uploaded_files():
     """Get list of uploaded files"""
     try:
-        files = []
-        for upload_type in ['pdf', 'video', 'audio']:
-            type_dir = UPLOADS_DIR / upload_type
-            if type_dir.exists():
-                for file_path in type_dir.rglob("*"):
-                    if file_path.is_file() and not file_path.name.endswith('.metadata.json'):
-                        # Get metadata
-                        metadata_path = file_path.with_suffix(f"{file_path.suffix}.metadata.json")
-                        if metadata_path.exists():
-                            with open(metadata_path, 'r') as f:
-                                metadata = json.load(f)
-                            
-                            files.append({
-                                "name": metadata.get("originalName", file_path.name),
-                                "type": upload_type,
-                                "size": metadata.get("size", 0),
-                                "uploadDate": metadata.get("uploadDate", ""),
-                                "path": str(file_path.relative_to(STORAGE_ROOT)).replace('\\', '/'),
-                                "fileId": metadata.get("fileId", "")
-                            })
+        files = await asyncio.to_thread(_scan_uploaded_files)
         
         return {"files": files}
     except Exception as e:
         logger.error(f"Error getting uploaded files: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _scan_processed_content() -> List[Dict[str, Any]]:
+    """Processed documents with their metadata (runs in a worker thread)"""
+    content = []
+    for content_type in ['pdf', 'video', 'audio']:
+        type_dir = PROCESSED_DIR / content_type
+        if type_dir.exists():
+            for file_path in type_dir.rglob("*.txt"):
+                if file_path.is_file():
+                    # Get metadata
+                    metadata_path = file_path.with_suffix('.metadata.json')
+                    metadata = {}
+                    if metadata_path.exists():
+                        metadata = read_json(metadata_path)
+                    
+                    # Check for summary
+                    summary_path = file_path.with_suffix('.summary.md')
+                    has_summary = summary_path.exists()
+                    
+                    content.append({
+                        "name": metadata.get("originalName", file_path.stem),
+                        "type": content_type,
+                        "processedDate": metadata.get("processedDate", ""),
+                        "path": str(file_path.relative_to(STORAGE_ROOT)).replace('\\', '/'),
+                        "hasSummary": has_summary,
+                        "size": file_path.stat().st_size if file_path.exists() else 0
+                    })
+    return content
+
 @app.get("/api/processed-content")
 async def get_processed_content():
     """Get list of processed content"""
     try:
-        content = []
-        for content_type in ['pdf', 'video', 'audio']:
-            type_dir = PROCESSED_DIR / content_type
-            if type_dir.exists():
-                for file_path in type_dir.rglob("*.txt"):
-                    if file_path.is_file():
-                        # Get metadata
-                        metadata_path = file_path.with_suffix('.metadata.json')
-                        metadata = {}
-                        if metadata_path.exists():
-                            with open(metadata_path, 'r') as f:
-                                metadata = json.load(f)
-                        
-                        # Check for summary
-                        summary_path = file_path.with_suffix('.summary.md')
-                        has_summary = summary_path.exists()
-                        
-                        content.append({
-                            "name": metadata.get("originalName", file_path.stem),
-                            "type": content_type,
-                            "processedDate": metadata.get("processedDate", ""),
-                            "path": str(file_path.relative_to(STORAGE_ROOT)).replace('\\', '/'),
-                            "hasSummary": has_summary,
-                            "size": file_path.stat().st_size if file_path.exists() else 0
-                        })
+        content = await asyncio.to_thread(_scan_processed_content)
         
         return {"content": content}
     except Exception as e:
@@ -240,14 +690,12 @@ async def get_processed_content_detail(content_path: str):
         if not full_path.exists():
             raise HTTPException(status_code=404, detail="Content not found")
         
-        with open(full_path, 'r', encoding='utf-8') as f:
-            transcript = f.read()
+        transcript = await async_read_text(full_path)
         
         summary_path = full_path.with_suffix('.summary.md')
         summary = 'No summary available'
         if summary_path.exists():
-            with open(summary_path, 'r', encoding='utf-8') as f:
-                summary = f.read()
+            summary = await async_read_text(summary_path)
         
         return {
             "transcript": transcript,
@@ -258,8 +706,45 @@ async def get_processed_content_detail(content_path: str):
         logger.error(f"Error getting content detail: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/search")
+async def search_content(q: str, type: Optional[str] = None, dateFrom: Optional[str] = None,
+                         dateTo: Optional[str] = None, source: Optional[List[str]] = Query(None),
+                         page: Optional[int] = None, pageSize: Optional[int] = 20,
+                         vector_search: VectorSearchService = Depends(get_vector_search)):
+    """Search processed documents; each hit has a snippet of its best passage with the matches marked.
+
+    type takes a comma-separated list (pdf,video,audio), dateFrom/dateTo are
+    inclusive YYYY-MM-DD processing dates, and source (repeatable) limits the
+    search to given documents.
+    """
+    try:
+        if not q.strip():
+            raise HTTPException(status_code=400, detail="q must not be empty")
+        file_types = tuple(t.strip() for t in type.split(",") if t.strip()) if type else ()
+        unknown = [t for t in file_types if t not in FILE_TYPES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown type: {', '.join(unknown)}")
+        try:
+            date_from = date.fromisoformat(dateFrom) if dateFrom else None
+            date_to = date.fromisoformat(dateTo) if dateTo else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="dateFrom and dateTo must be YYYY-MM-DD")
+        
+        filters = SearchFilters(file_types, date_from, date_to,
+                                tuple(f"processed/{normalize_content_path(s)}" for s in source or ()))
+        offset, limit = _page_bounds(page, pageSize)
+        hits, total = await asyncio.to_thread(vector_search.search, q, filters, offset, limit)
+        results = [{key: value for key, value in hit.items() if key != "content"} for hit in hits]
+        return {"query": q, "results": results, "total": total, "page": page or 1, "pageSize": limit}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching content: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/api/processed-content/{content_path:path}")
-async def delete_processed_content(content_path: str):
+async def delete_processed_content(content_path: str,
+                                   vector_search: VectorSearchService = Depends(get_vector_search)):
     """Delete processed content"""
     try:
         import urllib.parse
@@ -278,6 +763,16 @@ async def delete_processed_content(content_path: str):
             metadata_path = full_path.with_suffix('.metadata.json')
             if metadata_path.exists():
                 metadata_path.unlink()
+            
+            # Pre-generated flashcard decks, question bank and the extract they were built from
+            bank_path = question_bank_path(full_path)
+            for artifact_path in [bank_path, Path(f"{bank_path}.lock"), extract_path(full_path),
+                                  *full_path.parent.glob(f"{full_path.stem}.flashcards.*.json")]:
+                if artifact_path.exists():
+                    artifact_path.unlink()
+            
+            # Its index entry points into the deleted text
+            await asyncio.to_thread(vector_search.delete_content, str(full_path))
         
         return {"message": "Content deleted successfully"}
     except Exception as e:
@@ -285,11 +780,10 @@ async def delete_processed_content(content_path: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/uploaded-files/{file_path:path}")
-async def delete_uploaded_file(file_path: str):
+async def delete_uploaded_file(file_path: str, audio_extractor: AudioExtractor = Depends(get_audio_extractor)):
     """Delete uploaded file"""
     try:
         import urllib.parse
-        import time
         decoded_path = urllib.parse.unquote(file_path)
         full_path = STORAGE_ROOT / decoded_path
         
@@ -315,6 +809,9 @@ async def delete_uploaded_file(file_path: str):
                     metadata_path.unlink()
                 except PermissionError:
                     logger.warning(f"Could not delete metadata file: {metadata_path}")
+            
+            # Audio extracted for transcription
+            await asyncio.to_thread(audio_extractor.remove_derived, full_path)
         
         return {"message": "File deleted successfully", "success": True}
     except Exception as e:
@@ -323,28 +820,47 @@ async def delete_uploaded_file(file_path: str):
 
 # Quiz endpoints
 @app.post("/api/quiz/generate")
-async def generate_quiz(request: dict):
+async def generate_quiz(request: dict, quiz_generator: QuizGenerator = Depends(get_quiz_generator),
+                        single_flight: SingleFlight = Depends(get_single_flight)):
     """Generate quiz from content with real-time AI"""
     try:
         content_path = request.get("contentPath", "")
         question_types = request.get("questionTypes", ["multiple_choice"])
         question_count = request.get("questionCount", 5)
         title = request.get("title", "")
+        regenerate = bool(request.get("regenerate", False))
+        # "easy" / "medium" / "hard", or a mix such as {"easy": 0.3, "medium": 0.5, "hard": 0.2}
+        difficulty = request.get("difficulty")
+        try:
+            difficulty_weights(difficulty)
+        except (TypeError, ValueError, AttributeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid difficulty: {e}")
         
-        quiz = await quiz_generator.generate_quiz(
+        # A class asked to generate the same quiz at once shares one generation
+        key = generation_key("quiz", contentPath=normalize_content_path(content_path),
+                             questionTypes=sorted(set(question_types)),
+                             questionCount=int(question_count), title=title.strip(), regenerate=regenerate,
+                             difficulty=difficulty)
+        quiz = await single_flight.run(key, lambda: quiz_generator.generate_quiz(
             content_path=content_path,
             question_types=question_types,
             question_count=question_count,
-            title=title
-        )
+            title=title,
+            regenerate=regenerate,
+            difficulty=difficulty
+        ))
         
         return quiz
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating quiz: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/quiz/{quiz_id}")
-async def get_quiz(quiz_id: str):
+async def get_quiz(quiz_id: str, quiz_generator: QuizGenerator = Depends(get_quiz_generator)):
     """Get quiz by ID"""
     try:
         quiz = await quiz_generator.get_quiz(quiz_id)
@@ -356,7 +872,7 @@ async def get_quiz(quiz_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/quiz/{quiz_id}/submit")
-async def submit_quiz(quiz_id: str, submission: dict):
+async def submit_quiz(quiz_id: str, submission: dict, quiz_generator: QuizGenerator = Depends(get_quiz_generator)):
     """Submit quiz answers for grading"""
     try:
         result = await quiz_generator.grade_quiz(quiz_id, submission.get("answers", {}))
@@ -365,18 +881,59 @@ async def submit_quiz(quiz_id: str, submission: dict):
         logger.error(f"Error submitting quiz: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _page_bounds(page: Optional[int], page_size: Optional[int]) -> tuple:
+    """(offset, limit) for 1-based page parameters; no pageSize means everything"""
+    if page_size is None:
+        return 0, None
+    if page_size < 1 or (page is not None and page < 1):
+        raise HTTPException(status_code=400, detail="page and pageSize must be positive")
+    page_size = min(page_size, 200)
+    return ((page or 1) - 1) * page_size, page_size
+
 @app.get("/api/quizzes")
-async def get_quizzes():
-    """Get all available quizzes"""
+async def get_quizzes(page: Optional[int] = None, pageSize: Optional[int] = None,
+                      quiz_generator: QuizGenerator = Depends(get_quiz_generator)):
+    """List quizzes, newest first (paginated with page/pageSize)"""
     try:
-        quizzes = await quiz_generator.get_all_quizzes()
-        return {"quizzes": quizzes}
+        offset, limit = _page_bounds(page, pageSize)
+        quizzes, total = await quiz_generator.get_all_quizzes(offset, limit)
+        return {"quizzes": quizzes, "total": total, "page": page or 1, "pageSize": limit}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting quizzes: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/quiz/{quiz_id}/results")
+async def get_quiz_results(quiz_id: str, page: Optional[int] = None, pageSize: Optional[int] = None,
+                           quiz_generator: QuizGenerator = Depends(get_quiz_generator)):
+    """Submissions of one quiz, newest first (paginated with page/pageSize)"""
+    try:
+        offset, limit = _page_bounds(page, pageSize)
+        results, total = await quiz_generator.get_results(quiz_id, offset, limit)
+        return {"quizId": quiz_id, "results": results, "total": total, "page": page or 1, "pageSize": limit}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting quiz results: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/quiz/{quiz_id}/results/{result_id}")
+async def get_quiz_result(quiz_id: str, result_id: str, quiz_generator: QuizGenerator = Depends(get_quiz_generator)):
+    """One graded submission with its per-question results"""
+    try:
+        result = await quiz_generator.get_result(quiz_id, result_id)
+        if not result:
+            raise HTTPException(status_code=404, detail="Result not found")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting quiz result: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/api/quiz/{quiz_id}")
-async def delete_quiz(quiz_id: str):
+async def delete_quiz(quiz_id: str, quiz_generator: QuizGenerator = Depends(get_quiz_generator)):
     """Delete quiz by ID"""
     try:
         success = await quiz_generator.delete_quiz(quiz_id)
@@ -389,12 +946,15 @@ async def delete_quiz(quiz_id: str):
 
 # Flashcards endpoints
 @app.post("/api/flashcards/generate")
-async def generate_flashcards(request: dict):
-    """Generate flashcards from content using AI"""
+async def generate_flashcards(request: dict,
+                              flashcard_generator: FlashcardGenerator = Depends(get_flashcard_generator),
+                              single_flight: SingleFlight = Depends(get_single_flight)):
+    """Get flashcards for content, from the pre-generated deck when it has enough cards"""
     try:
         content_path = request.get("contentPath", "")
         card_count = request.get("cardCount", 10)
         card_type = request.get("cardType", "qa")
+        regenerate = bool(request.get("regenerate", False))
         
         # Load content
         if not content_path.startswith('processed/'):
@@ -402,122 +962,65 @@ async def generate_flashcards(request: dict):
         
         content_file = Path(content_path)
         if not content_file.is_absolute():
-            content_file = Path("../storage") / content_path
+            content_file = STORAGE_ROOT / content_path
         
         if not content_file.exists():
             raise HTTPException(status_code=404, detail="Content file not found")
         
-        with open(content_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Generate flashcards using AI
-        flashcards = await _generate_ai_flashcards(content, card_count, card_type)
+        # Identical requests in flight share one generation
+        key = generation_key("flashcards", contentPath=normalize_content_path(content_path),
+                             cardCount=int(card_count), cardType=card_type, regenerate=regenerate)
+        flashcards = await single_flight.run(key, lambda: flashcard_generator.get_flashcards(
+            content_file, int(card_count), card_type, regenerate=regenerate
+        ))
         
         return {"flashcards": flashcards}
         
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating flashcards: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def _generate_ai_flashcards(content: str, card_count: int, card_type: str) -> List[Dict[str, str]]:
-    """Generate flashcards using OpenAI API"""
+@app.get("/api/flashcards")
+async def get_review_session(studentId: str, limit: int = 20, contentPath: str = "", cardType: str = "",
+                             newCards: int = 10, review_store: ReviewStore = Depends(get_review_store)):
+    """Personalized review session: due cards first, then unseen cards from the document"""
     try:
-        # Initialize OpenAI client
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key or api_key == "your_openai_api_key_here":
-            # Return mock flashcards if no API key
-            return _generate_mock_flashcards(card_count, card_type)
-        
-        client = openai.OpenAI(api_key=api_key)
-        
-        # Create prompt based on card type
-        type_instructions = {
-            "qa": "Create question and answer flashcards",
-            "term": "Create term and definition flashcards", 
-            "concept": "Create concept and explanation flashcards"
-        }
-        
-        prompt = f"""Create {card_count} {type_instructions.get(card_type, "question and answer")} flashcards from the following educational content:
-
-{content[:4000]}
-
-For each flashcard, provide:
-- front: The question/term/concept
-- back: The answer/definition/explanation
-
-Return as JSON array with format:
-[
-  {{"front": "question", "back": "answer"}},
-  {{"front": "question", "back": "answer"}}
-]
-
-Make the content educational and helpful for learning."""
+        if cardType and cardType not in CARD_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown card type: {cardType}")
+        return await review_store.session(studentId, max(0, min(limit, 200)), contentPath, cardType,
+                                          max(0, newCards))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error building review session: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert educational content creator. Create high-quality flashcards that help students learn effectively."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.7
-        )
-        
-        # Parse the response
-        response_text = response.choices[0].message.content
-        
-        # Try to extract JSON from response
-        import json
+@app.post("/api/flashcards/review")
+async def review_flashcards(request: dict, review_store: ReviewStore = Depends(get_review_store)):
+    """Record a batch of flashcard reviews (grade 0-5 or again/hard/good/easy)"""
+    try:
+        student_id = request.get("studentId")
+        reviews = request.get("reviews", [])
+        if not student_id:
+            raise HTTPException(status_code=400, detail="studentId is required")
         try:
-            # Find JSON array in response
-            start_idx = response_text.find('[')
-            end_idx = response_text.rfind(']') + 1
-            if start_idx != -1 and end_idx != 0:
-                json_str = response_text[start_idx:end_idx]
-                flashcards = json.loads(json_str)
-                return flashcards[:card_count]  # Limit to requested count
-        except json.JSONDecodeError:
-            pass
-        
-        # Fallback to mock if parsing fails
-        return _generate_mock_flashcards(card_count, card_type)
-        
-    except Exception as e:
-        logger.error(f"Error generating AI flashcards: {e}")
-        return _generate_mock_flashcards(card_count, card_type)
-
-def _generate_mock_flashcards(card_count: int, card_type: str) -> List[Dict[str, str]]:
-    """Generate mock flashcards as fallback"""
-    mock_data = {
-        "qa": [
-            {"front": "What is software engineering?", "back": "Software engineering is the systematic approach to designing, developing, and maintaining software systems."},
-            {"front": "What are the main phases of software development?", "back": "Requirements, Design, Implementation, Testing, Deployment, and Maintenance."},
-            {"front": "What is a software requirement?", "back": "A software requirement is a description of what the software should do or how it should behave."},
-            {"front": "What is version control?", "back": "Version control is a system that records changes to files over time, allowing you to recall specific versions."},
-            {"front": "What is debugging?", "back": "Debugging is the process of finding and fixing errors or bugs in software code."}
-        ],
-        "term": [
-            {"front": "Algorithm", "back": "A step-by-step procedure for solving a problem or completing a task."},
-            {"front": "API", "back": "Application Programming Interface - a set of protocols and tools for building software applications."},
-            {"front": "Database", "back": "An organized collection of data that can be easily accessed, managed, and updated."},
-            {"front": "Framework", "back": "A platform for developing software applications that provides reusable components."},
-            {"front": "IDE", "back": "Integrated Development Environment - a software application that provides comprehensive facilities for software development."}
-        ],
-        "concept": [
-            {"front": "Object-Oriented Programming", "back": "A programming paradigm based on objects that contain data and code to manipulate that data."},
-            {"front": "Agile Development", "back": "A software development methodology that emphasizes iterative development and collaboration."},
-            {"front": "Test-Driven Development", "back": "A software development approach where tests are written before the actual code."},
-            {"front": "Continuous Integration", "back": "The practice of frequently integrating code changes into a shared repository."},
-            {"front": "Microservices Architecture", "back": "A software architecture pattern that structures an application as a collection of loosely coupled services."}
-        ]
-    }
-    
-    base_cards = mock_data.get(card_type, mock_data["qa"])
-    return (base_cards * ((card_count // len(base_cards)) + 1))[:card_count]
+            scheduled = await review_store.review(student_id, reviews)
+        except (KeyError, TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid review: {e}")
+        return {"scheduled": scheduled}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error recording reviews: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 # Chatbot endpoints
 @app.post("/api/chatbot/message")
-async def send_message(request: dict):
+async def send_message(request: dict, chatbot_engine: ChatbotEngine = Depends(get_chatbot_engine)):
     """Send message to chatbot with real-time AI responses"""
     try:
         session_id = request.get("sessionId")
@@ -534,12 +1037,14 @@ async def send_message(request: dict):
         )
         
         return response
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing message: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/chatbot/sessions")
-async def get_chat_sessions():
+async def get_chat_sessions(chatbot_engine: ChatbotEngine = Depends(get_chatbot_engine)):
     """Get all chat sessions"""
     try:
         sessions = await chatbot_engine.get_sessions()
@@ -549,7 +1054,7 @@ async def get_chat_sessions():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/chatbot/session/{session_id}")
-async def get_chat_session(session_id: str):
+async def get_chat_session(session_id: str, chatbot_engine: ChatbotEngine = Depends(get_chatbot_engine)):
     """Get specific chat session"""
     try:
         session = await chatbot_engine.get_session(session_id)
@@ -561,7 +1066,7 @@ async def get_chat_session(session_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/chatbot/session/{session_id}")
-async def delete_chat_session(session_id: str):
+async def delete_chat_session(session_id: str, chatbot_engine: ChatbotEngine = Depends(get_chatbot_engine)):
     """Delete chat session"""
     try:
         await chatbot_engine.delete_session(session_id)
@@ -572,7 +1077,7 @@ async def delete_chat_session(session_id: str):
 
 # Teacher endpoints
 @app.post("/api/teacher/generate-assignment")
-async def generate_assignment(request: dict):
+async def generate_assignment(request: dict, teacher_services: TeacherServices = Depends(get_teacher_services)):
     """Generate assignment from syllabus content"""
     try:
         teacher_id = request.get("teacherId", "teacher_1")
@@ -590,12 +1095,14 @@ async def generate_assignment(request: dict):
         )
         
         return assignment
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating assignment: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/teacher/assignments/{teacher_id}")
-async def get_teacher_assignments(teacher_id: str):
+async def get_teacher_assignments(teacher_id: str, teacher_services: TeacherServices = Depends(get_teacher_services)):
     """Get all assignments created by a teacher"""
     try:
         assignments = await teacher_services.get_teacher_assignments(teacher_id)
@@ -605,7 +1112,7 @@ async def get_teacher_assignments(teacher_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/teacher/grade")
-async def grade_assignment(request: dict):
+async def grade_assignment(request: dict, teacher_services: TeacherServices = Depends(get_teacher_services)):
     """Grade assignment with AI feedback"""
     try:
         teacher_id = request.get("teacherId", "teacher_1")
@@ -624,31 +1131,37 @@ async def grade_assignment(request: dict):
         )
         
         return grade_result
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error grading assignment: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _scan_grades() -> List[Dict[str, Any]]:
+    """Summaries of all grade records (runs in a worker thread)"""
+    grades = []
+    grades_dir = STORAGE_ROOT / "grades"
+    
+    if grades_dir.exists():
+        for grade_file in grades_dir.glob("*.json"):
+            grade_data = read_json(grade_file)
+            grades.append({
+                "id": grade_data["id"],
+                "studentId": grade_data["studentId"],
+                "assignmentId": grade_data["assignmentId"],
+                "percentage": grade_data["percentage"],
+                "letterGrade": grade_data["letterGrade"],
+                "gradedAt": grade_data["gradedAt"]
+            })
+    return grades
+
 @app.get("/api/teacher/grades/{class_id}")
 async def get_class_grades(class_id: str):
     """Get graded assignments for a class"""
     try:
         # This would typically filter by class_id
         # For now, return all grades as demo
-        grades = []
-        grades_dir = Path("../storage/grades")
-        
-        if grades_dir.exists():
-            for grade_file in grades_dir.glob("*.json"):
-                with open(grade_file, 'r', encoding='utf-8') as f:
-                    grade_data = json.load(f)
-                    grades.append({
-                        "id": grade_data["id"],
-                        "studentId": grade_data["studentId"],
-                        "assignmentId": grade_data["assignmentId"],
-                        "percentage": grade_data["percentage"],
-                        "letterGrade": grade_data["letterGrade"],
-                        "gradedAt": grade_data["gradedAt"]
-                    })
+        grades = await asyncio.to_thread(_scan_grades)
         
         return {"grades": grades}
     except Exception as e:
@@ -822,12 +1335,11 @@ async def generate_lesson_plan(request: dict):
         }
         
         # Save lesson plan
-        lesson_plans_dir = Path("../storage/lesson_plans")
+        lesson_plans_dir = STORAGE_ROOT / "lesson_plans"
         lesson_plans_dir.mkdir(parents=True, exist_ok=True)
         
         plan_file = lesson_plans_dir / f"{lesson_plan['id']}.json"
-        with open(plan_file, 'w', encoding='utf-8') as f:
-            json.dump(lesson_plan, f, indent=2, ensure_ascii=False)
+        await async_write_json(plan_file, lesson_plan)
         
         return lesson_plan
     except Exception as e:
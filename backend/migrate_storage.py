@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+EduAssist Storage Format Migration
+
+Rewrites the JSON documents under the storage root (quizzes, results,
+sessions, grades, assignments, metadata, question banks, ...) in the compact
+format (version header + minified JSON) or back to pretty-printed JSON. The
+backend reads both formats, so this is only needed to reclaim space and
+speed up reads of existing files, or before downgrading to a release that
+only reads plain JSON. Writes are atomic; stop the backend first so no
+request rewrites a file between our read and write.
+
+Usage:
+    python migrate_storage.py                       # convert STORAGE_ROOT to compact
+    python migrate_storage.py --dry-run             # only report what would change
+    python migrate_storage.py --to json             # convert back to pretty JSON
+    python migrate_storage.py --storage /data/eduassist
+"""
+
+import os
+import sys
+import argparse
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.resolve()
+sys.path.insert(0, str(backend_dir))
+
+# Written and read by other code with its own format
+SKIPPED_AREAS = {"metrics", "locks", "llm-recordings", "profiles"}
+
+def storage_files(root: Path):
+    for path in sorted(root.rglob("*.json")):
+        relative = path.relative_to(root)
+        if relative.parts[0] in SKIPPED_AREAS or path.name.startswith("."):
+            continue
+        yield path
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert stored JSON documents between storage formats")
+    parser.add_argument("--storage", type=Path, help="Storage root (default: STORAGE_ROOT from the environment)")
+    parser.add_argument("--to", choices=["compact", "json"], default="compact", help="Target format")
+    parser.add_argument("--dry-run", action="store_true", help="Report without writing")
+    args = parser.parse_args()
+
+    if args.storage:
+        os.environ["STORAGE_ROOT"] = str(args.storage)
+    from services.settings import get_settings
+    from services.storage import FORMAT_MAGIC, decode_json, encode_json, atomic_write_bytes
+
+    root = get_settings().storage_root
+    if not root.exists():
+        print(f"❌ Storage root {root} does not exist")
+        sys.exit(1)
+
+    print(f"🔄 Converting {root} to {args.to}{' (dry run)' if args.dry_run else ''}")
+    converted = skipped = failed = 0
+    bytes_before = bytes_after = 0
+    for path in storage_files(root):
+        try:
+            data = path.read_bytes()
+            if data.startswith(FORMAT_MAGIC) == (args.to == "compact"):
+                skipped += 1
+                continue
+            encoded = encode_json(decode_json(data), args.to)
+            if not args.dry_run:
+                atomic_write_bytes(path, encoded)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  {path.relative_to(root)}: {e}")
+            failed += 1
+            continue
+        converted += 1
+        bytes_before += len(data)
+        bytes_after += len(encoded)
+        if converted % 1000 == 0:
+            print(f"   {converted} files converted...")
+
+    print(f"✅ Converted {converted} files, {skipped} already {args.to}, {failed} failed")
+    if converted:
+        print(f"📦 {bytes_before / 1e6:.1f} MB -> {bytes_after / 1e6:.1f} MB "
+              f"({(bytes_after - bytes_before) / bytes_before:+.0%})")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+EduAssist Search Index Rebuild
+
+Re-indexes every document in storage/processed, e.g. after changing
+CHUNK_MAX_TOKENS/CHUNK_OVERLAP_TOKENS or to index documents that were never
+indexed. Documents are chunked in a process pool; progress is checkpointed,
+so running the command again after an interruption continues where it
+stopped. The live index is switched over only once the rebuild is complete,
+and the backend can keep serving searches meanwhile.
+
+Usage:
+    python rebuild_index.py                  # rebuild (or resume) with one process per CPU
+    python rebuild_index.py --workers 4
+    python rebuild_index.py --fresh          # discard an interrupted rebuild and start over
+    python rebuild_index.py --status
+"""
+
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.resolve()
+sys.path.insert(0, str(backend_dir))
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the search index from processed documents")
+    parser.add_argument("--storage", type=Path, help="Storage root (default: STORAGE_ROOT from the environment)")
+    parser.add_argument("--workers", type=int, help="Indexing processes (default: CPU count)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the checkpoint of an interrupted rebuild")
+    parser.add_argument("--status", action="store_true", help="Show the index and rebuild state and exit")
+    args = parser.parse_args()
+
+    if args.storage:
+        os.environ["STORAGE_ROOT"] = str(args.storage)
+    from services.index_builder import IndexBuilder
+
+    builder = IndexBuilder()
+    if args.status:
+        print(json.dumps(builder.status(), indent=2))
+        return
+
+    print(f"🔄 Rebuilding search index in {builder.storage_root}")
+    last_reported = [0]
+
+    def progress(indexed: int, total: int):
+        if indexed - last_reported[0] >= 1000 or indexed == total:
+            print(f"   📄 {indexed}/{total} documents")
+            last_reported[0] = indexed
+
+    try:
+        result = builder.rebuild(args.workers, args.fresh, progress)
+    except BlockingIOError:
+        print("❌ Another rebuild is already running")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted; run again to resume")
+        sys.exit(130)
+
+    print(f"✅ Indexed {result['documents']} documents in {result['seconds']}s "
+          f"(generation {result['generation']})")
+    if result["failed"]:
+        print(f"⚠️  {result['failed']} documents could not be read")
+
+if __name__ == "__main__":
+    main()
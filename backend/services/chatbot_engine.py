@@ -1,37 +1,34 @@
 import os
-import json
 import uuid
 import asyncio
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 import logging
-import openai
-from dotenv import load_dotenv
+from .settings import Settings, get_settings
+from .llm_client import chat_completion
+from .deadlines import DeadlineExceeded
 from .vector_search import VectorSearchService
-
-# Load environment variables
-load_dotenv()
+from .storage import async_file_lock, async_write_json, async_read_json, async_read_text, read_json
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
 class ChatbotEngine:
-    def __init__(self):
-        self.storage_root = Path("../storage")
+    def __init__(self, settings: Optional[Settings] = None, vector_search: Optional[VectorSearchService] = None):
+        self.settings = settings or get_settings()
+        self.storage_root = self.settings.storage_root
         self.chatbot_dir = self.storage_root / "chatbot"
         self.processed_dir = self.storage_root / "processed"
         self.chatbot_dir.mkdir(parents=True, exist_ok=True)
         
-        # Initialize OpenAI client
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.client = openai.OpenAI(api_key=self.api_key) if self.api_key else None
-        self.model = os.getenv("OPENAI_MODEL_CHAT", "gpt-4o-mini")
+        self.model = self.settings.chat_model
         
         # Initialize vector search
-        self.vector_search = VectorSearchService()
+        self.vector_search = vector_search or VectorSearchService(self.settings)
         
         # Check if API key is available
-        self.use_real_api = bool(self.api_key and self.api_key != "your_openai_api_key_here")
+        self.use_real_api = self.settings.use_real_api
         
         if not self.use_real_api:
             logger.warning("OpenAI API key not configured. Using mock chatbot responses.")
@@ -40,7 +37,8 @@ class ChatbotEngine:
         """Process user message and generate AI response"""
         try:
             # Get or create session
-            session = await self._get_or_create_session(session_id)
+            with span("session.load"):
+                session = await self._get_or_create_session(session_id)
             
             # Search for relevant content
             sources = []
@@ -48,14 +46,18 @@ class ChatbotEngine:
             
             if selected_content:
                 # Use selected content for context
-                context = await self._get_selected_content_context(selected_content)
-                sources = await self._get_sources(selected_content)
+                with span("context.read", documents=len(selected_content)):
+                    context = await self._get_selected_content_context(selected_content)
+                with span("sources.metadata"):
+                    sources = await self._get_sources(selected_content)
             else:
                 # Search all available content
-                search_results = self.vector_search.search_content(message, limit=3)
+                with span("retrieval"):
+                    search_results = await asyncio.to_thread(self.vector_search.search_content, message, limit=3)
                 if search_results:
                     context = "\n\n".join([result["content"] for result in search_results])
-                    sources = await self._get_sources_from_search(search_results)
+                    with span("sources.metadata"):
+                        sources = await self._get_sources_from_search(search_results)
             
             # Generate response
             if self.use_real_api:
@@ -79,13 +81,9 @@ class ChatbotEngine:
                 "sources": sources
             }
             
-            # Update session
-            session["messages"].extend([user_message, bot_message])
-            session["lastActivity"] = datetime.now().isoformat()
-            session["messageCount"] = len(session["messages"])
-            
             # Save session
-            await self._save_session(session)
+            with span("session.save"):
+                await self._save_session(session, [user_message, bot_message])
             
             logger.info(f"Processed message in session {session_id}")
             return {
@@ -135,16 +133,16 @@ Be conversational but professional, and always aim to enhance the student's lear
             messages.append({"role": "user", "content": message})
             
             # Generate response
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
+            return await chat_completion(
+                "chat",
                 model=self.model,
                 messages=messages,
                 max_tokens=500,
                 temperature=0.7
             )
             
-            return response.choices[0].message.content
-            
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error generating AI response: {e}")
             return "I apologize, but I'm having trouble generating a response right now. Please try again."
@@ -275,10 +273,9 @@ Is there a particular aspect of this topic you'd like me to focus on?"""
                 full_path_str = str(full_path.resolve())
                 
                 if os.path.exists(full_path_str):
-                    with open(full_path_str, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        # Take first 1000 characters to avoid token limits
-                        context_parts.append(content[:1000])
+                    content = await async_read_text(full_path_str)
+                    # Take first 1000 characters to avoid token limits
+                    context_parts.append(content[:1000])
                 else:
                     logger.warning(f"Content file not found: {full_path_str}")
             
@@ -303,9 +300,8 @@ Is there a particular aspect of this topic you'd like me to focus on?"""
                 original_name = full_path.stem
                 
                 if metadata_path.exists():
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
-                        original_name = metadata.get("originalName", original_name)
+                    metadata = await async_read_json(metadata_path)
+                    original_name = metadata.get("originalName", original_name)
                 
                 sources.append({
                     "title": original_name,
@@ -332,9 +328,8 @@ Is there a particular aspect of this topic you'd like me to focus on?"""
                 if source_path:
                     metadata_path = (self.storage_root / source_path).with_suffix('.metadata.json')
                     if metadata_path.exists():
-                        with open(metadata_path, 'r') as f:
-                            metadata = json.load(f)
-                            title = metadata.get("originalName", title)
+                        metadata = await async_read_json(metadata_path)
+                        title = metadata.get("originalName", title)
                 
                 sources.append({
                     "title": title,
@@ -354,8 +349,7 @@ Is there a particular aspect of this topic you'd like me to focus on?"""
             session_file = self.chatbot_dir / f"{session_id}.json"
             
             if session_file.exists():
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return await async_read_json(session_file)
             else:
                 # Create new session
                 session = {
@@ -380,31 +374,44 @@ Is there a particular aspect of this topic you'd like me to focus on?"""
                 "messageCount": 0
             }
     
-    async def _save_session(self, session: Dict[str, Any]):
-        """Save session to file"""
+    async def _save_session(self, session: Dict[str, Any], new_messages: List[Dict[str, Any]]):
+        """Append messages to the session file.
+
+        Another worker may have appended to the same session while we were
+        waiting on the LLM, so merge into the latest copy under a file lock.
+        """
         try:
             session_file = self.chatbot_dir / f"{session['id']}.json"
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(session, f, indent=2, ensure_ascii=False)
+            async with async_file_lock(session_file):
+                stored = await self.get_session(session["id"])
+                if stored:
+                    session = stored
+                session["messages"].extend(new_messages)
+                session["lastActivity"] = datetime.now().isoformat()
+                session["messageCount"] = len(session["messages"])
+                await async_write_json(session_file, session)
         except Exception as e:
             logger.error(f"Error saving session: {e}")
     
+    def _scan_sessions(self) -> List[Dict[str, Any]]:
+        """Summaries of all stored sessions (runs in a worker thread)"""
+        sessions = []
+        for session_file in self.chatbot_dir.glob("*.json"):
+            session_data = read_json(session_file)
+            # Return summary info for listing
+            sessions.append({
+                "id": session_data["id"],
+                "title": session_data["title"],
+                "createdDate": session_data["createdDate"],
+                "lastActivity": session_data["lastActivity"],
+                "messageCount": session_data["messageCount"]
+            })
+        return sessions
+    
     async def get_sessions(self) -> List[Dict[str, Any]]:
         """Get all chat sessions"""
         try:
-            sessions = []
-            
-            for session_file in self.chatbot_dir.glob("*.json"):
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    session_data = json.load(f)
-                    # Return summary info for listing
-                    sessions.append({
-                        "id": session_data["id"],
-                        "title": session_data["title"],
-                        "createdDate": session_data["createdDate"],
-                        "lastActivity": session_data["lastActivity"],
-                        "messageCount": session_data["messageCount"]
-                    })
+            sessions = await asyncio.to_thread(self._scan_sessions)
             
             # Sort by last activity (most recent first)
             sessions.sort(key=lambda x: x["lastActivity"], reverse=True)
@@ -418,9 +425,8 @@ Is there a particular aspect of this topic you'd like me to focus on?"""
         """Get specific session"""
         try:
             session_file = self.chatbot_dir / f"{session_id}.json"
-            if session_file.exists():
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            return await async_read_json(session_file)
+        except FileNotFoundError:
             return None
         except Exception as e:
             logger.error(f"Error getting session {session_id}: {e}")
@@ -0,0 +1,78 @@
+import re
+from collections import deque
+from typing import Iterator, Tuple
+
+# Same rough estimate the LLM scheduler uses
+CHARS_PER_TOKEN = 4
+DEFAULT_MAX_TOKENS = 256
+DEFAULT_OVERLAP_TOKENS = 32
+# A chunk this full may end early at a paragraph break instead of running into the next paragraph
+PARAGRAPH_FILL = 0.75
+
+# Sentence ends (punctuation plus closing quotes/brackets, then whitespace) and blank lines
+_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n\s*\n\s*")
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def iter_sentences(text: str) -> Iterator[Tuple[int, int, bool]]:
+    """(start, end, starts_paragraph) of each sentence, surrounding whitespace excluded"""
+    start = len(text) - len(text.lstrip())
+    paragraph = True
+    for match in _BOUNDARY.finditer(text):
+        if match.start() > start:
+            yield start, match.start(), paragraph
+        start = match.end()
+        paragraph = match.group().count("\n") >= 2
+    end = len(text.rstrip())
+    if start < end:
+        yield start, end, paragraph
+
+def _split_long(text: str, start: int, end: int, max_chars: int) -> Iterator[Tuple[int, int]]:
+    """Cut a sentence longer than a whole chunk at whitespace"""
+    while end - start > max_chars:
+        cut = text.rfind(" ", start + max_chars // 2, start + max_chars)
+        cut = cut if cut != -1 else start + max_chars
+        yield start, cut
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if start < end:
+        yield start, end
+
+def iter_chunks(text: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> Iterator[Tuple[int, int]]:
+    """(start, end) offsets of chunks of whole sentences, at most about `max_tokens` each.
+
+    Chunks prefer to end at a paragraph break once they are mostly full,
+    and each chunk repeats the last sentences of the previous one, up to
+    `overlap_tokens`, so a passage cut by a boundary is still whole in one
+    of them. Sentences are consumed lazily, so only the current chunk's
+    sentence offsets are held in memory.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = min(overlap_tokens, max_tokens // 2) * CHARS_PER_TOKEN
+    window: deque = deque()  # (start, end) of the sentences in the current chunk
+    new_since_emit = False
+
+    for sentence_start, sentence_end, paragraph in iter_sentences(text):
+        for start, end in _split_long(text, sentence_start, sentence_end, max_chars):
+            size = end - window[0][0] if window else 0
+            full = window and end - window[0][0] > max_chars
+            at_paragraph = window and paragraph and size >= PARAGRAPH_FILL * max_chars
+            if (full or at_paragraph) and new_since_emit:
+                yield window[0][0], window[-1][1]
+                new_since_emit = False
+                # Keep a tail of whole sentences as the overlap
+                while window and window[-1][1] - window[0][0] > overlap_chars:
+                    window.popleft()
+                if at_paragraph:
+                    window.clear()
+            while window and end - window[0][0] > max_chars:
+                window.popleft()
+            window.append((start, end))
+            new_since_emit = True
+            paragraph = False
+
+    if window and new_since_emit:
+        yield window[0][0], window[-1][1]
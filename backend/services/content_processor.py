@@ -1,38 +1,47 @@
-import os
-import json
 import asyncio
 from pathlib import Path
 from datetime import datetime
 import logging
-from typing import Optional
-import aiofiles
-import openai
-from dotenv import load_dotenv
-import PyPDF2
-import io
+from typing import Optional, Set
+from .settings import Settings, get_settings
+from .llm_client import chat_completion
+from .metrics import observe_stage
+from .storage import async_write_json, async_write_text
+from .media import AudioExtractor, MediaToolMissing, PreparedAudio
+from .transcription import TranscriptionRouter
+from .extractive import condensed_text
+from .deadlines import detached
 
-# Load environment variables
-load_dotenv()
+# Sizes of the study artifacts pre-generated per document
+PREGENERATED_CARDS = 20
+PREGENERATED_QUESTIONS = 15
 
 logger = logging.getLogger(__name__)
 
 class ContentProcessor:
-    def __init__(self):
-        self.storage_root = Path("../storage")
+    def __init__(self, settings: Optional[Settings] = None, flashcard_generator=None, quiz_generator=None,
+                 audio_extractor: Optional[AudioExtractor] = None,
+                 transcriber: Optional[TranscriptionRouter] = None):
+        self.settings = settings or get_settings()
+        self.storage_root = self.settings.storage_root
         self.uploads_dir = self.storage_root / "uploads"
         self.processed_dir = self.storage_root / "processed"
         
-        # Initialize OpenAI client
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.client = openai.OpenAI(api_key=self.api_key) if self.api_key else None
-        self.transcribe_model = os.getenv("OPENAI_MODEL_TRANSCRIBE", "whisper-1")
-        self.summary_model = os.getenv("OPENAI_MODEL_SUMMARY", "gpt-4o-mini")
+        self.transcribe_model = self.settings.transcribe_model
+        self.summary_model = self.settings.summary_model
         
         # Check if API key is available
-        self.use_real_api = bool(self.api_key and self.api_key != "your_openai_api_key_here")
+        self.use_real_api = self.settings.use_real_api
         
         if not self.use_real_api:
             logger.warning("OpenAI API key not configured. Using mock responses.")
+        
+        # Optional post-processing stage: flashcard decks and the question bank
+        self.flashcard_generator = flashcard_generator
+        self.quiz_generator = quiz_generator
+        self._pregeneration_tasks: Set[asyncio.Task] = set()
+        self.audio_extractor = audio_extractor or AudioExtractor(self.settings)
+        self.transcriber = transcriber or TranscriptionRouter(self.settings)
     
     async def process_file(self, file_path: Path, original_filename: str):
         """Process uploaded file based on its type"""
@@ -61,20 +70,22 @@ class ContentProcessor:
             processed_dir.mkdir(parents=True, exist_ok=True)
             
             # Extract text from PDF
-            text_content = await self._extract_pdf_text(file_path)
+            with observe_stage("extract", "pdf"):
+                text_content = await self._extract_pdf_text(file_path)
             
             # Save extracted text
             text_file = processed_dir / f"{file_id}.txt"
-            async with aiofiles.open(text_file, 'w', encoding='utf-8') as f:
-                await f.write(text_content)
+            await self._write_file(text_file, text_content)
             
             # Generate summary
-            summary = await self._generate_summary(text_content, original_filename)
+            with observe_stage("summarize", "pdf"):
+                summary = await self._generate_summary(text_content, original_filename, text_file)
             
             # Save summary
             summary_file = processed_dir / f"{file_id}.summary.md"
-            async with aiofiles.open(summary_file, 'w', encoding='utf-8') as f:
-                await f.write(summary)
+            await self._write_file(summary_file, summary)
+            
+            self._start_pregeneration(text_file, text_content, "pdf")
             
             # Save metadata
             metadata = {
@@ -88,8 +99,7 @@ class ContentProcessor:
             }
             
             metadata_file = processed_dir / f"{file_id}.metadata.json"
-            async with aiofiles.open(metadata_file, 'w') as f:
-                await f.write(json.dumps(metadata, indent=2))
+            await async_write_json(metadata_file, metadata)
             
             logger.info(f"Successfully processed PDF: {original_filename}")
             return {
@@ -111,21 +121,27 @@ class ContentProcessor:
             processed_dir = self.processed_dir / "video" / date_path
             processed_dir.mkdir(parents=True, exist_ok=True)
             
+            # Only the audio track, without long silences, is uploaded for transcription
+            with observe_stage("prepare_audio", "video"):
+                audio = await self._prepare_audio(file_path)
+            
             # Transcribe audio from video
-            transcript = await self._transcribe_audio(file_path, "video")
+            with observe_stage("transcribe", "video"):
+                transcript = await self._transcribe_audio(audio.path, "video", audio.duration)
             
             # Save transcript
             transcript_file = processed_dir / f"{file_id}.txt"
-            async with aiofiles.open(transcript_file, 'w', encoding='utf-8') as f:
-                await f.write(transcript)
+            await self._write_file(transcript_file, transcript)
             
             # Generate summary
-            summary = await self._generate_summary(transcript, original_filename)
+            with observe_stage("summarize", "video"):
+                summary = await self._generate_summary(transcript, original_filename, transcript_file)
             
             # Save summary
             summary_file = processed_dir / f"{file_id}.summary.md"
-            async with aiofiles.open(summary_file, 'w', encoding='utf-8') as f:
-                await f.write(summary)
+            await self._write_file(summary_file, summary)
+            
+            self._start_pregeneration(transcript_file, transcript, "video")
             
             # Save metadata
             metadata = {
@@ -135,12 +151,12 @@ class ContentProcessor:
                 "processedDate": datetime.now().isoformat(),
                 "transcriptLength": len(transcript),
                 "summaryLength": len(summary),
-                "status": "completed"
+                "status": "completed",
+                **self._audio_metadata(audio)
             }
             
             metadata_file = processed_dir / f"{file_id}.metadata.json"
-            async with aiofiles.open(metadata_file, 'w') as f:
-                await f.write(json.dumps(metadata, indent=2))
+            await async_write_json(metadata_file, metadata)
             
             logger.info(f"Successfully processed video: {original_filename}")
             return {
@@ -162,21 +178,27 @@ class ContentProcessor:
             processed_dir = self.processed_dir / "audio" / date_path
             processed_dir.mkdir(parents=True, exist_ok=True)
             
+            # Resampled to 16 kHz mono without long silences
+            with observe_stage("prepare_audio", "audio"):
+                audio = await self._prepare_audio(file_path)
+            
             # Transcribe audio
-            transcript = await self._transcribe_audio(file_path, "audio")
+            with observe_stage("transcribe", "audio"):
+                transcript = await self._transcribe_audio(audio.path, "audio", audio.duration)
             
             # Save transcript
             transcript_file = processed_dir / f"{file_id}.txt"
-            async with aiofiles.open(transcript_file, 'w', encoding='utf-8') as f:
-                await f.write(transcript)
+            await self._write_file(transcript_file, transcript)
             
             # Generate summary
-            summary = await self._generate_summary(transcript, original_filename)
+            with observe_stage("summarize", "audio"):
+                summary = await self._generate_summary(transcript, original_filename, transcript_file)
             
             # Save summary
             summary_file = processed_dir / f"{file_id}.summary.md"
-            async with aiofiles.open(summary_file, 'w', encoding='utf-8') as f:
-                await f.write(summary)
+            await self._write_file(summary_file, summary)
+            
+            self._start_pregeneration(transcript_file, transcript, "audio")
             
             # Save metadata
             metadata = {
@@ -186,12 +208,12 @@ class ContentProcessor:
                 "processedDate": datetime.now().isoformat(),
                 "transcriptLength": len(transcript),
                 "summaryLength": len(summary),
-                "status": "completed"
+                "status": "completed",
+                **self._audio_metadata(audio)
             }
             
             metadata_file = processed_dir / f"{file_id}.metadata.json"
-            async with aiofiles.open(metadata_file, 'w') as f:
-                await f.write(json.dumps(metadata, indent=2))
+            await async_write_json(metadata_file, metadata)
             
             logger.info(f"Successfully processed audio: {original_filename}")
             return {
@@ -205,17 +227,40 @@ class ContentProcessor:
             logger.error(f"Error processing audio {file_path}: {e}")
             raise
     
+    def _start_pregeneration(self, text_file: Path, content: str, file_type: str):
+        """Build flashcard decks and seed the question bank in the background.
+
+        The upload response does not wait for them, nor are they bound by
+        its deadline; until they are stored, requests for this document
+        generate on demand as before.
+        """
+        if not (self.settings.pregenerate_study_artifacts and self.use_real_api
+                and self.flashcard_generator and self.quiz_generator):
+            return
+        task = asyncio.create_task(self._pregenerate(text_file, content, file_type))
+        self._pregeneration_tasks.add(task)
+        task.add_done_callback(self._pregeneration_tasks.discard)
+    
+    async def _pregenerate(self, text_file: Path, content: str, file_type: str):
+        try:
+            with detached(), observe_stage("pregenerate", file_type):
+                await asyncio.gather(
+                    self.flashcard_generator.pregenerate(text_file, content, PREGENERATED_CARDS),
+                    self.quiz_generator.fill_question_bank(text_file, content, PREGENERATED_QUESTIONS),
+                )
+            logger.info(f"Pre-generated study artifacts for {text_file.name}")
+        except Exception as e:
+            logger.error(f"Error pre-generating study artifacts for {text_file}: {e}")
+    
+    async def _write_file(self, path: Path, text: str):
+        """Write a processed artifact atomically without blocking the event loop"""
+        await async_write_text(path, text)
+    
     async def _extract_pdf_text(self, file_path: Path) -> str:
         """Extract text from PDF file"""
         try:
-            text_content = ""
-            
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text_content += page.extract_text() + "\n"
+            # Reading and parsing the PDF would block the event loop
+            text_content = await asyncio.to_thread(self._read_pdf, file_path)
             
             if not text_content.strip():
                 text_content = f"Could not extract text from PDF: {file_path.name}"
@@ -226,10 +271,45 @@ class ContentProcessor:
             logger.error(f"Error extracting PDF text: {e}")
             return f"Error extracting text from PDF: {str(e)}"
     
-    async def _transcribe_audio(self, file_path: Path, file_type: str) -> str:
-        """Transcribe audio using OpenAI Whisper API"""
+    def _read_pdf(self, file_path: Path) -> str:
+        # Deferred: PyPDF2 is only needed once a PDF is actually uploaded
+        import PyPDF2
+        
+        text_content = ""
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            
+            for page_num in range(len(pdf_reader.pages)):
+                page = pdf_reader.pages[page_num]
+                text_content += page.extract_text() + "\n"
+        return text_content
+    
+    async def _prepare_audio(self, file_path: Path) -> PreparedAudio:
+        """Compact, silence-trimmed audio to transcribe; the upload itself if that is not possible"""
+        if not self.transcriber.enabled:
+            return PreparedAudio(file_path)
         try:
-            if not self.use_real_api:
+            return await self.audio_extractor.prepare_audio(file_path)
+        except MediaToolMissing as e:
+            logger.warning(f"{e}; sending the original file for transcription")
+        except Exception as e:
+            logger.error(f"Error preparing audio from {file_path.name}, sending the original file: {e}")
+        return PreparedAudio(file_path)
+    
+    def _audio_metadata(self, audio: PreparedAudio) -> dict:
+        """Durations before and after silence trimming, and where the time map is"""
+        if audio.time_map is None:
+            return {}
+        return {
+            "recordingSeconds": round(audio.time_map.original_seconds, 1),
+            "transcribedSeconds": round(audio.time_map.kept_seconds, 1),
+            "timeMapFile": str(audio.time_map_path.relative_to(self.storage_root)),
+        }
+    
+    async def _transcribe_audio(self, file_path: Path, file_type: str, duration: Optional[float] = None) -> str:
+        """Transcribe audio with the backend the router picks for its duration"""
+        try:
+            if not self.transcriber.enabled:
                 # Return mock transcript
                 return f"""This is a mock transcript for {file_path.name}.
 
@@ -244,22 +324,14 @@ Key points that would typically be covered:
 
 To enable real transcription, please set your OpenAI API key in the .env file."""
 
-            # Real API implementation
-            with open(file_path, "rb") as audio_file:
-                response = await asyncio.to_thread(
-                    self.client.audio.transcriptions.create,
-                    model=self.transcribe_model,
-                    file=audio_file,
-                    response_format="text"
-                )
-                return response
+            return await self.transcriber.transcribe(file_path, duration)
                 
         except Exception as e:
             logger.error(f"Error transcribing audio: {e}")
             return f"Error transcribing audio: {str(e)}"
     
-    async def _generate_summary(self, content: str, filename: str) -> str:
-        """Generate summary using OpenAI GPT API"""
+    async def _generate_summary(self, content: str, filename: str, text_file: Optional[Path] = None) -> str:
+        """Generate summary using OpenAI GPT API, from the document's extract if it is long"""
         try:
             if not self.use_real_api:
                 # Return mock summary
@@ -285,10 +357,11 @@ The document provides comprehensive coverage of the subject matter with clear ex
 
 *Note: To enable real AI-powered summarization, please configure your OpenAI API key in the .env file.*"""
 
-            # Real API implementation
+            # Real API implementation; long documents are condensed to their key sentences
+            excerpt = await condensed_text(content, self.settings.extract_max_tokens, text_file)
             prompt = f"""Please provide a comprehensive summary of the following educational content from "{filename}":
 
-{content[:4000]}  # Limit content to avoid token limits
+{excerpt}
 
 Please structure your summary with:
 1. Main topic and overview
@@ -299,7 +372,8 @@ Please structure your summary with:
 
 Format the response in Markdown."""
 
-            response = self.client.chat.completions.create(
+            return await chat_completion(
+                "summary",
                 model=self.summary_model,
                 messages=[
                     {"role": "system", "content": "You are an expert educational content summarizer. Create clear, structured summaries that help students understand and learn from the material."},
@@ -309,8 +383,6 @@ Format the response in Markdown."""
                 temperature=0.3
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             logger.error(f"Error generating summary: {e}")
             return f"Error generating summary: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,64 @@
+import time
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Optional
+from .metrics import DEADLINE_EXCEEDED
+
+# Monotonic time by which the current request's work must be done, if any.
+# Like the trace context it follows the request into the tasks and threads it starts.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline or a stage's timeout passed before the work finished"""
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current deadline, or None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Run the block with a deadline `seconds` from now, unless the enclosing one is sooner"""
+    if seconds is None:
+        yield
+        return
+    target = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(target if current is None else min(current, target))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+@contextmanager
+def detached():
+    """Run the block without the enclosing deadline, e.g. background work a request starts"""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+async def run_stage(stage: str, work: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """Await `work` within the stage's own timeout and what is left of the deadline.
+
+    Work still running when either passes is cancelled, and
+    DeadlineExceeded is raised in its place.
+    """
+    limits = [limit for limit in (timeout, remaining()) if limit is not None]
+    if not limits:
+        return await work
+    limit = min(limits)
+    if limit <= 0:
+        if asyncio.iscoroutine(work):
+            work.close()
+        DEADLINE_EXCEEDED.inc(stage=stage)
+        raise DeadlineExceeded(f"No time left for {stage}")
+    try:
+        return await asyncio.wait_for(work, limit)
+    except DeadlineExceeded:
+        raise
+    except asyncio.TimeoutError:
+        DEADLINE_EXCEEDED.inc(stage=stage)
+        raise DeadlineExceeded(f"{stage} did not finish within {limit:.1f}s") from None
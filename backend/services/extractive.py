@@ -0,0 +1,152 @@
+import re
+import asyncio
+from pathlib import Path
+from typing import List, Optional, Tuple
+import logging
+from .chunking import CHARS_PER_TOKEN, iter_sentences
+from .storage import async_read_json, async_write_json
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the selection changes, so cached extracts are rebuilt
+EXTRACT_VERSION = 2
+# TextRank damping and power-iteration limits
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+# Sentences shorter than this (headings, page numbers, list debris) are never picked
+MIN_SENTENCE_CHARS = 25
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9'-]+")
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had
+has have having he her here hers herself him himself his how i if in into is it its itself just
+me more most my myself no nor not now of off on once only or other our ours ourselves out over
+own same she should so some such than that the their theirs them themselves then there these
+they this those through to too under until up very was we were what when where which while who
+whom why will with would you your yours yourself yourselves
+""".split())
+
+def extract_path(content_file: Path) -> Path:
+    """Cached extract of a processed document, next to its .summary.md"""
+    return content_file.with_suffix('.extract.json')
+
+def _candidates(text: str) -> List[Tuple[int, int]]:
+    """Sentence ranges worth ranking, without repeats such as running page headers"""
+    seen, ranges = set(), []
+    for start, end, _ in iter_sentences(text):
+        sentence = text[start:end]
+        key = " ".join(sentence.lower().split())
+        if len(key) >= MIN_SENTENCE_CHARS and key not in seen:
+            seen.add(key)
+            ranges.append((start, end))
+    return ranges
+
+def rank_sentences(sentences: List[str]):
+    """TextRank score of each sentence over TF-IDF cosine similarity.
+
+    The sentence-term matrix is kept sparse as (row, column, weight)
+    arrays with unit-length rows. The similarity graph W = S·Sᵀ (less its
+    diagonal) is never materialized: each power iteration multiplies
+    through S and Sᵀ with bincount, so the cost is linear in the number
+    of words rather than quadratic in the number of sentences.
+    """
+    import numpy as np  # deferred: only needed when a document is condensed
+
+    vocabulary, rows, columns = {}, [], []
+    for row, sentence in enumerate(sentences):
+        for word in _WORD.findall(sentence.lower()):
+            if word not in _STOPWORDS:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(word, len(vocabulary)))
+    count, terms = len(sentences), len(vocabulary)
+    if not terms:
+        return np.full(count, 1.0 / max(count, 1))
+
+    # Term counts per (sentence, term) pair
+    keys, tf = np.unique(np.asarray(rows, dtype=np.int64) * terms + np.asarray(columns, dtype=np.int64),
+                         return_counts=True)
+    rows, columns = keys // terms, keys % terms
+    idf = np.log((1.0 + count) / (1.0 + np.bincount(columns, minlength=terms))) + 1.0
+    weights = (1.0 + np.log(tf)) * idf[columns]
+    norms = np.sqrt(np.bincount(rows, weights * weights, minlength=count))
+    weights = weights / norms[rows]
+
+    def similarity(vector):
+        # W·x = S·(Sᵀ·x) - x, since every row of S has unit length
+        projected = np.bincount(columns, weights * vector[rows], minlength=terms)
+        return np.bincount(rows, weights * projected[columns], minlength=count) - vector
+
+    degree = similarity(np.ones(count))
+    linked = degree > 1e-9
+    scores = np.full(count, 1.0 / count)
+    for _ in range(MAX_ITERATIONS):
+        share = np.where(linked, scores / np.where(linked, degree, 1.0), 0.0)
+        updated = (1.0 - DAMPING) / count + DAMPING * similarity(share)
+        if np.abs(updated - scores).sum() < TOLERANCE:
+            return updated
+        scores = updated
+    return scores
+
+def condense(text: str, max_tokens: int) -> str:
+    """The document's most central sentences, in their original order, within about `max_tokens`.
+
+    Text that already fits is returned unchanged. Skipped stretches are
+    marked by a blank line between the sentences around them; the budget
+    counts those separators.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    ranges = _candidates(text)
+    if not ranges:
+        return text[:max_chars]
+
+    scores = rank_sentences([text[start:end] for start, end in ranges])
+    chosen, used = [], 0
+    for index in sorted(range(len(ranges)), key=lambda i: -scores[i]):
+        start, end = ranges[index]
+        # Room for the separator too: a space, or a blank line where sentences were skipped
+        size = end - start + 2
+        if used + size <= max_chars:
+            chosen.append(index)
+            used += size
+        if max_chars - used < MIN_SENTENCE_CHARS:
+            break
+    if not chosen:
+        start, end = ranges[int(scores.argmax())]
+        return text[start:min(end, start + max_chars)]
+
+    parts = []
+    for position, index in enumerate(sorted(chosen)):
+        if position:
+            parts.append(" " if index == previous + 1 else "\n\n")
+        start, end = ranges[index]
+        parts.append(text[start:end])
+        previous = index
+    return "".join(parts)
+
+async def condensed_text(content: str, max_tokens: int, content_file: Optional[Path] = None) -> str:
+    """`condense` off the event loop, cached beside `content_file` when there is one"""
+    if len(content) <= max_tokens * CHARS_PER_TOKEN:
+        return content
+    signature = {"version": EXTRACT_VERSION, "maxTokens": max_tokens, "textLength": len(content)}
+    if content_file is not None:
+        try:
+            cached = await async_read_json(extract_path(content_file))
+            if all(cached.get(key) == value for key, value in signature.items()):
+                return cached["text"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+    try:
+        extract = await asyncio.to_thread(condense, content, max_tokens)
+    except ImportError:
+        logger.warning("numpy is not installed; truncating LLM input instead of condensing it")
+        return content[:max_tokens * CHARS_PER_TOKEN]
+    if content_file is not None:
+        try:
+            await async_write_json(extract_path(content_file), {**signature, "text": extract})
+        except OSError as e:
+            logger.warning(f"Could not cache extract of {content_file.name}: {e}")
+    return extract
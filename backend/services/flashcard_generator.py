@@ -0,0 +1,167 @@
+import json
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional
+import logging
+from .settings import Settings, get_settings
+from .llm_client import chat_completion
+from .storage import read_json, async_read_text, async_write_json
+from .extractive import condensed_text
+from .deadlines import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+CARD_TYPES = ("qa", "term", "concept")
+
+def deck_path(content_file: Path, card_type: str) -> Path:
+    """Stored deck for a processed document, next to its .summary.md"""
+    return content_file.with_suffix(f".flashcards.{card_type}.json")
+
+class FlashcardGenerator:
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.model = self.settings.summary_model
+        self.use_real_api = self.settings.use_real_api
+
+        if not self.use_real_api:
+            logger.warning("OpenAI API key not configured. Using mock flashcards.")
+
+    async def get_flashcards(self, content_file: Path, card_count: int, card_type: str,
+                             regenerate: bool = False) -> List[Dict[str, str]]:
+        """Serve cards from the stored deck, generating only when asked or when it is too small"""
+        deck = [] if regenerate else await asyncio.to_thread(self.load_deck, content_file, card_type)
+        if len(deck) >= card_count:
+            return deck[:card_count]
+
+        if not self.use_real_api:
+            return self._generate_mock_flashcards(card_count, card_type)
+
+        content = await async_read_text(content_file)
+        try:
+            flashcards = await self.generate_flashcards(content, card_count, card_type, fallback=False,
+                                                        content_file=content_file)
+        except Exception as e:
+            logger.error(f"Error generating AI flashcards: {e}")
+            if isinstance(e, DeadlineExceeded) and not deck:
+                raise
+            return deck[:card_count] or self._generate_mock_flashcards(card_count, card_type)
+
+        if regenerate or len(flashcards) > len(deck):
+            await async_write_json(deck_path(content_file, card_type), flashcards)
+        return flashcards
+
+    def load_deck(self, content_file: Path, card_type: str) -> List[Dict[str, str]]:
+        try:
+            return read_json(deck_path(content_file, card_type))
+        except (OSError, ValueError):
+            return []
+
+    async def pregenerate(self, content_file: Path, content: str, card_count: int):
+        """Build and store one deck per card type"""
+        async def build(card_type: str):
+            cards = await self.generate_flashcards(content, card_count, card_type,
+                                                   service="flashcards_pregen", fallback=False,
+                                                   content_file=content_file)
+            await async_write_json(deck_path(content_file, card_type), cards)
+
+        await asyncio.gather(*(build(card_type) for card_type in CARD_TYPES))
+
+    async def generate_flashcards(self, content: str, card_count: int, card_type: str,
+                                  service: str = "flashcards", fallback: bool = True,
+                                  content_file: Optional[Path] = None) -> List[Dict[str, str]]:
+        """Generate flashcards using OpenAI API (fallback=False raises instead of returning mock cards).
+
+        Long content is condensed to its key sentences first, cached beside
+        `content_file` when given.
+        """
+        try:
+            if not self.use_real_api:
+                # Return mock flashcards if no API key
+                return self._generate_mock_flashcards(card_count, card_type)
+
+            # Create prompt based on card type
+            type_instructions = {
+                "qa": "Create question and answer flashcards",
+                "term": "Create term and definition flashcards",
+                "concept": "Create concept and explanation flashcards"
+            }
+
+            excerpt = await condensed_text(content, self.settings.extract_max_tokens, content_file)
+            prompt = f"""Create {card_count} {type_instructions.get(card_type, "question and answer")} flashcards from the following educational content:
+
+{excerpt}
+
+For each flashcard, provide:
+- front: The question/term/concept
+- back: The answer/definition/explanation
+
+Return as JSON array with format:
+[
+  {{"front": "question", "back": "answer"}},
+  {{"front": "question", "back": "answer"}}
+]
+
+Make the content educational and helpful for learning."""
+
+            response_text = await chat_completion(
+                service,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are an expert educational content creator. Create high-quality flashcards that help students learn effectively."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=1500 if card_count <= 10 else 3000,
+                temperature=0.7
+            )
+
+            # Try to extract JSON from response
+            try:
+                # Find JSON array in response
+                start_idx = response_text.find('[')
+                end_idx = response_text.rfind(']') + 1
+                if start_idx != -1 and end_idx != 0:
+                    json_str = response_text[start_idx:end_idx]
+                    flashcards = json.loads(json_str)
+                    return flashcards[:card_count]  # Limit to requested count
+            except json.JSONDecodeError:
+                pass
+
+            if not fallback:
+                raise ValueError("No flashcard JSON array in AI response")
+            # Fallback to mock if parsing fails
+            return self._generate_mock_flashcards(card_count, card_type)
+
+        except Exception as e:
+            if not fallback or isinstance(e, DeadlineExceeded):
+                raise
+            logger.error(f"Error generating AI flashcards: {e}")
+            return self._generate_mock_flashcards(card_count, card_type)
+
+    def _generate_mock_flashcards(self, card_count: int, card_type: str) -> List[Dict[str, str]]:
+        """Generate mock flashcards as fallback"""
+        mock_data = {
+            "qa": [
+                {"front": "What is software engineering?", "back": "Software engineering is the systematic approach to designing, developing, and maintaining software systems."},
+                {"front": "What are the main phases of software development?", "back": "Requirements, Design, Implementation, Testing, Deployment, and Maintenance."},
+                {"front": "What is a software requirement?", "back": "A software requirement is a description of what the software should do or how it should behave."},
+                {"front": "What is version control?", "back": "Version control is a system that records changes to files over time, allowing you to recall specific versions."},
+                {"front": "What is debugging?", "back": "Debugging is the process of finding and fixing errors or bugs in software code."}
+            ],
+            "term": [
+                {"front": "Algorithm", "back": "A step-by-step procedure for solving a problem or completing a task."},
+                {"front": "API", "back": "Application Programming Interface - a set of protocols and tools for building software applications."},
+                {"front": "Database", "back": "An organized collection of data that can be easily accessed, managed, and updated."},
+                {"front": "Framework", "back": "A platform for developing software applications that provides reusable components."},
+                {"front": "IDE", "back": "Integrated Development Environment - a software application that provides comprehensive facilities for software development."}
+            ],
+            "concept": [
+                {"front": "Object-Oriented Programming", "back": "A programming paradigm based on objects that contain data and code to manipulate that data."},
+                {"front": "Agile Development", "back": "A software development methodology that emphasizes iterative development and collaboration."},
+                {"front": "Test-Driven Development", "back": "A software development approach where tests are written before the actual code."},
+                {"front": "Continuous Integration", "back": "The practice of frequently integrating code changes into a shared repository."},
+                {"front": "Microservices Architecture", "back": "A software architecture pattern that structures an application as a collection of loosely coupled services."}
+            ]
+        }
+
+        base_cards = mock_data.get(card_type, mock_data["qa"])
+        return (base_cards * ((card_count // len(base_cards)) + 1))[:card_count]
@@ -0,0 +1,207 @@
+import os
+import time
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+from .settings import Settings, get_settings
+from .storage import atomic_write_json, encode_json, get_writer, read_json, read_text, file_lock
+from .vector_search import GENERATION_FILE, index_entry, index_file_name
+from .search_cache import IndexGeneration
+
+logger = logging.getLogger(__name__)
+
+# Documents per checkpoint; also the unit of work handed to the pool at once
+CHECKPOINT_DOCUMENTS = 200
+MANIFEST_NAME = "rebuild.manifest"
+
+def _document_title(text_path: Path) -> str:
+    try:
+        return read_json(text_path.with_suffix('.metadata.json')).get("originalName") or text_path.name
+    except (OSError, ValueError):
+        return text_path.name
+
+def _index_document(job: Tuple[str, str, int, int]) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    """Pool task: read, chunk and describe one document; returns (source, entry, error)"""
+    storage_root, source, max_tokens, overlap_tokens = job
+    text_path = Path(storage_root) / source
+    try:
+        text = read_text(text_path)
+        return source, index_entry(source, _document_title(text_path), text, max_tokens, overlap_tokens), None
+    except (OSError, ValueError) as e:
+        return source, None, str(e)
+
+class IndexBuilder:
+    """Rebuilds the search index from storage/processed.
+
+    Entries are built into vector-search.rebuild/ by a process pool, and
+    every written entry doubles as a checkpoint: a rebuild that is
+    interrupted resumes with the documents that have no entry yet, as long
+    as the chunking settings are unchanged. When all documents are indexed
+    the staging directory becomes a new generation and the live
+    vector-search path, a symlink, is switched to it with one atomic
+    rename. Where symlinks cannot be created (Windows without the
+    privilege), the generation is renamed to the live path instead. The
+    previous generation is kept until the next rebuild.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.storage_root = self.settings.storage_root
+        self.processed_dir = self.storage_root / "processed"
+        self.live_dir = self.storage_root / "vector-search"
+        self.staging_dir = self.storage_root / "vector-search.rebuild"
+        self.manifest_path = self.staging_dir / MANIFEST_NAME
+
+    def _chunking(self) -> Dict[str, int]:
+        return {"maxTokens": self.settings.chunk_max_tokens, "overlapTokens": self.settings.chunk_overlap_tokens}
+
+    def _documents(self) -> List[str]:
+        return sorted(path.relative_to(self.storage_root).as_posix() for path in self.processed_dir.rglob("*.txt"))
+
+    def is_running(self) -> bool:
+        try:
+            with file_lock(self.staging_dir, blocking=False):
+                return False
+        except BlockingIOError:
+            return True
+
+    def status(self) -> Dict[str, Any]:
+        """Progress of a running or interrupted rebuild and the size of the live index"""
+        try:
+            progress = read_json(self.manifest_path)
+        except (OSError, ValueError):
+            progress = None
+        live = self.live_dir.resolve()
+        return {
+            "running": self.is_running(),
+            "rebuild": progress,
+            "generation": live.name if self.live_dir.is_symlink() else None,
+            "documents": sum(1 for _ in live.glob("*.json")) if live.exists() else 0,
+        }
+
+    def rebuild(self, workers: Optional[int] = None, fresh: bool = False,
+                progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Index every processed document and swap the result in; raises BlockingIOError if one is running"""
+        with file_lock(self.staging_dir, blocking=False):
+            return self._rebuild(workers or os.cpu_count() or 1, fresh, progress)
+
+    def _rebuild(self, workers: int, fresh: bool, progress: Optional[Callable[[int, int], None]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        manifest = self._start(fresh)
+        documents = self._documents()
+        done = {path.name for path in self.staging_dir.glob("*.json")}
+        pending = [source for source in documents if index_file_name(source) not in done]
+        manifest.update({"documents": len(documents), "resumedWith": len(documents) - len(pending)})
+        logger.info(f"Rebuilding search index: {len(pending)} of {len(documents)} documents to index")
+
+        failed: List[str] = []
+        indexed = len(documents) - len(pending)
+        caught_up = datetime.now()
+        # Spawned, not forked: the caller may be a server process with threads running
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            while pending:
+                for offset in range(0, len(pending), CHECKPOINT_DOCUMENTS):
+                    batch = pending[offset:offset + CHECKPOINT_DOCUMENTS]
+                    failed += self._index_batch(pool, batch, workers)
+                    indexed += len(batch)
+                    manifest.update({"indexed": indexed, "failed": len(failed), "updated": datetime.now().isoformat()})
+                    atomic_write_json(self.manifest_path, manifest)
+                    if progress:
+                        progress(indexed, len(documents))
+                # Catch documents uploaded while the rebuild ran
+                caught_up = datetime.now()
+                done = {path.name for path in self.staging_dir.glob("*.json")}
+                pending = [source for source in self._documents()
+                           if index_file_name(source) not in done and source not in failed]
+                documents += pending
+
+        generation = self._swap(caught_up)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Search index rebuilt: {len(documents)} documents in {elapsed:.1f}s, generation {generation}")
+        return {"documents": len(documents), "failed": len(failed), "generation": generation,
+                "seconds": round(elapsed, 2)}
+
+    def _start(self, fresh: bool) -> Dict[str, Any]:
+        """Manifest of the rebuild to continue, or of a new one over an empty staging directory"""
+        try:
+            manifest = read_json(self.manifest_path)
+        except (OSError, ValueError):
+            manifest = None
+        if fresh or manifest is None or manifest.get("chunking") != self._chunking():
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+            manifest = None
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        if manifest is None:
+            manifest = {"started": datetime.now().isoformat(), "chunking": self._chunking(), "indexed": 0}
+            atomic_write_json(self.manifest_path, manifest)
+        else:
+            logger.info(f"Resuming search index rebuild started {manifest.get('started')}")
+        return manifest
+
+    def _index_batch(self, pool: ProcessPoolExecutor, batch: List[str], workers: int) -> List[str]:
+        """Index a batch of documents into the staging directory; returns the ones that failed"""
+        jobs = [(str(self.storage_root), source, self.settings.chunk_max_tokens, self.settings.chunk_overlap_tokens)
+                for source in batch]
+        failed, writes = [], []
+        for source, entry, error in pool.map(_index_document, jobs, chunksize=max(1, len(jobs) // (workers * 4))):
+            if entry is None:
+                # Deleted since listing, or unreadable; nothing to index
+                logger.warning(f"Skipping {source} in search index rebuild: {error}")
+                failed.append(source)
+                continue
+            writes.append(get_writer().submit(self.staging_dir / index_file_name(source), encode_json(entry)))
+        # Committed together, so the batch costs one round of fsyncs
+        for write in writes:
+            write.result()
+        return failed
+
+    def _swap(self, caught_up: datetime) -> str:
+        """Make the staging directory the live index"""
+        self.manifest_path.unlink()
+        generation = self.live_dir.with_name(f"{self.live_dir.name}.{datetime.now().strftime('%Y%m%dT%H%M%S%f')}")
+        name = generation.name
+        os.rename(self.staging_dir, generation)
+
+        previous = self.live_dir.resolve() if self.live_dir.is_symlink() else None
+        if self.live_dir.exists() and previous is None:
+            # Index from before generations: a plain directory can't be replaced atomically,
+            # so this first switch leaves a moment with no index
+            previous = self.live_dir.with_name(f"{self.live_dir.name}.legacy")
+            shutil.rmtree(previous, ignore_errors=True)
+            os.rename(self.live_dir, previous)
+        link = self.live_dir.with_name(f"{self.live_dir.name}.swap")
+        link.unlink(missing_ok=True)
+        try:
+            os.symlink(generation.name, link, target_is_directory=True)
+        except OSError as e:
+            # No symlinks here: the live index stays a plain directory, and
+            # like the first switch above, this leaves a moment with no index
+            logger.info(f"Cannot symlink the search index ({e}); renaming the new generation into place")
+            if self.live_dir.is_symlink():
+                self.live_dir.unlink()
+            os.rename(generation, self.live_dir)
+            generation = self.live_dir
+        else:
+            os.replace(link, self.live_dir)
+
+        if previous is not None:
+            self._carry_over(previous, generation, caught_up)
+        # Cached search results predate the new index
+        IndexGeneration(self.storage_root / GENERATION_FILE).bump()
+        for old in self.storage_root.glob(f"{self.live_dir.name}.*"):
+            if old.is_dir() and old not in (generation, previous, self.staging_dir):
+                shutil.rmtree(old, ignore_errors=True)
+        return name
+
+    def _carry_over(self, previous: Path, generation: Path, since: datetime):
+        """Copy entries added to the old index after the last scan, e.g. by uploads finishing meanwhile"""
+        cutoff = since.timestamp()
+        for entry_file in previous.glob("*.json"):
+            target = generation / entry_file.name
+            if entry_file.stat().st_mtime >= cutoff and not target.exists():
+                shutil.copy2(entry_file, target)
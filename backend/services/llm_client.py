@@ -0,0 +1,135 @@
+import time
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+import logging
+from .settings import Settings, get_settings
+from .metrics import LLM_REQUESTS, LLM_REQUEST_SECONDS, LLM_TOKENS
+from .tracing import span
+from .llm_transport import LLMTransport, OpenAITransport, RecordingTransport, ReplayTransport
+from .llm_scheduler import LLMScheduler, estimate_tokens, rate_limit_delay
+from .deadlines import run_stage
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_loop = None
+_client_lock = threading.Lock()
+_transport: Optional[LLMTransport] = None
+_scheduler: Optional[LLMScheduler] = None
+
+def get_openai_client(settings: Optional[Settings] = None):
+    """Return the shared async OpenAI client, importing openai on first use.
+
+    The client holds a connection pool, so every service shares one instance
+    instead of each building its own. Calls are made on the event loop, so
+    cancelling the awaiting task aborts the HTTP request. The pool belongs
+    to one loop; a new loop (as in tests) gets a new client.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        with _client_lock:
+            if _client is None or _client_loop is not loop:
+                settings = settings or get_settings()
+                import openai
+                # Retries on 429 are left to the scheduler, which backs off for every caller
+                _client = openai.AsyncOpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url,
+                                             max_retries=0)
+                _client_loop = loop
+                logger.info("Initialized OpenAI client")
+    return _client
+
+def _recording_path(settings: Settings):
+    return settings.llm_recording_path or settings.storage_root / "llm-recordings" / "recording.jsonl"
+
+def build_transport(settings: Settings) -> LLMTransport:
+    """Transport for LLM_MODE: live (default), record or replay"""
+    if settings.llm_mode == "replay":
+        logger.info(f"Replaying LLM calls from {_recording_path(settings)}")
+        return ReplayTransport(_recording_path(settings), settings.llm_replay_latency_scale)
+    live = OpenAITransport(lambda: get_openai_client(settings))
+    if settings.llm_mode == "record":
+        logger.info(f"Recording LLM calls to {_recording_path(settings)}")
+        return RecordingTransport(live, _recording_path(settings))
+    if settings.llm_mode != "live":
+        logger.warning(f"Unknown LLM_MODE {settings.llm_mode!r}, using live")
+    return live
+
+def get_transport() -> LLMTransport:
+    global _transport
+    if _transport is None:
+        with _client_lock:
+            if _transport is None:
+                _transport = build_transport(get_settings())
+    return _transport
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _client_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(get_settings())
+    return _scheduler
+
+async def _scheduled(service: str, model: str, tokens: int, call):
+    """Run `call` once the scheduler admits it, retrying after 429s"""
+    scheduler = get_scheduler()
+    attempts = get_settings().llm_max_retries + 1
+    for attempt in range(attempts):
+        async with scheduler.slot(service, model, tokens):
+            try:
+                result = await call()
+            except Exception as e:
+                delay = rate_limit_delay(e)
+                if delay is None or attempt == attempts - 1:
+                    raise
+                scheduler.on_rate_limited(model, delay)
+                continue
+        scheduler.on_success(model)
+        return result
+
+async def chat_completion(service: str, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+    """Run a chat completion through the LLM transport and return the reply text.
+
+    `service` names the caller (chat, quiz, flashcards, ...) and labels the
+    call count, latency and token metrics. Queueing and the call together
+    get LLM_TIMEOUT_SECONDS, less if the request's deadline is sooner.
+    """
+    start = time.perf_counter()
+    status = "error"
+    try:
+        estimated = estimate_tokens(messages, kwargs.get("max_tokens"))
+        with span(f"llm.{service}", model=model):
+            result = await run_stage(f"llm.{service}", _scheduled(
+                service, model, estimated, lambda: get_transport().chat(service, model, messages, **kwargs)),
+                get_settings().llm_timeout)
+        used = result.prompt_tokens + result.completion_tokens
+        if used:
+            get_scheduler().settle(model, estimated, used)
+        status = "ok"
+    finally:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, service=service, model=model)
+        LLM_REQUESTS.inc(service=service, model=model, status=status)
+
+    LLM_TOKENS.inc(result.prompt_tokens, service=service, model=model, kind="prompt")
+    LLM_TOKENS.inc(result.completion_tokens, service=service, model=model, kind="completion")
+    return result.content
+
+async def transcribe_audio(service: str, model: str, file, **kwargs: Any) -> str:
+    """Transcribe an open audio file through the LLM transport, within MEDIA_TIMEOUT"""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        async def call():
+            file.seek(0)  # a retried attempt must send the whole file again
+            return await get_transport().transcribe(service, model, file, **kwargs)
+
+        with span(f"llm.{service}", model=model):
+            result = await run_stage(f"llm.{service}", _scheduled(service, model, 0, call),
+                                     get_settings().media_timeout)
+        status = "ok"
+    finally:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, service=service, model=model)
+        LLM_REQUESTS.inc(service=service, model=model, status=status)
+    return result.text
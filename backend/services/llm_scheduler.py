@@ -0,0 +1,226 @@
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+import logging
+from .settings import Settings, get_settings
+from .metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_RATE_LIMITED
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+INTERACTIVE, GENERATION, BACKGROUND, BULK = range(4)
+PRIORITY_NAMES = {INTERACTIVE: "interactive", GENERATION: "generation", BACKGROUND: "background", BULK: "bulk"}
+
+SERVICE_PRIORITIES = {
+    "chat": INTERACTIVE,
+    "quiz": GENERATION,
+    "flashcards": GENERATION,
+    "assignment": GENERATION,
+    "summary": BACKGROUND,
+    "transcription": BACKGROUND,
+    "flashcards_pregen": BACKGROUND,
+    "quiz_pregen": BACKGROUND,
+    "grading": BULK,
+}
+
+# Share of each bucket a class may not dip into, kept free for higher classes
+RESERVED_FRACTION = {INTERACTIVE: 0.0, GENERATION: 0.1, BACKGROUND: 0.25, BULK: 0.4}
+
+MAX_BACKOFF = 60.0
+
+def rate_limit_delay(error: Exception) -> Optional[float]:
+    """Seconds to back off if the error is a 429 (0.0 when no Retry-After), else None"""
+    status = getattr(error, "status_code", None)
+    if status is None and type(error).__name__ == "ReplayedError":
+        status = 429 if str(error).startswith("RateLimitError") else None
+    if status != 429:
+        return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", 0)))
+    except (TypeError, ValueError):
+        return 0.0
+
+class TokenBucket:
+    """Refills `limit` units per minute, times a factor lowered after 429s"""
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.tokens = limit
+        self.factor = 1.0
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.limit <= 0
+
+    def refill(self, now: float):
+        if self.unlimited:
+            return
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit * self.factor / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve_fraction: float) -> float:
+        """0 if `amount` can be taken while leaving the reserve, else seconds until it can"""
+        if self.unlimited:
+            return 0.0
+        needed = min(amount, self.limit) + self.limit * reserve_fraction
+        needed = min(needed, self.limit)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) * 60.0 / (self.limit * self.factor)
+
+class _ModelState:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.waiting: List[Tuple[int, int]] = []
+        self.changed = asyncio.Event()
+        self.paused_until = 0.0
+        self.failures = 0
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def try_take(self, priority: int, tokens: int) -> float:
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        reserve = RESERVED_FRACTION.get(priority, 0.0)
+        wait = max(self.requests.wait_time(1, reserve), self.tokens.wait_time(tokens, reserve))
+        if wait == 0.0:
+            self.requests.tokens -= 1
+            self.tokens.tokens -= tokens
+        return wait
+
+class LLMScheduler:
+    """Admits outbound LLM calls per model under request and token per-minute limits.
+
+    Waiting calls are served strictly by priority class, then arrival. Lower
+    classes also leave part of each bucket unused so a chat turn arriving
+    during a background burst finds capacity immediately. A 429 pauses the
+    model for Retry-After (or an exponential backoff) and halves its refill
+    rate, which then recovers step by step with successful calls.
+
+    Limits are per process: with several workers each gets its share.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        workers = max(1, self.settings.workers)
+        self.default_limits = (self.settings.llm_requests_per_minute / workers,
+                               self.settings.llm_tokens_per_minute / workers)
+        self.model_limits = {
+            model: (rpm / workers, tpm / workers)
+            for model, (rpm, tpm) in parse_model_limits(self.settings.llm_model_limits).items()
+        }
+        self._models: Dict[str, _ModelState] = {}
+        self._sequence = itertools.count()
+        self._loop = None
+
+    def _state(self, model: str) -> _ModelState:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # asyncio primitives belong to one loop; start fresh on a new one
+            self._loop = loop
+            self._models = {}
+        state = self._models.get(model)
+        if state is None:
+            state = self._models[model] = _ModelState(*self.model_limits.get(model, self.default_limits))
+        return state
+
+    @asynccontextmanager
+    async def slot(self, service: str, model: str, tokens: int = 0):
+        """Wait for capacity, then run the call inside the block"""
+        priority = SERVICE_PRIORITIES.get(service, GENERATION)
+        state = self._state(model)
+        ticket = (priority, next(self._sequence))
+        heapq.heappush(state.waiting, ticket)
+        labels = {"priority": PRIORITY_NAMES[priority]}
+        LLM_QUEUE_DEPTH.inc(**labels)
+        start = time.perf_counter()
+        try:
+            with span("llm.queue", priority=labels["priority"]):
+                while True:
+                    wait = state.try_take(priority, tokens) if state.waiting[0] == ticket else None
+                    if wait == 0.0:
+                        heapq.heappop(state.waiting)
+                        break
+                    changed = state.changed
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+        except BaseException:
+            # Cancelled while queued: give up the place in line
+            if ticket in state.waiting:
+                state.waiting.remove(ticket)
+                heapq.heapify(state.waiting)
+            raise
+        finally:
+            LLM_QUEUE_DEPTH.dec(**labels)
+            LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start, model=model, **labels)
+            state.notify()
+        yield
+
+    def is_saturated(self, model: str) -> bool:
+        """Whether a background call to `model` would have to wait: paused, queued or out of capacity"""
+        state = self._state(model)
+        now = time.monotonic()
+        if now < state.paused_until or state.waiting:
+            return True
+        state.requests.refill(now)
+        return state.requests.wait_time(1, RESERVED_FRACTION[BACKGROUND]) > 0
+
+    def settle(self, model: str, estimated_tokens: int, actual_tokens: int):
+        """Correct the token bucket once the real usage is known"""
+        state = self._state(model)
+        if not state.tokens.unlimited:
+            state.tokens.tokens += estimated_tokens - actual_tokens
+
+    def on_success(self, model: str):
+        state = self._state(model)
+        state.failures = 0
+        for bucket in (state.requests, state.tokens):
+            bucket.factor = min(1.0, bucket.factor + 0.05)
+
+    def on_rate_limited(self, model: str, retry_after: float) -> float:
+        """Pause the model and slow its refill; returns the pause in seconds"""
+        state = self._state(model)
+        state.failures += 1
+        delay = retry_after or min(MAX_BACKOFF, 2 ** (state.failures - 1)) * random.uniform(0.8, 1.2)
+        state.paused_until = max(state.paused_until, time.monotonic() + delay)
+        for bucket in (state.requests, state.tokens):
+            bucket.factor = max(0.1, bucket.factor * 0.5)
+        LLM_RATE_LIMITED.inc(model=model)
+        logger.warning(f"LLM rate limited on {model}; pausing {delay:.1f}s")
+        state.notify()
+        return delay
+
+def parse_model_limits(value: str) -> Dict[str, Tuple[float, float]]:
+    """Parse LLM_MODEL_LIMITS, e.g. "gpt-4o-mini=500:200000,whisper-1=50:0" (0 = unlimited)"""
+    limits = {}
+    for part in (value or "").split(","):
+        if not part.strip():
+            continue
+        try:
+            model, _, numbers = part.partition("=")
+            rpm, _, tpm = numbers.partition(":")
+            limits[model.strip()] = (float(rpm or 0), float(tpm or 0))
+        except ValueError:
+            logger.warning(f"Ignoring invalid LLM_MODEL_LIMITS entry: {part}")
+    return limits
+
+def estimate_tokens(messages, max_tokens: Optional[int]) -> int:
+    """Rough prompt size (4 characters per token) plus the completion budget"""
+    prompt = sum(len(str(message.get("content", ""))) for message in messages) // 4
+    return prompt + (max_tokens or 500)
@@ -0,0 +1,216 @@
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+from .metrics import LLM_REPLAY_MISSES
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ChatResult:
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+@dataclass
+class TranscriptionResult:
+    text: str
+
+class ReplayedError(RuntimeError):
+    """A call that failed while recording, raised again on replay"""
+
+class LLMTransport:
+    """How LLM calls leave the process: live API, recording, or offline replay"""
+
+    async def chat(self, service: str, model: str, messages: List[Dict[str, str]], **params: Any) -> ChatResult:
+        raise NotImplementedError
+
+    async def transcribe(self, service: str, model: str, file, **params: Any) -> TranscriptionResult:
+        raise NotImplementedError
+
+class OpenAITransport(LLMTransport):
+    """Calls the OpenAI API through the shared async client"""
+
+    def __init__(self, client_factory):
+        self.client_factory = client_factory
+
+    async def chat(self, service, model, messages, **params):
+        response = await self.client_factory().chat.completions.create(
+            model=model,
+            messages=messages,
+            **params
+        )
+        usage = getattr(response, "usage", None)
+        return ChatResult(
+            content=response.choices[0].message.content,
+            prompt_tokens=(usage.prompt_tokens or 0) if usage else 0,
+            completion_tokens=(usage.completion_tokens or 0) if usage else 0,
+        )
+
+    async def transcribe(self, service, model, file, **params):
+        response = await self.client_factory().audio.transcriptions.create(
+            model=model,
+            file=file,
+            **params
+        )
+        return TranscriptionResult(response if isinstance(response, str) else response.text)
+
+def _file_digest(file) -> str:
+    """sha256 of an open file's content, leaving the position where it was"""
+    position = file.tell()
+    digest = hashlib.sha256()
+    for block in iter(lambda: file.read(1 << 20), b""):
+        digest.update(block)
+    file.seek(position)
+    return digest.hexdigest()
+
+def request_key(kind: str, model: str, payload: Any, params: Dict[str, Any]) -> str:
+    """Stable identity of a request: same model, input and parameters, same key"""
+    canonical = json.dumps({"kind": kind, "model": model, "payload": payload, "params": params},
+                           sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class RecordingTransport(LLMTransport):
+    """Passes calls through and appends request, response and timing as JSON lines.
+
+    Workers append to the same file under a file lock, so one recording
+    covers a multi-worker run.
+    """
+
+    def __init__(self, inner: LLMTransport, path: Path):
+        self.inner = inner
+        self.path = Path(path)
+
+    async def chat(self, service, model, messages, **params):
+        key = request_key("chat", model, messages, params)
+        request = {"messages": messages, "params": params}
+        start = time.perf_counter()
+        try:
+            result = await self.inner.chat(service, model, messages, **params)
+        except Exception as e:
+            await self._append("chat", key, service, model, request, start, error=f"{type(e).__name__}: {e}")
+            raise
+        await self._append("chat", key, service, model, request, start, response={
+            "content": result.content,
+            "promptTokens": result.prompt_tokens,
+            "completionTokens": result.completion_tokens,
+        })
+        return result
+
+    async def transcribe(self, service, model, file, **params):
+        digest = await asyncio.to_thread(_file_digest, file)
+        key = request_key("transcription", model, digest, params)
+        request = {"fileSha256": digest, "fileName": Path(getattr(file, "name", "")).name, "params": params}
+        start = time.perf_counter()
+        try:
+            result = await self.inner.transcribe(service, model, file, **params)
+        except Exception as e:
+            await self._append("transcription", key, service, model, request, start, error=f"{type(e).__name__}: {e}")
+            raise
+        await self._append("transcription", key, service, model, request, start, response={"text": result.text})
+        return result
+
+    async def _append(self, kind: str, key: str, service: str, model: str, request: Dict[str, Any],
+                      start: float, response: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        entry = {
+            "key": key,
+            "kind": kind,
+            "service": service,
+            "model": model,
+            "request": request,
+            "durationMs": round((time.perf_counter() - start) * 1000, 3),
+            "recordedAt": datetime.now().isoformat(),
+        }
+        if error is not None:
+            entry["error"] = error
+        else:
+            entry["response"] = response
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        try:
+            await asyncio.to_thread(self._write_line, line)
+        except OSError as e:
+            logger.error(f"Error writing LLM recording {self.path}: {e}")
+
+    def _write_line(self, line: str):
+        from .storage import file_lock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.path):
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+@dataclass
+class _Recordings:
+    by_key: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    by_service: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = field(default_factory=dict)
+    positions: Dict[Any, int] = field(default_factory=dict)
+
+class ReplayTransport(LLMTransport):
+    """Serves recorded responses offline, sleeping the recorded duration times latency_scale.
+
+    Requests are matched by key; repeated identical requests get the
+    recorded responses in order. A request that was never recorded (e.g. a
+    chat turn whose history differs) gets the next recording from the same
+    service and model instead, and counts as a replay miss.
+    """
+
+    def __init__(self, path: Path, latency_scale: float = 1.0):
+        self.path = Path(path)
+        self.latency_scale = latency_scale
+        self._recordings: Optional[_Recordings] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> _Recordings:
+        if self._recordings is None:
+            with self._lock:
+                if self._recordings is None:
+                    recordings = _Recordings()
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            if not line.strip():
+                                continue
+                            entry = json.loads(line)
+                            recordings.by_key.setdefault(entry["key"], []).append(entry)
+                            group = (entry["kind"], entry["service"], entry["model"])
+                            recordings.by_service.setdefault(group, []).append(entry)
+                    logger.info(f"Loaded {sum(len(v) for v in recordings.by_key.values())} LLM recordings from {self.path}")
+                    self._recordings = recordings
+        return self._recordings
+
+    def _next(self, recordings: _Recordings, bucket: Any, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            position = recordings.positions.get(bucket, 0)
+            recordings.positions[bucket] = position + 1
+        return entries[position % len(entries)]
+
+    async def _serve(self, kind: str, service: str, model: str, key: str) -> Dict[str, Any]:
+        recordings = self._load()
+        if key in recordings.by_key:
+            entry = self._next(recordings, key, recordings.by_key[key])
+        else:
+            group = (kind, service, model)
+            entries = recordings.by_service.get(group)
+            if not entries:
+                raise LookupError(f"No recorded {kind} calls for {service}/{model} in {self.path}")
+            LLM_REPLAY_MISSES.inc(service=service)
+            entry = self._next(recordings, group, entries)
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["durationMs"] / 1000 * self.latency_scale)
+        if "error" in entry:
+            raise ReplayedError(entry["error"])
+        return entry["response"]
+
+    async def chat(self, service, model, messages, **params):
+        response = await self._serve("chat", service, model, request_key("chat", model, messages, params))
+        return ChatResult(response["content"], response.get("promptTokens", 0), response.get("completionTokens", 0))
+
+    async def transcribe(self, service, model, file, **params):
+        digest = await asyncio.to_thread(_file_digest, file)
+        response = await self._serve("transcription", service, model,
+                                     request_key("transcription", model, digest, params))
+        return TranscriptionResult(response["text"])
@@ -0,0 +1,317 @@
+import os
+import uuid
+import bisect
+import shutil
+import asyncio
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+from .settings import Settings, get_settings
+from .storage import atomic_write_json, read_json
+
+logger = logging.getLogger(__name__)
+
+# Speech-grade mono Opus: what Whisper needs, a small fraction of the video's size
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_FORMAT = "ogg"
+
+# Voice activity detection, on 30 ms frames of the 16 kHz signal
+VAD_FRAME_SECONDS = 0.03
+# Speech is louder than the quietest tenth of the recording by this much...
+VAD_MARGIN_DB = 12.0
+# ...and louder than this in absolute terms (dBFS)
+VAD_FLOOR_DB = -55.0
+# Kept around each stretch of speech so words are not clipped
+VAD_PADDING_SECONDS = 0.25
+VAD_BLOCK_FRAMES = 10000
+
+class MediaToolMissing(RuntimeError):
+    """ffmpeg is not installed or not on PATH"""
+
+class TimeMap:
+    """Maps times in conditioned (silence-trimmed) audio back to the original recording.
+
+    Each segment is (conditioned start, original start, duration) in
+    seconds, for one stretch of audio that was kept.
+    """
+
+    def __init__(self, segments: List[Tuple[float, float, float]], original_seconds: float):
+        self.segments = segments
+        self.original_seconds = original_seconds
+        self._starts = [segment[0] for segment in segments]
+
+    @property
+    def kept_seconds(self) -> float:
+        return sum(segment[2] for segment in self.segments)
+
+    def to_original(self, seconds: float) -> float:
+        """Original recording time of a time in the conditioned audio"""
+        if not self.segments:
+            return seconds
+        index = max(0, bisect.bisect_right(self._starts, seconds) - 1)
+        conditioned_start, original_start, duration = self.segments[index]
+        return original_start + min(max(seconds - conditioned_start, 0.0), duration)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sampleRate": AUDIO_SAMPLE_RATE,
+            "originalSeconds": round(self.original_seconds, 3),
+            "keptSeconds": round(self.kept_seconds, 3),
+            "segments": [[round(value, 3) for value in segment] for segment in self.segments],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TimeMap":
+        return cls([tuple(segment) for segment in data["segments"]], data["originalSeconds"])
+
+@dataclass
+class PreparedAudio:
+    """Audio ready for transcription, and how its times relate to the upload's (if trimmed)"""
+    path: Path
+    time_map: Optional[TimeMap] = None
+    time_map_path: Optional[Path] = None
+    # Seconds of audio to transcribe, if known
+    duration: Optional[float] = None
+
+def speech_segments(samples, min_silence: float) -> List[Tuple[int, int]]:
+    """(start, end) sample ranges to keep: everything but silences longer than `min_silence` seconds.
+
+    A frame is speech when its energy clears both a margin over the
+    recording's noise floor and an absolute floor; speech is padded on
+    both sides before silences are measured.
+    """
+    import numpy as np  # deferred: only needed when audio is conditioned
+
+    frame = int(AUDIO_SAMPLE_RATE * VAD_FRAME_SECONDS)
+    frames = len(samples) // frame
+    if frames == 0:
+        return [(0, len(samples))] if len(samples) else []
+
+    # Energy per frame in dBFS, a block at a time so long recordings are not copied whole as floats
+    framed = samples[:frames * frame].reshape(frames, frame)
+    energy_db = np.empty(frames, dtype=np.float32)
+    for block in range(0, frames, VAD_BLOCK_FRAMES):
+        signal = framed[block:block + VAD_BLOCK_FRAMES].astype(np.float32) / 32768.0
+        energy_db[block:block + VAD_BLOCK_FRAMES] = 10.0 * np.log10(np.mean(signal * signal, axis=1) + 1e-10)
+    threshold = max(VAD_FLOOR_DB, float(np.percentile(energy_db, 10)) + VAD_MARGIN_DB)
+    speech = energy_db > threshold
+    if not speech.any():
+        return []
+
+    # Pad speech by dilating it over neighbouring frames
+    pad = int(round(VAD_PADDING_SECONDS / VAD_FRAME_SECONDS))
+    counts = np.convolve(speech.astype(np.int32), np.ones(2 * pad + 1, dtype=np.int32), mode="same")
+    keep = counts > 0
+
+    # Gaps shorter than min_silence stay: they are the pauses of natural speech
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], keep.astype(np.int8), [1]))))
+    min_frames = int(round(min_silence / VAD_FRAME_SECONDS))
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start < min_frames:
+            keep[start:end] = True
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], keep.astype(np.int8), [0]))))
+    segments = [(int(start) * frame, int(end) * frame) for start, end in zip(edges[::2], edges[1::2])]
+    # The tail shorter than a frame goes with the last segment if that reaches it
+    if segments and segments[-1][1] == frames * frame:
+        segments[-1] = (segments[-1][0], len(samples))
+    return segments
+
+class AudioExtractor:
+    """Derives compact transcription audio from uploaded media with ffmpeg.
+
+    The audio track is decoded to 16 kHz mono, stretches of silence longer
+    than VAD_MIN_SILENCE_SECONDS are cut out (voice activity detection on
+    frame energy), and the rest is encoded as low-bitrate Opus, so the
+    transcription upload carries neither video frames nor dead air. A time
+    map from the trimmed audio back to the recording is saved beside it.
+
+    ffmpeg runs as a subprocess from a small thread pool, which bounds how
+    many run at once per worker. Results are cached in storage/derived/audio/
+    under a name derived from the source's size and mtime and the
+    conditioning settings, so reprocessing an upload reuses its audio.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.derived_dir = self.settings.storage_root / "derived" / "audio"
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._ffmpeg: Optional[str] = None
+        self._numpy_missing_logged = False
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.settings.media_workers,
+                                            thread_name_prefix="media")
+        return self._pool
+
+    def ffmpeg(self) -> str:
+        if self._ffmpeg is None:
+            found = shutil.which(self.settings.ffmpeg_path)
+            if not found:
+                raise MediaToolMissing(f"ffmpeg not found ({self.settings.ffmpeg_path})")
+            self._ffmpeg = found
+        return self._ffmpeg
+
+    def _trim_silence(self) -> bool:
+        if not self.settings.vad_enabled:
+            return False
+        try:
+            import numpy  # noqa: F401
+            return True
+        except ImportError:
+            if not self._numpy_missing_logged:
+                logger.warning("numpy is not installed; audio is transcribed without silence trimming")
+                self._numpy_missing_logged = True
+            return False
+
+    def derived_path(self, source: Path, trim: bool) -> Path:
+        """Cache file for `source`'s audio; changes when the source or the conditioning does"""
+        stat = source.stat()
+        vad = f"vad{self.settings.vad_min_silence}" if trim else "novad"
+        signature = f"{stat.st_size}:{stat.st_mtime_ns}:{self.settings.audio_bitrate}:{AUDIO_SAMPLE_RATE}:{vad}"
+        digest = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:12]
+        return self.derived_dir / f"{source.stem}.{digest}.{AUDIO_FORMAT}"
+
+    async def prepare_audio(self, source: Path) -> PreparedAudio:
+        """`source`'s transcription audio, conditioning it on first use"""
+        trim = self._trim_silence()
+        target = self.derived_path(source, trim)
+        map_path = target.with_suffix(".timemap.json")
+        if not target.exists():
+            loop = asyncio.get_running_loop()
+            work = self._condition if trim else self._transcode
+            await loop.run_in_executor(self._executor(), work, source, target)
+            logger.info(f"Prepared audio for {source.name}: {source.stat().st_size / 1e6:.1f} MB -> "
+                        f"{target.stat().st_size / 1e6:.1f} MB")
+        else:
+            logger.info(f"Reusing derived audio for {source.name}")
+        if trim and map_path.exists():
+            time_map = TimeMap.from_dict(read_json(map_path))
+            return PreparedAudio(target, time_map, map_path, time_map.kept_seconds)
+        return PreparedAudio(target, duration=self._estimate_seconds(target))
+
+    def _estimate_seconds(self, target: Path) -> Optional[float]:
+        """Length of constant-bitrate audio from its size"""
+        bitrate = self.settings.audio_bitrate.lower()
+        try:
+            bits_per_second = float(bitrate[:-1]) * 1000 if bitrate.endswith("k") else float(bitrate)
+        except ValueError:
+            return None
+        return target.stat().st_size * 8 / bits_per_second if bits_per_second > 0 else None
+
+    def _partial(self, target: Path) -> Path:
+        # Written beside the target and renamed, so a cached file is always complete
+        return target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.partial")
+
+    def _run(self, command: List[str], source: Path) -> bytes:
+        try:
+            result = subprocess.run(command, check=True, capture_output=True,
+                                    timeout=self.settings.media_timeout)
+        except subprocess.CalledProcessError as e:
+            stderr = e.stderr.decode('utf-8', 'replace').strip().splitlines()
+            raise RuntimeError(f"ffmpeg failed on {source.name}: {stderr[-1] if stderr else e}") from e
+        return result.stdout
+
+    def _run_streamed(self, command: List[str], source: Path, chunks):
+        """Run ffmpeg writing each buffer of `chunks` to its stdin, so the input is never joined in memory"""
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+            timed_out = threading.Event()
+
+            def kill():
+                timed_out.set()
+                process.kill()
+
+            watchdog = threading.Timer(self.settings.media_timeout, kill)
+            watchdog.start()
+            try:
+                try:
+                    for chunk in chunks:
+                        process.stdin.write(chunk)
+                except BrokenPipeError:
+                    pass  # ffmpeg exited early; its status and stderr say why
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                returncode = process.wait()
+            finally:
+                watchdog.cancel()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+            if timed_out.is_set():
+                raise RuntimeError(f"ffmpeg timed out on {source.name} after {self.settings.media_timeout:.0f}s")
+            if returncode:
+                stderr.seek(0)
+                lines = stderr.read().decode('utf-8', 'replace').strip().splitlines()
+                raise RuntimeError(f"ffmpeg failed on {source.name}: "
+                                   f"{lines[-1] if lines else f'exit status {returncode}'}")
+
+    def _transcode(self, source: Path, target: Path):
+        """Audio track straight to Opus, nothing removed"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = self._partial(target)
+        try:
+            self._run(self._input_args(source) + self._output_args(partial), source)
+            os.replace(partial, target)
+        finally:
+            partial.unlink(missing_ok=True)
+
+    def _condition(self, source: Path, target: Path):
+        """Decode to 16 kHz mono, cut long silences, encode what is left; saves the time map"""
+        import numpy as np  # deferred: only needed when audio is conditioned
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        pcm = self._run(self._input_args(source) + ["-f", "s16le", "-acodec", "pcm_s16le", "-"], source)
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        segments = speech_segments(samples, self.settings.vad_min_silence)
+        if not segments:
+            # Nothing above the threshold; let the transcriber judge the whole recording
+            segments = [(0, len(samples))]
+
+        time_map, position = [], 0
+        for start, end in segments:
+            time_map.append((position / AUDIO_SAMPLE_RATE, start / AUDIO_SAMPLE_RATE,
+                             (end - start) / AUDIO_SAMPLE_RATE))
+            position += end - start
+
+        partial = self._partial(target)
+        try:
+            # The kept stretches are fed to the encoder as views of the decoded samples, not copied
+            raw_input = ["-f", "s16le", "-ar", str(AUDIO_SAMPLE_RATE), "-ac", "1", "-i", "-"]
+            self._run_streamed([self.ffmpeg(), "-hide_banner", "-loglevel", "error", "-y"] + raw_input +
+                               self._output_args(partial), source,
+                               (memoryview(samples[start:end]) for start, end in segments))
+            time_map = TimeMap(time_map, len(samples) / AUDIO_SAMPLE_RATE)
+            atomic_write_json(target.with_suffix(".timemap.json"), time_map.to_dict())
+            os.replace(partial, target)
+        finally:
+            partial.unlink(missing_ok=True)
+        logger.info(f"Trimmed silence from {source.name}: {time_map.original_seconds:.0f}s -> "
+                    f"{time_map.kept_seconds:.0f}s")
+
+    def _input_args(self, source: Path) -> List[str]:
+        """ffmpeg arguments reading `source`'s first audio stream as 16 kHz mono"""
+        return [
+            self.ffmpeg(), "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", str(source),
+            "-map", "0:a:0", "-vn", "-sn", "-dn",
+            "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE),
+        ]
+
+    def _output_args(self, target: Path) -> List[str]:
+        return ["-c:a", "libopus", "-b:a", self.settings.audio_bitrate, "-application", "voip",
+                "-f", AUDIO_FORMAT, str(target)]
+
+    def remove_derived(self, source: Path):
+        """Delete every cached audio file and time map derived from `source`"""
+        for derived in self.derived_dir.glob(f"{source.stem}.*"):
+            derived.unlink(missing_ok=True)
@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast local handlers up to multi-minute transcriptions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+IO_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+class _Metric:
+    """Base for metrics with a fixed set of label names.
+
+    Each metric keeps a dict keyed by label values guarded by one lock; an
+    update is a dict lookup and an addition, cheap enough to leave on in
+    production.
+    """
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = [[list(key), self._export(value)] for key, value in self._values.items()]
+        return {"type": self.type_name, "help": self.documentation,
+                "labelnames": list(self.labelnames), "samples": samples}
+
+    def _export(self, value):
+        return value
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        return data
+
+    def _export(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+registry = MetricsRegistry()
+
+# Shared metric definitions, imported by the modules that record them
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "eduassist_http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"])
+HTTP_IN_FLIGHT = registry.gauge(
+    "eduassist_http_requests_in_flight", "HTTP requests currently being served",
+    ["method", "route"])
+PIPELINE_STAGE_SECONDS = registry.histogram(
+    "eduassist_pipeline_stage_duration_seconds", "Content processing stage duration",
+    ["stage", "file_type"])
+LLM_REQUESTS = registry.counter(
+    "eduassist_llm_requests_total", "LLM API calls by outcome",
+    ["service", "model", "status"])
+LLM_REQUEST_SECONDS = registry.histogram(
+    "eduassist_llm_request_duration_seconds", "LLM API call latency",
+    ["service", "model"])
+LLM_TOKENS = registry.counter(
+    "eduassist_llm_tokens_total", "LLM tokens consumed",
+    ["service", "model", "kind"])
+LLM_QUEUE_WAIT_SECONDS = registry.histogram(
+    "eduassist_llm_queue_wait_seconds", "Time LLM calls waited for rate-limit capacity",
+    ["model", "priority"])
+LLM_QUEUE_DEPTH = registry.gauge(
+    "eduassist_llm_queue_depth", "LLM calls waiting for rate-limit capacity",
+    ["priority"])
+LLM_RATE_LIMITED = registry.counter(
+    "eduassist_llm_rate_limited_total", "429 responses from the LLM API",
+    ["model"])
+COALESCED_REQUESTS = registry.counter(
+    "eduassist_coalesced_requests_total", "Generation requests answered by an identical in-flight one",
+    ["operation", "scope"])
+LLM_REPLAY_MISSES = registry.counter(
+    "eduassist_llm_replay_misses_total", "Replayed LLM calls with no exact recording",
+    ["service"])
+STORAGE_IO_SECONDS = registry.histogram(
+    "eduassist_storage_io_duration_seconds", "Storage layer file operation latency",
+    ["operation", "area"], buckets=IO_BUCKETS)
+STORAGE_COMMIT_BATCH = registry.histogram(
+    "eduassist_storage_commit_batch_size", "Files committed per group-commit batch",
+    [], buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+SEARCH_CACHE_LOOKUPS = registry.counter(
+    "eduassist_search_cache_lookups_total", "Search result cache lookups (hit, miss, stale)",
+    ["result"])
+SEARCH_CACHE_BYTES = registry.gauge(
+    "eduassist_search_cache_bytes", "Estimated memory held by cached search results")
+SEARCH_CACHE_EVICTIONS = registry.counter(
+    "eduassist_search_cache_evictions_total", "Search results evicted to stay within the cache size")
+TRANSCRIPTIONS = registry.counter(
+    "eduassist_transcriptions_total", "Transcriptions by backend and the routing reason",
+    ["backend", "reason"])
+DEADLINE_EXCEEDED = registry.counter(
+    "eduassist_deadline_exceeded_total", "Work abandoned at the request deadline or a stage timeout",
+    ["stage"])
+REQUESTS_CANCELLED = registry.counter(
+    "eduassist_requests_cancelled_total", "Requests cancelled because the client disconnected",
+    ["route"])
+
+@contextmanager
+def observe_stage(stage: str, file_type: str = ""):
+    """Time one content processing stage (extract, transcribe, summarize, index)"""
+    with span(stage), PIPELINE_STAGE_SECONDS.time(stage=stage, file_type=file_type):
+        yield
+
+# Multi-worker support: every worker has its own registry, so each one
+# periodically publishes a snapshot file and /metrics merges them all.
+SNAPSHOT_MAX_AGE = 120
+
+def write_snapshot(directory: Path):
+    from .storage import atomic_write_bytes
+    atomic_write_bytes(directory / f"worker-{os.getpid()}.json",
+                       json.dumps(registry.snapshot()).encode('utf-8'))
+
+def remove_snapshot(directory: Path):
+    try:
+        (directory / f"worker-{os.getpid()}.json").unlink()
+    except OSError:
+        pass
+
+def _load_snapshots(directory: Optional[Path]) -> List[Dict[str, Dict]]:
+    snapshots = [registry.snapshot()]
+    if directory is None or not directory.exists():
+        return snapshots
+    own_file = f"worker-{os.getpid()}.json"
+    now = time.time()
+    for snapshot_file in directory.glob("worker-*.json"):
+        try:
+            if snapshot_file.name == own_file or now - snapshot_file.stat().st_mtime > SNAPSHOT_MAX_AGE:
+                continue
+            snapshots.append(json.loads(snapshot_file.read_text(encoding='utf-8')))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping metrics snapshot {snapshot_file}: {e}")
+    return snapshots
+
+def _merge(snapshots: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif metric["type"] == "histogram":
+                    target["samples"][key] = [
+                        [a + b for a, b in zip(current[0], value[0])],
+                        current[1] + value[1],
+                        current[2] + value[2],
+                    ]
+                else:
+                    target["samples"][key] = current + value
+    return merged
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: List[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def render_prometheus(snapshot_dir: Optional[Path] = None) -> str:
+    """Render all metrics (this worker plus published snapshots) in text format 0.0.4"""
+    lines = []
+    for name, metric in sorted(_merge(_load_snapshots(snapshot_dir)).items()):
+        labelnames = metric["labelnames"]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, value in sorted(metric["samples"].items()):
+            if metric["type"] == "histogram":
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric["buckets"]) + [float("inf")], counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_number(bound)}"'
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_number(total)}")
+                lines.append(f"{name}_count{_format_labels(labelnames, labels)} {count}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_number(value)}")
+    return "\n".join(lines) + "\n"
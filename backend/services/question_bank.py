@@ -0,0 +1,171 @@
+import re
+import random
+import hashlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+import logging
+from .storage import read_json, atomic_write_json, file_lock
+from .chunking import CHARS_PER_TOKEN, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+BANK_VERSION = 1
+DIFFICULTIES = ("easy", "medium", "hard")
+# Same window the quiz prompt has always used
+CHUNK_CHARS = 3000
+
+DifficultySpec = Union[None, str, Dict[str, float]]
+
+def question_bank_path(content_file: Path) -> Path:
+    """Question bank for a processed document, next to its .summary.md"""
+    return content_file.with_suffix(".questions.json")
+
+def question_fingerprint(question: Dict[str, Any]) -> str:
+    """Identity of a question: type plus its text, ignoring case, spacing and punctuation"""
+    text = re.sub(r"[^\w\s]", "", str(question.get("question", "")).lower())
+    text = " ".join(text.split())
+    return hashlib.sha1(f"{question.get('type')}|{text}".encode('utf-8')).hexdigest()[:16]
+
+def content_chunks(content: str, size: int = CHUNK_CHARS) -> List[Tuple[int, int]]:
+    """(start, end) offsets of consecutive chunks of whole sentences, about `size` characters each"""
+    return list(iter_chunks(content, size // CHARS_PER_TOKEN, overlap_tokens=0)) or [(0, 0)]
+
+def _largest_remainder(count: int, weights: Dict[str, float]) -> Dict[str, int]:
+    """Split `count` in proportion to `weights` so the parts add up to `count`"""
+    total = sum(weights.values())
+    if count <= 0 or total <= 0:
+        return {key: 0 for key in weights}
+    exact = {key: count * weight / total for key, weight in weights.items()}
+    quotas = {key: int(value) for key, value in exact.items()}
+    leftover = count - sum(quotas.values())
+    for key in sorted(exact, key=lambda k: exact[k] - quotas[k], reverse=True)[:leftover]:
+        quotas[key] += 1
+    return quotas
+
+def difficulty_weights(difficulty: DifficultySpec) -> Optional[Dict[str, float]]:
+    """Normalize a request's difficulty ("hard" or {"easy": 0.3, ...}); None means any mix"""
+    if not difficulty or difficulty == "mixed":
+        return None
+    if isinstance(difficulty, str):
+        if difficulty not in DIFFICULTIES:
+            raise ValueError(f"Unknown difficulty: {difficulty}")
+        return {difficulty: 1.0}
+    weights = {}
+    for level, weight in difficulty.items():
+        if level not in DIFFICULTIES:
+            raise ValueError(f"Unknown difficulty: {level}")
+        if float(weight) > 0:
+            weights[level] = float(weight)
+    return weights or None
+
+class QuestionBank:
+    """Deduplicated questions generated for one document.
+
+    Each generation run covers one chunk of the document and adds its
+    questions tagged with type, difficulty and source chunk; runs move on
+    to the next chunk so the bank spreads over the whole document. Quizzes
+    are sampled from the bank locally.
+    """
+
+    def __init__(self, path: Path, data: Optional[Dict[str, Any]] = None):
+        self.path = path
+        data = data or {}
+        self.questions: List[Dict[str, Any]] = data.get("questions", [])
+        self.next_chunk: int = data.get("nextChunk", 0)
+        self.runs: int = data.get("runs", 0)
+
+    @classmethod
+    def load(cls, path: Path) -> "QuestionBank":
+        try:
+            data = read_json(path)
+        except (OSError, ValueError):
+            data = None
+        if data is not None and data.get("version") != BANK_VERSION:
+            logger.warning(f"Ignoring question bank {path} with version {data.get('version')}")
+            data = None
+        return cls(path, data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": BANK_VERSION,
+            "nextChunk": self.next_chunk,
+            "runs": self.runs,
+            "updated": datetime.now().isoformat(),
+            "questions": self.questions,
+        }
+
+    def add(self, questions: List[Dict[str, Any]], chunk: int, chunk_range: Tuple[int, int]) -> List[Dict[str, Any]]:
+        """Add generated questions that are not in the bank yet; returns the added ones"""
+        known = {question["bankId"] for question in self.questions}
+        added = []
+        for question in questions:
+            if not question.get("question") or not question.get("type"):
+                continue
+            fingerprint = question_fingerprint(question)
+            if fingerprint in known:
+                continue
+            known.add(fingerprint)
+            entry = {key: value for key, value in question.items() if key != "id"}
+            if entry.get("difficulty") not in DIFFICULTIES:
+                entry["difficulty"] = "medium"
+            entry.update({"bankId": fingerprint, "sourceChunk": chunk, "sourceRange": list(chunk_range)})
+            added.append(entry)
+        self.questions.extend(added)
+        self.runs += 1
+        return added
+
+    def sample(self, question_types: List[str], question_count: int, difficulty: DifficultySpec = None,
+               rng: Optional[random.Random] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Pick up to `question_count` questions matching the constraints.
+
+        Types share the count evenly and difficulties follow the requested
+        mix. Returns the picked questions and how many of them had to break
+        the balance (a type or difficulty over its share); a short list
+        means the bank lacks questions of the requested types altogether.
+        """
+        rng = rng or random.Random()
+        types = [t for t in dict.fromkeys(question_types)]
+        type_quota = _largest_remainder(question_count, {t: 1.0 for t in types})
+        weights = difficulty_weights(difficulty)
+        difficulty_quota = _largest_remainder(question_count, weights) if weights else None
+
+        pool = [question for question in self.questions if question.get("type") in type_quota]
+        rng.shuffle(pool)
+        picked: List[Dict[str, Any]] = []
+        remaining = set(range(len(pool)))
+
+        def take(fits):
+            for index in sorted(remaining):
+                if len(picked) == question_count:
+                    return
+                question = pool[index]
+                if fits(question):
+                    picked.append(question)
+                    remaining.discard(index)
+                    type_quota[question["type"]] -= 1
+                    if difficulty_quota is not None and question["difficulty"] in difficulty_quota:
+                        difficulty_quota[question["difficulty"]] -= 1
+
+        # Both shares, then type balance alone, then anything of a requested type
+        take(lambda q: type_quota[q["type"]] > 0 and
+             (difficulty_quota is None or difficulty_quota.get(q["difficulty"], 0) > 0))
+        balanced = len(picked)
+        take(lambda q: type_quota[q["type"]] > 0)
+        take(lambda q: True)
+        return picked, len(picked) - balanced
+
+    def next_source(self, content: str) -> Tuple[int, Tuple[int, int]]:
+        """Chunk the next generation run should cover, advancing the rotation"""
+        chunks = content_chunks(content)
+        chunk = self.next_chunk % len(chunks)
+        self.next_chunk = chunk + 1
+        return chunk, chunks[chunk]
+
+def update_bank(path: Path, change) -> Any:
+    """Apply `change(bank)` to the stored bank under its file lock and save it"""
+    with file_lock(path):
+        bank = QuestionBank.load(path)
+        result = change(bank)
+        atomic_write_json(path, bank.to_dict())
+    return result
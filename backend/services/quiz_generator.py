@@ -1,48 +1,67 @@
-import os
 import json
 import uuid
 import asyncio
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import logging
-import openai
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from .settings import Settings, get_settings
+from .llm_client import chat_completion
+from .storage import async_read_text
+from .extractive import condensed_text
+from .deadlines import DeadlineExceeded
+from .quiz_repository import QuizRepository
+from .question_bank import QuestionBank, DifficultySpec, difficulty_weights, question_bank_path, update_bank
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
+BANK_QUESTION_TYPES = ["multiple_choice", "true_false", "short_answer"]
+# Smallest generation run when the bank needs topping up
+TOP_UP_QUESTIONS = 10
+
+def _difficulty_hint(difficulty: DifficultySpec) -> str:
+    weights = difficulty_weights(difficulty)
+    if not weights:
+        return ""
+    total = sum(weights.values())
+    return ", ".join(f"{round(100 * weight / total)}% {level}" for level, weight in weights.items())
+
 class QuizGenerator:
-    def __init__(self):
-        self.storage_root = Path("../storage")
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.storage_root = self.settings.storage_root
         self.processed_dir = self.storage_root / "processed"
-        self.quizzes_dir = self.storage_root / "quizzes"
-        self.quizzes_dir.mkdir(parents=True, exist_ok=True)
+        self.repository = QuizRepository(self.settings)
         
-        # Initialize OpenAI client
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.client = openai.OpenAI(api_key=self.api_key) if self.api_key else None
-        self.model = os.getenv("OPENAI_MODEL_SUMMARY", "gpt-4o-mini")
+        self.model = self.settings.summary_model
         
         # Check if API key is available
-        self.use_real_api = bool(self.api_key and self.api_key != "your_openai_api_key_here")
+        self.use_real_api = self.settings.use_real_api
         
         if not self.use_real_api:
             logger.warning("OpenAI API key not configured. Using mock quiz generation.")
     
-    async def generate_quiz(self, content_path: str, question_types: List[str], question_count: int, title: str = "") -> Dict[str, Any]:
+    async def generate_quiz(self, content_path: str, question_types: List[str], question_count: int, title: str = "",
+                            regenerate: bool = False, difficulty: DifficultySpec = None) -> Dict[str, Any]:
         """Generate quiz based on content with real AI"""
         try:
-            # Load content
-            content = await self._load_content(content_path)
+            difficulty_weights(difficulty)  # reject unknown levels before any work
+            content_file = self._resolve_content_path(content_path)
             
-            # Generate quiz using AI
-            if self.use_real_api:
-                quiz_data = await self._generate_ai_quiz(content, question_types, question_count)
+            if self.use_real_api and content_file is not None:
+                # Sampled from the document's question bank; the LLM only tops it up
+                quiz_data = await self._questions_from_bank(content_file, question_types, question_count,
+                                                            difficulty, regenerate)
             else:
-                quiz_data = await self._generate_mock_quiz(content_path, question_types, question_count)
+                # Load content
+                content = await self._load_content(content_path)
+                
+                # Generate quiz using AI
+                if self.use_real_api:
+                    quiz_data = await self._generate_ai_quiz(content, question_types, question_count)
+                else:
+                    quiz_data = await self._generate_mock_quiz(content_path, question_types, question_count)
             
             # Create quiz metadata
             quiz_id = str(uuid.uuid4())
@@ -53,15 +72,14 @@ class QuizGenerator:
                 "createdDate": datetime.now().isoformat(),
                 "questionTypes": question_types,
                 "totalQuestions": question_count,
+                "difficulty": difficulty or "mixed",
                 "questions": quiz_data,
                 "timeLimit": question_count * 2,  # 2 minutes per question
                 "status": "active"
             }
             
             # Save quiz
-            quiz_file = self.quizzes_dir / f"{quiz_id}.json"
-            with open(quiz_file, 'w', encoding='utf-8') as f:
-                json.dump(quiz, f, indent=2, ensure_ascii=False)
+            await self.repository.save_quiz(quiz)
             
             logger.info(f"Generated quiz {quiz_id} with {len(quiz_data)} questions")
             return quiz
@@ -70,8 +88,61 @@ class QuizGenerator:
             logger.error(f"Error generating quiz: {e}")
             raise
     
-    async def _generate_ai_quiz(self, content: str, question_types: List[str], question_count: int) -> List[Dict[str, Any]]:
-        """Generate quiz using OpenAI API"""
+    async def fill_question_bank(self, content_file: Path, content: str, question_count: int):
+        """Seed the document's question bank with a mixed-type generation run"""
+        await self._top_up_bank(content_file, content, BANK_QUESTION_TYPES, question_count, None, "quiz_pregen")
+    
+    async def _questions_from_bank(self, content_file: Path, question_types: List[str], question_count: int,
+                                   difficulty: DifficultySpec, regenerate: bool) -> List[Dict[str, Any]]:
+        """Sample the quiz from the bank, generating more questions only if it falls short"""
+        bank_path = question_bank_path(content_file)
+        with span("quiz.bank_sample"):
+            bank = await asyncio.to_thread(QuestionBank.load, bank_path)
+            picked, unbalanced = bank.sample(question_types, question_count, difficulty)
+        
+        if regenerate or len(picked) < question_count or unbalanced:
+            content = await async_read_text(content_file)
+            try:
+                added = await self._top_up_bank(content_file, content, question_types,
+                                                max(question_count, TOP_UP_QUESTIONS), difficulty, "quiz")
+            except Exception as e:
+                logger.error(f"Error topping up question bank for {content_file.name}: {e}")
+                if not picked:
+                    if isinstance(e, DeadlineExceeded):
+                        raise
+                    return await self._generate_mock_quiz("", question_types, question_count)
+            else:
+                if regenerate:
+                    # A regenerated quiz is drawn from the new questions where possible
+                    picked, _ = QuestionBank(bank_path, {"questions": added}).sample(
+                        question_types, question_count, difficulty)
+                if len(picked) < question_count:
+                    bank = await asyncio.to_thread(QuestionBank.load, bank_path)
+                    chosen = {question["bankId"] for question in picked}
+                    rest = QuestionBank(bank_path, {"questions": [
+                        question for question in bank.questions if question["bankId"] not in chosen]})
+                    more, _ = rest.sample(question_types, question_count - len(picked), difficulty)
+                    picked = picked + more
+        
+        return [{**question, "id": f"q{i + 1}"} for i, question in enumerate(picked)]
+    
+    async def _top_up_bank(self, content_file: Path, content: str, question_types: List[str], question_count: int,
+                           difficulty: DifficultySpec, service: str) -> List[Dict[str, Any]]:
+        """Generate questions from the next chunk of the document and add the new ones to its bank"""
+        bank_path = question_bank_path(content_file)
+        chunk, (start, end) = await asyncio.to_thread(update_bank, bank_path, lambda bank: bank.next_source(content))
+        questions = await self._generate_ai_quiz(content[start:end], question_types, question_count,
+                                                 service=service, fallback=False,
+                                                 difficulty_hint=_difficulty_hint(difficulty))
+        added = await asyncio.to_thread(update_bank, bank_path,
+                                        lambda bank: bank.add(questions, chunk, (start, end)))
+        logger.info(f"Added {len(added)} of {len(questions)} generated questions to {bank_path.name} (chunk {chunk})")
+        return added
+    
+    async def _generate_ai_quiz(self, content: str, question_types: List[str], question_count: int,
+                                service: str = "quiz", fallback: bool = True,
+                                difficulty_hint: str = "") -> List[Dict[str, Any]]:
+        """Generate quiz using OpenAI API (fallback=False raises instead of returning mock questions)"""
         try:
             # Prepare question type instructions
             type_instructions = []
@@ -83,13 +154,17 @@ class QuizGenerator:
                 type_instructions.append("short answer questions")
             
             types_str = ", ".join(type_instructions)
+            # Bank chunks already fit; whole documents are condensed to their key sentences
+            excerpt = await condensed_text(content, self.settings.extract_max_tokens)
+            if difficulty_hint:
+                types_str += f". Difficulty mix: {difficulty_hint}"
             
             # Create prompt for AI
             prompt = f"""Based on the following educational content, create {question_count} quiz questions. 
             Include {types_str}.
             
             Content:
-            {content[:3000]}  # Limit content to avoid token limits
+            {excerpt}
             
             For each question, provide:
             1. Question text
@@ -114,8 +189,8 @@ class QuizGenerator:
                 }}
             ]"""
             
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
+            ai_response = await chat_completion(
+                service,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are an expert quiz creator for educational content. Create well-structured, clear questions that test understanding of the material."},
@@ -125,9 +200,6 @@ class QuizGenerator:
                 temperature=0.3
             )
             
-            # Parse AI response
-            ai_response = response.choices[0].message.content
-            
             # Try to extract JSON from response
             try:
                 # Find JSON array in response
@@ -149,10 +221,14 @@ class QuizGenerator:
                 else:
                     raise ValueError("No JSON array found in AI response")
             except json.JSONDecodeError:
+                if not fallback:
+                    raise
                 logger.warning("Could not parse AI response as JSON, falling back to mock questions")
                 return await self._generate_mock_quiz("", question_types, question_count)
             
         except Exception as e:
+            if not fallback or isinstance(e, DeadlineExceeded):
+                raise
             logger.error(f"Error generating AI quiz: {e}")
             # Fallback to mock questions
             return await self._generate_mock_quiz("", question_types, question_count)
@@ -223,28 +299,33 @@ class QuizGenerator:
         
         return questions[:question_count]
     
+    def _resolve_content_path(self, content_path: str) -> Optional[Path]:
+        """Processed file for a content path, or None"""
+        if not content_path:
+            return None
+        
+        # Handle relative paths
+        if not content_path.startswith('processed/'):
+            content_path = f"processed/{content_path}"
+        
+        full_path = self.storage_root / content_path
+        if full_path.exists():
+            return full_path
+        
+        # Search for content files if exact path not found
+        for processed_file in self.processed_dir.rglob("*.txt"):
+            if processed_file.stem in content_path:
+                return processed_file
+        return None
+    
     async def _load_content(self, content_path: str) -> str:
         """Load content from processed files"""
         try:
-            if not content_path:
-                return "Sample educational content for quiz generation."
-            
-            # Handle relative paths
-            if not content_path.startswith('processed/'):
-                content_path = f"processed/{content_path}"
+            full_path = self._resolve_content_path(content_path)
+            if full_path is not None:
+                return await async_read_text(full_path)
             
-            full_path = self.storage_root / content_path
-            if full_path.exists():
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            else:
-                # Search for content files if exact path not found
-                for processed_file in self.processed_dir.rglob("*.txt"):
-                    if processed_file.stem in content_path:
-                        with open(processed_file, 'r', encoding='utf-8') as f:
-                            return f.read()
-                
-                return "Sample educational content for quiz generation."
+            return "Sample educational content for quiz generation."
                 
         except Exception as e:
             logger.error(f"Error loading content: {e}")
@@ -253,11 +334,7 @@ class QuizGenerator:
     async def get_quiz(self, quiz_id: str) -> Optional[Dict[str, Any]]:
         """Get quiz by ID"""
         try:
-            quiz_file = self.quizzes_dir / f"{quiz_id}.json"
-            if quiz_file.exists():
-                with open(quiz_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return None
+            return await self.repository.get_quiz(quiz_id)
         except Exception as e:
             logger.error(f"Error getting quiz {quiz_id}: {e}")
             return None
@@ -337,9 +414,7 @@ class QuizGenerator:
                 "results": results
             }
             
-            result_file = self.quizzes_dir / f"result_{result_id}.json"
-            with open(result_file, 'w', encoding='utf-8') as f:
-                json.dump(result_data, f, indent=2, ensure_ascii=False)
+            await self.repository.save_result(result_data)
             
             logger.info(f"Graded quiz {quiz_id}: {score_percentage:.1f}% ({correct_answers}/{total_questions})")
             return result_data
@@ -348,44 +423,26 @@ class QuizGenerator:
             logger.error(f"Error grading quiz: {e}")
             raise
     
-    async def get_all_quizzes(self) -> List[Dict[str, Any]]:
-        """Get all available quizzes"""
-        try:
-            quizzes = []
-            for quiz_file in self.quizzes_dir.glob("*.json"):
-                if not quiz_file.name.startswith("result_"):
-                    with open(quiz_file, 'r', encoding='utf-8') as f:
-                        quiz_data = json.load(f)
-                        # Return summary info for listing
-                        quizzes.append({
-                            "id": quiz_data["id"],
-                            "title": quiz_data["title"],
-                            "totalQuestions": quiz_data["totalQuestions"],
-                            "createdDate": quiz_data["createdDate"],
-                            "questionTypes": quiz_data["questionTypes"],
-                            "timeLimit": quiz_data.get("timeLimit", 30),
-                            "status": quiz_data.get("status", "active")
-                        })
-            
-            # Sort by creation date (newest first)
-            quizzes.sort(key=lambda x: x["createdDate"], reverse=True)
-            return quizzes
-            
-        except Exception as e:
-            logger.error(f"Error getting all quizzes: {e}")
-            return []
+    async def get_all_quizzes(self, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Quiz summaries from the index, newest first, and the total count"""
+        return await self.repository.list_quizzes(offset, limit)
+    
+    async def get_results(self, quiz_id: str, offset: int = 0,
+                          limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Submissions of one quiz, newest first, and their total count"""
+        return await self.repository.list_results(quiz_id, offset, limit)
+    
+    async def get_result(self, quiz_id: str, result_id: str) -> Optional[Dict[str, Any]]:
+        return await self.repository.get_result(quiz_id, result_id)
     
     async def delete_quiz(self, quiz_id: str) -> bool:
-        """Delete a quiz by ID"""
+        """Delete a quiz and its results by ID"""
         try:
-            quiz_file = self.quizzes_dir / f"{quiz_id}.json"
-            if quiz_file.exists():
-                quiz_file.unlink()
+            if await self.repository.delete_quiz(quiz_id):
                 logger.info(f"Deleted quiz {quiz_id}")
                 return True
-            else:
-                logger.warning(f"Quiz file not found: {quiz_id}")
-                return False
+            logger.warning(f"Quiz file not found: {quiz_id}")
+            return False
         except Exception as e:
             logger.error(f"Error deleting quiz {quiz_id}: {e}")
-            return False
\ No newline at end of file
+            return False
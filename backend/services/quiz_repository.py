@@ -0,0 +1,221 @@
+import os
+import shutil
+import asyncio
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+from .settings import Settings, get_settings
+from .storage import read_json, file_lock, atomic_write_bytes, async_read_json, async_write_json, dumps, loads
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ("id", "title", "totalQuestions", "createdDate", "questionTypes", "timeLimit", "status")
+RESULT_SUMMARY_FIELDS = ("id", "quizId", "submissionDate", "totalQuestions", "correctAnswers",
+                         "totalPoints", "earnedPoints", "scorePercentage", "grade")
+
+def quiz_summary(quiz: Dict[str, Any]) -> Dict[str, Any]:
+    """The listing fields of a quiz, without its questions"""
+    summary = {field: quiz.get(field) for field in SUMMARY_FIELDS}
+    summary["timeLimit"] = quiz.get("timeLimit", 30)
+    summary["status"] = quiz.get("status", "active")
+    return summary
+
+def _result_file_name(result: Dict[str, Any]) -> str:
+    """Submission time first, so a directory listing sorts results chronologically"""
+    try:
+        stamp = datetime.fromisoformat(result["submissionDate"]).strftime("%Y%m%dT%H%M%S%f")
+    except (KeyError, TypeError, ValueError):
+        stamp = "00000000T000000000000"
+    return f"{stamp}_{result['id']}.json"
+
+class QuizRepository:
+    """Quizzes, their submissions and a quiz summary index under storage/quizzes/.
+
+    quizzes/<id>.json                          a quiz with its questions
+    quizzes/results/<id>/<time>_<result>.json  one file per submission
+    quizzes/index.jsonl                        summary log of put/delete lines
+
+    Listing reads the index, never the quiz files. Each worker keeps the
+    index in memory and reads only the lines appended since its last look;
+    the log is rewritten (compacted) once most of it is superseded, which
+    other workers notice by its changed inode. A missing index is rebuilt
+    from the quiz files, moving results stored in the old flat layout
+    (quizzes/result_<id>.json) into their quiz's directory.
+    """
+    COMPACT_MIN_LINES = 1000
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.quizzes_dir = self.settings.storage_root / "quizzes"
+        self.results_dir = self.quizzes_dir / "results"
+        self.index_path = self.quizzes_dir / "index.jsonl"
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self._sorted: Optional[List[Dict[str, Any]]] = None
+        self._offset = 0
+        self._lines = 0
+        self._inode: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _quiz_path(self, quiz_id: str) -> Path:
+        return self.quizzes_dir / f"{Path(quiz_id).name}.json"
+
+    def _results_path(self, quiz_id: str) -> Path:
+        return self.results_dir / Path(quiz_id).name
+
+    async def save_quiz(self, quiz: Dict[str, Any]):
+        await async_write_json(self._quiz_path(quiz["id"]), quiz)
+        await asyncio.to_thread(self._append, {"op": "put", "quiz": quiz_summary(quiz)})
+
+    async def get_quiz(self, quiz_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await async_read_json(self._quiz_path(quiz_id))
+        except FileNotFoundError:
+            return None
+
+    async def delete_quiz(self, quiz_id: str) -> bool:
+        """Remove a quiz, its results and its index entry; False if it did not exist"""
+        return await asyncio.to_thread(self._delete, quiz_id)
+
+    def _delete(self, quiz_id: str) -> bool:
+        try:
+            self._quiz_path(quiz_id).unlink()
+        except FileNotFoundError:
+            return False
+        shutil.rmtree(self._results_path(quiz_id), ignore_errors=True)
+        self._append({"op": "delete", "id": quiz_id})
+        return True
+
+    async def list_quizzes(self, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Quiz summaries, newest first, and the total count"""
+        ordered = await asyncio.to_thread(self._ordered)
+        end = None if limit is None else offset + limit
+        return ordered[offset:end], len(ordered)
+
+    async def save_result(self, result: Dict[str, Any]):
+        await async_write_json(self._results_path(result["quizId"]) / _result_file_name(result), result)
+
+    async def list_results(self, quiz_id: str, offset: int = 0,
+                           limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Result summaries for one quiz, newest first, and its total submission count"""
+        return await asyncio.to_thread(self._list_results, quiz_id, offset, limit)
+
+    def _list_results(self, quiz_id: str, offset: int, limit: Optional[int]) -> Tuple[List[Dict[str, Any]], int]:
+        try:
+            names = sorted((name for name in os.listdir(self._results_path(quiz_id)) if name.endswith(".json")),
+                           reverse=True)
+        except FileNotFoundError:
+            return [], 0
+        end = None if limit is None else offset + limit
+        results = []
+        for name in names[offset:end]:
+            try:
+                result = read_json(self._results_path(quiz_id) / name)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable result {name}: {e}")
+                continue
+            results.append({field: result.get(field) for field in RESULT_SUMMARY_FIELDS})
+        return results, len(names)
+
+    async def get_result(self, quiz_id: str, result_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get_result, quiz_id, result_id)
+
+    def _get_result(self, quiz_id: str, result_id: str) -> Optional[Dict[str, Any]]:
+        suffix = f"_{Path(result_id).name}.json"
+        try:
+            for name in os.listdir(self._results_path(quiz_id)):
+                if name.endswith(suffix):
+                    return read_json(self._results_path(quiz_id) / name)
+        except FileNotFoundError:
+            pass
+        return None
+
+    # Summary index
+
+    def _ordered(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            if self._sorted is None:
+                self._sorted = sorted(self._summaries.values(), key=lambda q: q.get("createdDate") or "",
+                                      reverse=True)
+            return self._sorted
+
+    def _refresh(self):
+        """Bring the in-memory index up to date with the log; caller holds self._lock"""
+        with file_lock(self.index_path):
+            self._read_log()
+
+    def _read_log(self):
+        """Apply log lines added since the last read; caller holds both locks"""
+        try:
+            stat = self.index_path.stat()
+        except FileNotFoundError:
+            self._rebuild()
+            stat = self.index_path.stat()
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._summaries, self._offset, self._lines, self._inode = {}, 0, 0, stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.decode('utf-8').splitlines():
+            self._apply(loads(line))
+            self._lines += 1
+        self._offset += len(complete)
+        self._sorted = None
+
+    def _apply(self, entry: Dict[str, Any]):
+        if entry["op"] == "put":
+            self._summaries[entry["quiz"]["id"]] = entry["quiz"]
+        elif entry["op"] == "delete":
+            self._summaries.pop(entry["id"], None)
+
+    def _append(self, entry: Dict[str, Any]):
+        line = dumps(entry) + b"\n"
+        with self._lock:
+            with file_lock(self.index_path):
+                self._read_log()
+                with open(self.index_path, 'ab') as f:
+                    f.write(line)
+                self._read_log()
+            if self._lines > max(self.COMPACT_MIN_LINES, 2 * len(self._summaries)):
+                self._compact()
+
+    def _write_index(self, summaries: List[Dict[str, Any]]):
+        atomic_write_bytes(self.index_path, b"".join(dumps({"op": "put", "quiz": summary}) + b"\n"
+                                                     for summary in summaries))
+
+    def _compact(self):
+        """Rewrite the log with one line per live quiz; caller holds self._lock"""
+        with file_lock(self.index_path):
+            self._read_log()
+            self._write_index(list(self._summaries.values()))
+        logger.info(f"Compacted quiz index to {len(self._summaries)} entries")
+
+    def _rebuild(self):
+        """Build the index from the quiz files (file lock already held)"""
+        self.quizzes_dir.mkdir(parents=True, exist_ok=True)
+        migrated = 0
+        for legacy in self.quizzes_dir.glob("result_*.json"):
+            try:
+                result = read_json(legacy)
+                target = self._results_path(result["quizId"]) / _result_file_name(result)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(legacy, target)
+                migrated += 1
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not migrate quiz result {legacy.name}: {e}")
+
+        summaries = []
+        for quiz_file in self.quizzes_dir.glob("*.json"):
+            if quiz_file.name.startswith("result_"):
+                continue
+            try:
+                summaries.append(quiz_summary(read_json(quiz_file)))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable quiz {quiz_file.name}: {e}")
+        self._write_index(summaries)
+        logger.info(f"Built quiz index with {len(summaries)} quizzes; moved {migrated} results")
@@ -0,0 +1,282 @@
+import os
+import time
+import uuid
+import shutil
+import hashlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+import logging
+from .settings import Settings, get_settings
+from .storage import atomic_write_json, read_json, file_lock, async_file_lock, timed_io
+
+logger = logging.getLogger(__name__)
+
+# Upload directory by extension; anything else is rejected
+UPLOAD_TYPES = {
+    '.pdf': 'pdf',
+    '.mp4': 'video', '.avi': 'video', '.mov': 'video', '.wmv': 'video',
+    '.mp3': 'audio', '.wav': 'audio', '.m4a': 'audio',
+}
+HASH_BLOCK = 1 << 20
+CLEANUP_INTERVAL = 3600.0
+
+def upload_file_type(filename: str) -> Optional[str]:
+    """pdf, video or audio for a supported upload's name, else None"""
+    return UPLOAD_TYPES.get(Path(filename).suffix.lower())
+
+class UploadNotFound(LookupError):
+    """No upload session with this id (never created, aborted or expired)"""
+
+class UploadConflict(RuntimeError):
+    """The upload cannot do this now: chunks are missing, or another request is finalizing it"""
+
+class ResumableUploads:
+    """Chunked uploads that survive dropped connections.
+
+    Creating an upload preallocates its file under uploads/incoming/<id>/.
+    The file is split into fixed-size chunks, so chunk i always starts at
+    i * chunkSize and chunks can be sent in any order, in parallel and
+    from any worker process. Each chunk is checked against the SHA-256
+    the client sends with it and written in place; the session file
+    records which chunks are committed. A client that lost its connection
+    asks for the session and sends only the missing chunks. Finalizing
+    moves the complete file to where a regular upload would have been
+    saved.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.storage_root = self.settings.storage_root
+        self.incoming_dir = self.storage_root / "uploads" / "incoming"
+        self.chunk_size = int(self.settings.upload_chunk_mb * 1024 * 1024)
+        self.max_size = int(self.settings.upload_max_mb * 1024 * 1024)
+        self._cleaned_at = 0.0
+
+    def _session_dir(self, upload_id: str) -> Path:
+        try:
+            # Only ids this class made; also keeps the path inside incoming/
+            upload_id = str(uuid.UUID(upload_id))
+        except ValueError:
+            raise UploadNotFound(upload_id) from None
+        return self.incoming_dir / upload_id
+
+    def _load(self, upload_id: str) -> Tuple[Path, Dict[str, Any]]:
+        session_dir = self._session_dir(upload_id)
+        try:
+            return session_dir, read_json(session_dir / "session.json")
+        except (OSError, ValueError):
+            raise UploadNotFound(upload_id) from None
+
+    def _describe(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """The session as the API reports it"""
+        received = set(session["received"])
+        committed = 0
+        while committed < session["chunks"] and committed in received:
+            committed += 1
+        return {
+            "uploadId": session["id"],
+            "filename": session["filename"],
+            "size": session["size"],
+            "chunkSize": session["chunkSize"],
+            "chunks": session["chunks"],
+            "received": len(received),
+            "missing": [index for index in range(session["chunks"]) if index not in received],
+            # Bytes from the start of the file that are all committed
+            "committedOffset": min(committed * session["chunkSize"], session["size"]),
+            "status": session["status"],
+            "expires": datetime.fromtimestamp(session["created"] + self.settings.upload_session_hours * 3600).isoformat(),
+            **({"result": session["result"]} if "result" in session else {}),
+        }
+
+    def create(self, filename: str, size: int, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Start an upload of `size` bytes; raises ValueError for unsupported or oversized files"""
+        file_type = upload_file_type(filename or "")
+        if file_type is None:
+            raise ValueError(f"File type {Path(filename or '').suffix.lower() or '(none)'} not supported")
+        if size <= 0 or size > self.max_size:
+            raise ValueError(f"size must be between 1 and {self.max_size} bytes")
+        self.remove_expired()
+
+        upload_id = str(uuid.uuid4())
+        session_dir = self.incoming_dir / upload_id
+        session_dir.mkdir(parents=True)
+        try:
+            # Reserve the space up front: a full disk fails now, not at 95%
+            fd = os.open(session_dir / "data", os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fd, 0, size)
+                else:
+                    os.ftruncate(fd, size)
+            finally:
+                os.close(fd)
+            session = {
+                "id": upload_id,
+                "filename": Path(filename).name,
+                "fileType": file_type,
+                "size": size,
+                "chunkSize": self.chunk_size,
+                "chunks": -(-size // self.chunk_size),
+                "sha256": sha256.lower() if sha256 else None,
+                "received": [],
+                "status": "uploading",
+                "created": time.time(),
+            }
+            atomic_write_json(session_dir / "session.json", session)
+        except BaseException:
+            shutil.rmtree(session_dir, ignore_errors=True)
+            raise
+        logger.info(f"Started upload {upload_id}: {session['filename']}, {size} bytes in {session['chunks']} chunks")
+        return self._describe(session)
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        return self._describe(self._load(upload_id)[1])
+
+    def chunk_length(self, upload_id: str, index: int) -> int:
+        """Exact byte length chunk `index` of this upload must have"""
+        return self._chunk_length(self._load(upload_id)[1], index)
+
+    def _chunk_length(self, session: Dict[str, Any], index: int) -> int:
+        if not 0 <= index < session["chunks"]:
+            raise ValueError(f"Chunk index must be between 0 and {session['chunks'] - 1}")
+        return min(session["chunkSize"], session["size"] - index * session["chunkSize"])
+
+    def write_chunk(self, upload_id: str, index: int, data: bytes, sha256: str) -> Dict[str, Any]:
+        """Verify and store one chunk; raises ValueError if it is not the chunk the client hashed.
+
+        Chunk writes share the data file's lock and finalize takes it
+        exclusively, so a chunk is either written before the file moves or
+        refused with UploadConflict after.
+        """
+        session_dir, session = self._load(upload_id)
+        expected = self._chunk_length(session, index)
+        if len(data) != expected:
+            raise ValueError(f"Chunk {index} must be {expected} bytes, got {len(data)}")
+        if hashlib.sha256(data).hexdigest() != sha256.strip().lower():
+            raise ValueError(f"Chunk {index} does not match its SHA-256; send it again")
+        if not session_dir.exists():
+            # Aborted meanwhile; taking the lock would recreate the directory
+            raise UploadNotFound(upload_id)
+
+        with file_lock(session_dir / "data", shared=True):
+            _, session = self._load(upload_id)
+            if session["status"] != "uploading":
+                raise UploadConflict(f"Upload {upload_id} is already {session['status']}")
+            with timed_io("write_chunk", session_dir):
+                with open(session_dir / "data", "r+b") as f:
+                    f.seek(index * session["chunkSize"])
+                    f.write(data)
+                    f.flush()
+                    if self.settings.storage_fsync:
+                        # Durable before it is reported as committed
+                        os.fsync(f.fileno())
+
+            with file_lock(session_dir / "session.json"):
+                _, session = self._load(upload_id)
+                if index not in session["received"]:
+                    session["received"].append(index)
+                    session["updated"] = time.time()
+                    atomic_write_json(session_dir / "session.json", session)
+        return self._describe(session)
+
+    def _file_sha256(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @asynccontextmanager
+    async def claim(self, upload_id: str):
+        """Held while a request finalizes and processes the upload; raises UploadConflict if another holds it.
+
+        The lock goes with the process holding it, so when a worker dies
+        mid-processing the next finalize can claim the upload and resume.
+        """
+        session_dir, _ = self._load(upload_id)
+        acquired = False
+        try:
+            async with async_file_lock(session_dir / "processing", blocking=False):
+                acquired = True
+                yield
+        except BlockingIOError:
+            if acquired:
+                raise
+            raise UploadConflict(f"Upload {upload_id} is being processed; finalize again later for the result") from None
+
+    def finalize(self, upload_id: str) -> Tuple[Path, Dict[str, Any]]:
+        """Move the complete file into uploads/<type>/<date>/; returns its path and upload metadata.
+
+        Call it holding `claim`. An upload left in "processing" by a worker
+        that died is not moved again: the stored file is returned so its
+        processing can be redone. Raises UploadConflict while chunks are
+        missing and ValueError if the whole file does not match the
+        SHA-256 given at creation.
+        """
+        session_dir, _ = self._load(upload_id)
+        # Exclusive: waits for chunk writes in progress and keeps new ones out
+        with file_lock(session_dir / "data"), file_lock(session_dir / "session.json"):
+            _, session = self._load(upload_id)
+            if session["status"] == "processing":
+                file_path = self.storage_root / session["path"]
+                logger.info(f"Resuming processing of upload {upload_id}: {session['path']}")
+                return file_path, read_json(file_path.with_suffix(f"{file_path.suffix}.metadata.json"))
+            if session["status"] != "uploading":
+                raise UploadConflict(f"Upload {upload_id} is already {session['status']}")
+            missing = session["chunks"] - len(set(session["received"]))
+            if missing:
+                raise UploadConflict(f"Upload {upload_id} is missing {missing} of {session['chunks']} chunks")
+            if session["sha256"] and self._file_sha256(session_dir / "data") != session["sha256"]:
+                raise ValueError(f"Upload {upload_id} does not match its SHA-256")
+
+            extension = Path(session["filename"]).suffix.lower()
+            upload_dir = self.storage_root / "uploads" / session["fileType"] / datetime.now().strftime("%Y/%m/%d")
+            upload_dir.mkdir(parents=True, exist_ok=True)
+            file_path = upload_dir / f"{upload_id}{extension}"
+            os.replace(session_dir / "data", file_path)
+            metadata = {
+                "originalName": session["filename"],
+                "fileId": upload_id,
+                "fileType": session["fileType"],
+                "uploadDate": datetime.now().isoformat(),
+                "size": session["size"],
+                "path": str(file_path.relative_to(self.storage_root)),
+            }
+            atomic_write_json(file_path.with_suffix(f"{extension}.metadata.json"), metadata)
+            session.update({"status": "processing", "path": metadata["path"]})
+            atomic_write_json(session_dir / "session.json", session)
+        logger.info(f"Upload {upload_id} complete: {metadata['path']}")
+        return file_path, metadata
+
+    def complete(self, upload_id: str, result: Dict[str, Any]):
+        """Record the processing result, so a client that retries finalize gets it back"""
+        session_dir, _ = self._load(upload_id)
+        with file_lock(session_dir / "session.json"):
+            _, session = self._load(upload_id)
+            session.update({"status": "finalized", "result": result})
+            atomic_write_json(session_dir / "session.json", session)
+
+    def abort(self, upload_id: str):
+        session_dir, _ = self._load(upload_id)
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+    def remove_expired(self):
+        """Delete sessions older than UPLOAD_SESSION_HOURS, at most once an hour"""
+        now = time.monotonic()
+        if now - self._cleaned_at < CLEANUP_INTERVAL:
+            return
+        self._cleaned_at = now
+        cutoff = time.time() - self.settings.upload_session_hours * 3600
+        expired: List[Path] = []
+        for session_file in self.incoming_dir.glob("*/session.json"):
+            try:
+                if read_json(session_file)["created"] < cutoff:
+                    expired.append(session_file.parent)
+            except (OSError, ValueError, KeyError):
+                continue
+        for session_dir in expired:
+            shutil.rmtree(session_dir, ignore_errors=True)
+        if expired:
+            logger.info(f"Removed {len(expired)} expired upload sessions")
@@ -0,0 +1,121 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from .storage import atomic_write_bytes, file_lock
+from .metrics import SEARCH_CACHE_LOOKUPS, SEARCH_CACHE_BYTES, SEARCH_CACHE_EVICTIONS
+
+# Fixed cost per cached result besides its strings (dicts, key, bookkeeping)
+ENTRY_OVERHEAD = 512
+HIT_OVERHEAD = 400
+
+class IndexGeneration:
+    """Change counter of the search index, shared by all worker processes.
+
+    Every change to the index bumps the number in one small file. Readers
+    compare the file's stat with the last one they saw and only re-read the
+    number when it differs, so checking is a single stat call.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._value = 0
+
+    def current(self) -> int:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            try:
+                self._value = int(self.path.read_text() or 0)
+            except (OSError, ValueError):
+                return self._value
+            self._signature = signature
+        return self._value
+
+    def bump(self) -> int:
+        with file_lock(self.path):
+            try:
+                value = int(self.path.read_text() or 0) + 1
+            except (OSError, ValueError):
+                value = 1
+            # A new inode on every write, so a stat comparison always sees the change
+            atomic_write_bytes(self.path, str(value).encode())
+        return value
+
+def _result_size(hits: List[Dict[str, Any]]) -> int:
+    size = ENTRY_OVERHEAD
+    for hit in hits:
+        size += HIT_OVERHEAD + sum(sys.getsizeof(value) for value in hit.values() if isinstance(value, str))
+    return size
+
+class SearchCache:
+    """Search results by normalized query and filters, bounded by memory.
+
+    Each result is stored with the index generation it was computed at;
+    a lookup at a later generation treats it as a miss and drops it, so
+    index changes invalidate the cache without scanning it. Least recently
+    used results are evicted once their estimated size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # key -> (generation, size, (hits, total)), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[int, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, generation: int) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        """(hits, total) cached for `key` at this generation, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                SEARCH_CACHE_LOOKUPS.inc(result="hit")
+                return entry[2]
+            if entry is not None:
+                self._drop(key)
+                SEARCH_CACHE_LOOKUPS.inc(result="stale")
+            else:
+                SEARCH_CACHE_LOOKUPS.inc(result="miss")
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, generation: int, hits: List[Dict[str, Any]], total: int):
+        size = _result_size(hits)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (generation, size, (hits, total))
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                SEARCH_CACHE_EVICTIONS.inc()
+            SEARCH_CACHE_BYTES.set(self._bytes)
+
+    def _drop(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        SEARCH_CACHE_BYTES.set(self._bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else None,
+            }
@@ -0,0 +1,112 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+PLACEHOLDER_API_KEY = "your_openai_api_key_here"
+
+@dataclass(frozen=True)
+class Settings:
+    """Application configuration, read from the environment once per process"""
+    environment: str
+    workers: int
+    storage_root: Path
+    openai_api_key: Optional[str]
+    openai_base_url: Optional[str]
+    transcribe_model: str
+    summary_model: str
+    chat_model: str
+    admin_token: Optional[str] = None
+    trace_log_path: Optional[Path] = None
+    trace_sample_rate: float = 1.0
+    llm_mode: str = "live"
+    llm_recording_path: Optional[Path] = None
+    llm_replay_latency_scale: float = 1.0
+    llm_requests_per_minute: float = 500
+    llm_tokens_per_minute: float = 200000
+    llm_model_limits: str = ""
+    llm_max_retries: int = 3
+    llm_timeout: float = 120
+    request_timeout: float = 0
+    pregenerate_study_artifacts: bool = True
+    storage_fsync: bool = True
+    storage_format: str = "compact"
+    chunk_max_tokens: int = 256
+    chunk_overlap_tokens: int = 32
+    extract_max_tokens: int = 1000
+    search_cache_mb: float = 32
+    ffmpeg_path: str = "ffmpeg"
+    media_workers: int = 2
+    audio_bitrate: str = "24k"
+    media_timeout: float = 1800
+    vad_enabled: bool = True
+    vad_min_silence: float = 1.0
+    transcribe_backend: str = "remote"
+    local_transcribe_model: str = "small"
+    local_transcribe_compute_type: str = "int8"
+    local_transcribe_workers: int = 1
+    local_transcribe_max_seconds: float = 600
+    upload_chunk_mb: float = 8
+    upload_max_mb: float = 4096
+    upload_session_hours: float = 24
+
+    @property
+    def use_real_api(self) -> bool:
+        # Replay needs no key: recorded responses stand in for the API
+        if self.llm_mode == "replay":
+            return True
+        return bool(self.openai_api_key and self.openai_api_key != PLACEHOLDER_API_KEY)
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            environment=os.getenv("ENVIRONMENT", "development"),
+            workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+            storage_root=Path(os.getenv("STORAGE_ROOT", "../storage")),
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            openai_base_url=os.getenv("OPENAI_BASE_URL") or None,
+            transcribe_model=os.getenv("OPENAI_MODEL_TRANSCRIBE", "whisper-1"),
+            summary_model=os.getenv("OPENAI_MODEL_SUMMARY", "gpt-4o-mini"),
+            chat_model=os.getenv("OPENAI_MODEL_CHAT", "gpt-4o-mini"),
+            admin_token=os.getenv("ADMIN_TOKEN") or None,
+            trace_log_path=Path(os.environ["TRACE_LOG_PATH"]) if os.getenv("TRACE_LOG_PATH") else None,
+            trace_sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+            llm_mode=os.getenv("LLM_MODE", "live").lower(),
+            llm_recording_path=Path(os.environ["LLM_RECORDING_PATH"]) if os.getenv("LLM_RECORDING_PATH") else None,
+            llm_replay_latency_scale=float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0")),
+            llm_requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+            llm_tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")),
+            llm_model_limits=os.getenv("LLM_MODEL_LIMITS", ""),
+            llm_max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            llm_timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "120")),
+            request_timeout=float(os.getenv("REQUEST_TIMEOUT_SECONDS", "0")),
+            pregenerate_study_artifacts=os.getenv("PREGENERATE_STUDY_ARTIFACTS", "true").lower() == "true",
+            storage_fsync=os.getenv("STORAGE_FSYNC", "true").lower() == "true",
+            storage_format=os.getenv("STORAGE_FORMAT", "compact").lower(),
+            chunk_max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "256")),
+            chunk_overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "32")),
+            extract_max_tokens=int(os.getenv("EXTRACT_MAX_TOKENS", "1000")),
+            search_cache_mb=float(os.getenv("SEARCH_CACHE_MB", "32")),
+            ffmpeg_path=os.getenv("FFMPEG_PATH", "ffmpeg"),
+            media_workers=int(os.getenv("MEDIA_WORKERS", "2")),
+            audio_bitrate=os.getenv("AUDIO_BITRATE", "24k"),
+            media_timeout=float(os.getenv("MEDIA_TIMEOUT", "1800")),
+            vad_enabled=os.getenv("AUDIO_VAD", "true").lower() == "true",
+            vad_min_silence=float(os.getenv("VAD_MIN_SILENCE_SECONDS", "1.0")),
+            transcribe_backend=os.getenv("TRANSCRIBE_BACKEND", "remote").lower(),
+            local_transcribe_model=os.getenv("LOCAL_TRANSCRIBE_MODEL", "small"),
+            local_transcribe_compute_type=os.getenv("LOCAL_TRANSCRIBE_COMPUTE_TYPE", "int8"),
+            local_transcribe_workers=int(os.getenv("LOCAL_TRANSCRIBE_WORKERS", "1")),
+            local_transcribe_max_seconds=float(os.getenv("LOCAL_TRANSCRIBE_MAX_SECONDS", "600")),
+            upload_chunk_mb=float(os.getenv("UPLOAD_CHUNK_MB", "8")),
+            upload_max_mb=float(os.getenv("UPLOAD_MAX_MB", "4096")),
+            upload_session_hours=float(os.getenv("UPLOAD_SESSION_HOURS", "24")),
+        )
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Load .env and build the settings on first use"""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return Settings.from_env()
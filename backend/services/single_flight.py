@@ -0,0 +1,138 @@
+import json
+import time
+import asyncio
+import hashlib
+import urllib.parse
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+from .settings import Settings, get_settings
+from .metrics import COALESCED_REQUESTS
+from .storage import async_file_lock, async_write_json, read_json
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+def normalize_content_path(content_path: str) -> str:
+    """processed/pdf/x.txt, pdf/x.txt and URL-encoded forms name the same document"""
+    path = urllib.parse.unquote(content_path or "").strip().replace('\\', '/').lstrip('/')
+    if path.startswith("processed/"):
+        path = path[len("processed/"):]
+    return path
+
+def generation_key(operation: str, **params: Any) -> str:
+    """Key identifying one generation request, independent of parameter order"""
+    canonical = json.dumps({"operation": operation, **params}, sort_keys=True, default=str)
+    return f"{operation}-{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]}"
+
+class SingleFlight:
+    """Runs identical concurrent generation requests once and shares the result.
+
+    Within a worker, duplicates await the leader's task. Across workers the
+    leader holds ``locks/<key>.lock`` while it works and then publishes the
+    result next to it; a worker that found the lock taken polls it every
+    POLL_INTERVAL and then picks up that result instead of calling the LLM
+    again. Only a result published while the caller waited is shared: a
+    request that finds the lock free always generates anew, so
+    back-to-back requests still get distinct quizzes.
+    Result files are pruned after RESULT_TTL; the empty lock files stay,
+    since removing one another worker may have open would break the
+    exclusion. Work is cancelled once every request waiting for it has
+    gone, e.g. all their clients disconnected.
+    """
+    RESULT_TTL = 15.0
+    POLL_INTERVAL = 0.2
+    CLEANUP_INTERVAL = 60.0
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.lock_dir = self.settings.storage_root / "locks" / "single-flight"
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self._cleaned_at = 0.0
+
+    async def run(self, key: str, work: Callable[[], Awaitable[Any]]) -> Any:
+        operation = key.split("-", 1)[0]
+        task = self._inflight.get(key)
+        if task is not None:
+            COALESCED_REQUESTS.inc(operation=operation, scope="local")
+            with span("singleflight.wait", key=key):
+                return await self._wait(key, task)
+
+        # A task of its own, so a leader whose client disconnects does not
+        # cancel the work its followers are waiting for
+        task = asyncio.create_task(self._run_locked(key, operation, work))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await self._wait(key, task)
+
+    async def _wait(self, key: str, task: asyncio.Task) -> Any:
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and not task.done():
+                logger.info(f"Cancelling {key}: no request is waiting for it")
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def _run_locked(self, key: str, operation: str, work: Callable[[], Awaitable[Any]]) -> Any:
+        lock_path = self.lock_dir / key
+        result_path = self.lock_dir / f"{key}.json"
+        started = time.time()
+        waited = False
+        try:
+            while True:
+                acquired = False
+                try:
+                    async with async_file_lock(lock_path, blocking=False):
+                        acquired = True
+                        if waited:
+                            shared = await asyncio.to_thread(self._published_result, result_path, started)
+                            if shared is not None:
+                                COALESCED_REQUESTS.inc(operation=operation, scope="cross_worker")
+                                return shared["result"]
+                        return await self._generate(key, result_path, work)
+                except BlockingIOError:
+                    if acquired:
+                        raise
+                # Another worker is generating this. Polled rather than waited
+                # for in a thread, which would be held for the whole generation
+                waited = True
+                await asyncio.sleep(self.POLL_INTERVAL)
+        finally:
+            await self._cleanup()
+
+    async def _generate(self, key: str, result_path: Path, work: Callable[[], Awaitable[Any]]) -> Any:
+        result = await work()
+        await async_write_json(result_path, {"key": key, "result": result})
+        return result
+
+    def _published_result(self, result_path: Path, since: float) -> Optional[Dict[str, Any]]:
+        """The result the lock holder published after `since`, if any"""
+        try:
+            if result_path.stat().st_mtime < since:
+                return None
+            return read_json(result_path)
+        except (OSError, ValueError):
+            return None
+
+    async def _cleanup(self):
+        now = time.monotonic()
+        if now - self._cleaned_at < self.CLEANUP_INTERVAL:
+            return
+        self._cleaned_at = now
+        await asyncio.to_thread(self._remove_expired)
+
+    def _remove_expired(self):
+        cutoff = time.time() - self.RESULT_TTL
+        for result_path in self.lock_dir.glob("*.json"):
+            try:
+                if result_path.stat().st_mtime < cutoff:
+                    result_path.unlink()
+            except OSError:
+                pass
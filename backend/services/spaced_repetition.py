@@ -0,0 +1,340 @@
+import os
+import re
+import time
+import heapq
+import uuid
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+from .settings import Settings, get_settings
+from .storage import read_json, atomic_write_json, file_lock, dumps, loads
+from .single_flight import normalize_content_path
+from .flashcard_generator import CARD_TYPES, deck_path
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+RELEARN_SECONDS = 600
+GRADE_NAMES = {"again": 1, "hard": 3, "good": 4, "easy": 5}
+
+# Card state: [due (epoch seconds), interval (days), ease, repetitions, lapses]
+CardState = List[Any]
+
+def card_id(content_path: str, card_type: str, card: Dict[str, Any]) -> str:
+    """Stable id of a deck card: document, card type and a hash of its front"""
+    digest = hashlib.sha1(str(card.get("front", "")).strip().lower().encode('utf-8')).hexdigest()[:12]
+    return f"{normalize_content_path(content_path)}#{card_type}#{digest}"
+
+def parse_grade(grade: Any) -> int:
+    """SM-2 quality 0-5, also accepting again/hard/good/easy"""
+    if isinstance(grade, str) and grade.lower() in GRADE_NAMES:
+        return GRADE_NAMES[grade.lower()]
+    value = int(grade)
+    if not 0 <= value <= 5:
+        raise ValueError(f"Grade must be between 0 and 5, got {grade}")
+    return value
+
+def sm2(state: Optional[CardState], grade: int, now: int) -> CardState:
+    """Next state of a card after a review with SM-2 quality `grade`"""
+    due, interval, ease, reps, lapses = state or (now, 0.0, 2.5, 0, 0)
+    if grade < 3:
+        reps, lapses, interval = 0, lapses + 1, 0.0
+        due = now + RELEARN_SECONDS
+    else:
+        reps += 1
+        interval = 1.0 if reps == 1 else 6.0 if reps == 2 else round(interval * ease, 2)
+        due = now + int(interval * DAY)
+    ease = round(max(1.3, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02)), 3)
+    return [due, interval, ease, reps, lapses]
+
+class StudentCards:
+    """One student's card states with a due-date heap per document and one over all cards.
+
+    Rescheduling pushes a new heap entry and leaves the old one behind;
+    entries whose due date no longer matches the card are dropped when
+    they reach the top, and the heaps are rebuilt once stale entries
+    outnumber live ones.
+    """
+
+    def __init__(self):
+        self.cards: Dict[str, CardState] = {}
+        self.heaps: Dict[str, List[Tuple[int, str]]] = {"": []}
+        self.offset = 0
+        self.snapshot_version: Optional[Tuple[int, int]] = None
+
+    def set(self, cid: str, state: CardState):
+        self.cards[cid] = state
+        entry = (state[0], cid)
+        heapq.heappush(self.heaps[""], entry)
+        heapq.heappush(self.heaps.setdefault(cid.split("#", 1)[0], []), entry)
+        if len(self.heaps[""]) > 2 * len(self.cards) + 64:
+            self._rebuild()
+
+    def apply(self, event: Dict[str, Any]):
+        self.set(event["c"], sm2(self.cards.get(event["c"]), event["g"], event["t"]))
+
+    def forget(self, cid: str):
+        self.cards.pop(cid, None)
+
+    def _rebuild(self):
+        self.heaps = {"": []}
+        for cid, state in self.cards.items():
+            self.heaps[""].append((state[0], cid))
+            self.heaps.setdefault(cid.split("#", 1)[0], []).append((state[0], cid))
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+
+    def due(self, now: int, limit: int, document: str = "") -> List[str]:
+        """Up to `limit` cards due by `now`, most overdue first; O(limit log n)"""
+        heap = self.heaps.get(document)
+        if not heap:
+            return []
+        found: List[str] = []
+        popped = []
+        while heap and len(found) < limit:
+            due, cid = heap[0]
+            state = self.cards.get(cid)
+            if state is None or state[0] != due or cid in found:
+                heapq.heappop(heap)
+                continue
+            if due > now:
+                break
+            popped.append(heapq.heappop(heap))
+            found.append(cid)
+        for entry in popped:
+            heapq.heappush(heap, entry)
+        return found
+
+class ReviewStore:
+    """Per-student spaced-repetition state under storage/reviews/<student>/.
+
+    ``state.json`` is a compact snapshot and ``events.jsonl`` the reviews
+    since then. Reviews are applied in memory at once and appended to the
+    log in batches (every FLUSH_INTERVAL seconds or FLUSH_BATCH events).
+    Each request reads only the log lines added since the last one, so
+    other workers' reviews show up without reloading the whole state; once
+    the log passes COMPACT_BYTES it is folded into a new snapshot.
+    """
+    FLUSH_INTERVAL = 1.0
+    FLUSH_BATCH = 200
+    COMPACT_BYTES = 1 << 20
+    MAX_STUDENTS = 1024
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.reviews_dir = self.settings.storage_root / "reviews"
+        self.processed_dir = self.settings.storage_root / "processed"
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._students: "OrderedDict[str, StudentCards]" = OrderedDict()
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._pending_count = 0
+        self._decks: Dict[Path, Tuple[int, Dict[str, Dict[str, Any]]]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def _student_dir(self, student_id: str) -> Path:
+        safe = re.sub(r"[^\w.-]", "_", student_id)[:64] or "anonymous"
+        return self.reviews_dir / safe
+
+    async def session(self, student_id: str, limit: int, content_path: str = "", card_type: str = "",
+                      new_cards: int = 0) -> Dict[str, Any]:
+        """Due reviews (for one document if given), topped up with cards the student has not seen"""
+        now = int(time.time())
+        document = normalize_content_path(content_path) if content_path else ""
+        student = await self._load(student_id)
+
+        cards = []
+        for cid in student.due(now, limit, document):
+            card = await self._card_text(cid)
+            if card is None:
+                # Its deck was regenerated without this card
+                student.forget(cid)
+                continue
+            cards.append({**card, "cardId": cid, "new": False,
+                          "due": datetime.fromtimestamp(student.cards[cid][0]).isoformat()})
+        review_count = len(cards)
+
+        if document and new_cards > 0 and len(cards) < limit:
+            for deck_type in ([card_type] if card_type else CARD_TYPES):
+                deck = await self._deck(self.processed_dir / document, deck_type)
+                for cid, card in deck.items():
+                    if len(cards) >= limit or len(cards) - review_count >= new_cards:
+                        break
+                    if cid not in student.cards:
+                        cards.append({**card, "cardId": cid, "new": True, "due": None})
+
+        return {
+            "studentId": student_id,
+            "cards": cards,
+            "reviewCount": review_count,
+            "newCount": len(cards) - review_count,
+        }
+
+    async def review(self, student_id: str, reviews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply a batch of reviews now and queue them for the log"""
+        now = int(time.time())
+        for review in reviews:
+            if str(review.get("cardId", "")).count("#") < 2:
+                raise ValueError(f"Invalid card id: {review.get('cardId')}")
+        events = [{"c": review["cardId"], "g": parse_grade(review["grade"]), "t": now, "w": self.worker_id}
+                  for review in reviews]
+        student = await self._load(student_id)
+        scheduled = []
+        for event in events:
+            student.apply(event)
+            due, interval = student.cards[event["c"]][:2]
+            scheduled.append({"cardId": event["c"], "due": datetime.fromtimestamp(due).isoformat(),
+                              "intervalDays": interval})
+
+        self._pending.setdefault(student_id, []).extend(events)
+        self._pending_count += len(events)
+        self._ensure_flusher()
+        if self._pending_count >= self.FLUSH_BATCH:
+            self._wakeup.set()
+        return scheduled
+
+    async def _load(self, student_id: str) -> StudentCards:
+        """The student's cards, brought up to date with the log"""
+        student = self._students.get(student_id)
+        if student is not None:
+            self._students.move_to_end(student_id)
+        directory = self._student_dir(student_id)
+        version, lines, offset = await asyncio.to_thread(
+            self._read_log, directory, student.snapshot_version if student else None,
+            student.offset if student else 0)
+
+        if student is None or version != student.snapshot_version:
+            # First use, or another worker compacted the log: start from the snapshot
+            student = await asyncio.to_thread(self._read_snapshot, directory)
+            student.snapshot_version = version
+            for line in lines:
+                student.apply(loads(line))
+            for event in self._pending.get(student_id, []):
+                student.apply(event)
+            self._students[student_id] = student
+            if len(self._students) > self.MAX_STUDENTS:
+                self._students.popitem(last=False)
+        else:
+            for line in lines:
+                event = loads(line)
+                if event.get("w") != self.worker_id:
+                    student.apply(event)
+        student.offset = offset
+        return student
+
+    def _read_log(self, directory: Path, known_version: Optional[Tuple[int, int]],
+                  offset: int) -> Tuple[Optional[Tuple[int, int]], List[str], int]:
+        """Snapshot version and the complete log lines after `offset` (all of them if the snapshot changed)"""
+        events_path = directory / "events.jsonl"
+        with file_lock(events_path):
+            try:
+                stat = (directory / "state.json").stat()
+                version = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                version = None
+            if version != known_version:
+                offset = 0
+            try:
+                with open(events_path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read()
+            except OSError:
+                return version, [], offset
+        complete = data[:data.rfind(b"\n") + 1]
+        return version, complete.decode('utf-8').splitlines(), offset + len(complete)
+
+    def _read_snapshot(self, directory: Path) -> StudentCards:
+        student = StudentCards()
+        try:
+            snapshot = read_json(directory / "state.json")
+        except (OSError, ValueError):
+            return student
+        student.cards = snapshot.get("cards", {})
+        student._rebuild()
+        return student
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Append all queued reviews to the students' logs"""
+        pending, self._pending, self._pending_count = self._pending, {}, 0
+        for student_id, events in pending.items():
+            try:
+                await asyncio.to_thread(self._append, self._student_dir(student_id), events)
+            except OSError as e:
+                logger.error(f"Error writing reviews for {student_id}: {e}")
+                self._pending.setdefault(student_id, [])[:0] = events
+                self._pending_count += len(events)
+
+    def _append(self, directory: Path, events: List[Dict[str, Any]]):
+        directory.mkdir(parents=True, exist_ok=True)
+        events_path = directory / "events.jsonl"
+        data = b"".join(dumps(event) + b"\n" for event in events)
+        with file_lock(events_path):
+            with open(events_path, 'ab') as f:
+                f.write(data)
+            if events_path.stat().st_size > self.COMPACT_BYTES:
+                self._compact(directory, events_path)
+
+    def _compact(self, directory: Path, events_path: Path):
+        """Fold the log into a new snapshot; caller holds the log lock"""
+        student = self._read_snapshot(directory)
+        with open(events_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    student.apply(loads(line))
+        snapshot = {"version": 1, "updated": datetime.now().isoformat(), "cards": student.cards}
+        atomic_write_json(directory / "state.json", snapshot)
+        with open(events_path, 'w', encoding='utf-8'):
+            pass
+        logger.info(f"Compacted review log for {directory.name} ({len(student.cards)} cards)")
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    async def _deck(self, content_file: Path, card_type: str) -> Dict[str, Dict[str, Any]]:
+        """Stored deck as card id -> card, cached until the deck file changes"""
+        path = deck_path(content_file, card_type)
+        try:
+            mtime = (await asyncio.to_thread(path.stat)).st_mtime_ns
+        except OSError:
+            return {}
+        cached = self._decks.get(path)
+        if cached is None or cached[0] != mtime:
+            try:
+                deck = await asyncio.to_thread(read_json, path)
+            except (OSError, ValueError):
+                return {}
+            document = str(content_file.relative_to(self.processed_dir)).replace('\\', '/')
+            cards = {card_id(document, card_type, card): {**card, "cardType": card_type, "contentPath": document}
+                     for card in deck}
+            cached = self._decks[path] = (mtime, cards)
+        return cached[1]
+
+    async def _card_text(self, cid: str) -> Optional[Dict[str, Any]]:
+        document, card_type, _ = cid.split("#", 2)
+        deck = await self._deck(self.processed_dir / document, card_type)
+        return deck.get(cid)
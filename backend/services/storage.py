@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import queue
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager, asynccontextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+import logging
+from .metrics import STORAGE_COMMIT_BATCH, STORAGE_IO_SECONDS
+from .settings import get_settings
+from .tracing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import orjson
+except ImportError:  # stdlib json is used without it, just slower
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+def _area(path: PathLike) -> str:
+    """Top-level storage directory a path belongs to (quizzes, chatbot, ...)"""
+    try:
+        return Path(path).relative_to(get_settings().storage_root).parts[0]
+    except (ValueError, IndexError):
+        return "other"
+
+@contextmanager
+def timed_io(operation: str, path: PathLike):
+    """Record the duration of a storage operation in the storage I/O histogram"""
+    area = _area(path)
+    start = time.perf_counter()
+    try:
+        with span(f"fs.{operation}", area=area):
+            yield
+    finally:
+        STORAGE_IO_SECONDS.observe(time.perf_counter() - start, operation=operation, area=area)
+
+# Compact files start with this magic and a format version byte; anything
+# else is read as plain JSON, which covers files written before the header
+FORMAT_MAGIC = b"EAJ"
+FORMAT_VERSION = 1
+
+def dumps(data: Any) -> bytes:
+    """Compact JSON (UTF-8), via orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def encode_json(data: Any, storage_format: Optional[str] = None) -> bytes:
+    """File content for `data` in `storage_format` (default: the configured STORAGE_FORMAT)"""
+    if (storage_format or get_settings().storage_format) == "json":
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    return FORMAT_MAGIC + bytes([FORMAT_VERSION]) + dumps(data)
+
+def decode_json(data: bytes) -> Any:
+    """Decode either a compact file (any known version) or plain JSON"""
+    if data[:len(FORMAT_MAGIC)] == FORMAT_MAGIC:
+        version = data[len(FORMAT_MAGIC)]
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported storage format version {version}")
+        return loads(data[len(FORMAT_MAGIC) + 1:])
+    return loads(data)
+
+def read_json(path: PathLike) -> Any:
+    with timed_io("read", path):
+        with open(path, 'rb') as f:
+            data = f.read()
+    return decode_json(data)
+
+def write_json(path: PathLike, data: Any):
+    """Atomic write; from async code use async_write_json instead"""
+    atomic_write_json(path, data)
+
+def read_text(path: PathLike) -> str:
+    with timed_io("read", path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+@contextmanager
+def file_lock(path: PathLike, blocking: bool = True, shared: bool = False):
+    """Hold an exclusive inter-process lock on ``<path>.lock``.
+
+    Every worker process sees the same files under storage/, so any
+    read-modify-write of a shared file must happen under this lock. With
+    blocking=False, raises BlockingIOError if another process holds it.
+    With shared=True, other shared holders are let in and only exclusive
+    ones kept out (on Windows, where there are no shared locks, it is
+    exclusive).
+    """
+    lock_path = Path(f"{path}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            if fcntl is not None:
+                mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+                fcntl.flock(fd, mode if blocking else mode | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError as e:
+            if blocking:
+                raise
+            raise BlockingIOError(f"{lock_path} is held by another process") from e
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+@asynccontextmanager
+async def async_file_lock(path: PathLike, blocking: bool = True):
+    """Async variant of file_lock; blocks a worker thread, not the event loop.
+
+    Safe to cancel while waiting: the thread cannot be interrupted, so a
+    lock it takes after its waiter is gone is released as soon as it has it.
+    """
+    manager = file_lock(path, blocking)
+    acquire = asyncio.ensure_future(asyncio.to_thread(manager.__enter__))
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        def release(future):
+            if not future.cancelled() and future.exception() is None:
+                manager.__exit__(None, None, None)
+        acquire.add_done_callback(release)
+        raise
+    try:
+        yield
+    finally:
+        manager.__exit__(None, None, None)
+
+class GroupCommitWriter:
+    """Commits atomic file writes from one background thread.
+
+    Each file is written to a temp file in its directory, fsynced and
+    renamed over the target, so readers see the old or the new content and
+    a crash never leaves a truncated file. Writes that queue up while a
+    batch is being committed go into the next batch: the directory fsyncs
+    that make the renames durable are done once per directory per batch,
+    and a later write to a path supersedes an earlier one in the same batch.
+    Writes to one path are committed in submission order.
+    """
+    MAX_BATCH = 256
+
+    def __init__(self, fsync: bool = True):
+        self.fsync = fsync
+        self._queue: "queue.Queue[Tuple[Path, bytes, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def submit(self, path: PathLike, data: bytes) -> Future:
+        future: Future = Future()
+        self._ensure_thread()
+        self._queue.put((Path(path), data, future))
+        return future
+
+    def _ensure_thread(self):
+        # Checked by pid as well: a forked worker does not inherit the thread
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._run, name="storage-commit", daemon=True)
+                    self._pid = os.getpid()
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[Path, bytes, Future]]):
+        STORAGE_COMMIT_BATCH.observe(len(batch))
+        latest: Dict[Path, Tuple[bytes, List[Future]]] = {}
+        for path, data, future in batch:
+            if future.set_running_or_notify_cancel():
+                waiting = latest[path][1] if path in latest else []
+                latest[path] = (data, waiting + [future])
+
+        directories = set()
+        for path, (data, futures) in latest.items():
+            try:
+                self._write(path, data)
+                directories.add(path.parent)
+            except BaseException as e:
+                for future in futures:
+                    future.set_exception(e)
+                latest[path] = (data, [])
+        if self.fsync:
+            for directory in directories:
+                _fsync_directory(directory)
+        for data, futures in latest.values():
+            for future in futures:
+                future.set_result(None)
+
+    def _write(self, path: Path, data: bytes):
+        with timed_io("write", path):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+
+def _fsync_directory(directory: Path):
+    """Make renames in `directory` durable (not possible on Windows)"""
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        logger.warning(f"Could not fsync directory {directory}: {e}")
+    finally:
+        os.close(fd)
+
+_writer: Optional[GroupCommitWriter] = None
+
+def get_writer() -> GroupCommitWriter:
+    global _writer
+    if _writer is None:
+        _writer = GroupCommitWriter(fsync=get_settings().storage_fsync)
+    return _writer
+
+def atomic_write_bytes(path: PathLike, data: bytes):
+    """Write a file atomically, blocking until it is committed"""
+    get_writer().submit(path, data).result()
+
+def atomic_write_json(path: PathLike, data: Any):
+    """Serialize data as JSON and write it atomically"""
+    atomic_write_bytes(path, encode_json(data))
+
+async def async_write_bytes(path: PathLike, data: bytes):
+    """Write a file atomically without blocking the event loop.
+
+    The write is committed even if the awaiting request is cancelled.
+    """
+    await asyncio.shield(asyncio.wrap_future(get_writer().submit(path, data)))
+
+async def async_write_json(path: PathLike, data: Any):
+    # Large documents take a while to encode; do it off the loop too
+    await async_write_bytes(path, await asyncio.to_thread(encode_json, data))
+
+async def async_write_text(path: PathLike, text: str):
+    await async_write_bytes(path, text.encode('utf-8'))
+
+async def async_read_json(path: PathLike) -> Any:
+    return await asyncio.to_thread(read_json, path)
+
+async def async_read_text(path: PathLike) -> str:
+    return await asyncio.to_thread(read_text, path)
@@ -1,22 +1,20 @@
-import os
 import json
 import uuid
 import asyncio
-from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 import logging
-import openai
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from .settings import Settings, get_settings
+from .llm_client import chat_completion
+from .deadlines import DeadlineExceeded
+from .storage import read_json, async_read_json, async_write_json
 
 logger = logging.getLogger(__name__)
 
 class TeacherServices:
-    def __init__(self):
-        self.storage_root = Path("../storage")
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.storage_root = self.settings.storage_root
         self.assignments_dir = self.storage_root / "assignments"
         self.grades_dir = self.storage_root / "grades"
         self.analytics_dir = self.storage_root / "analytics"
@@ -29,13 +27,10 @@ class TeacherServices:
                          self.recommendations_dir, self.plagiarism_dir, self.lesson_plans_dir]:
             directory.mkdir(parents=True, exist_ok=True)
         
-        # Initialize OpenAI client
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.client = openai.OpenAI(api_key=self.api_key) if self.api_key else None
-        self.model = os.getenv("OPENAI_MODEL_SUMMARY", "gpt-4o-mini")
+        self.model = self.settings.summary_model
         
         # Check if API key is available
-        self.use_real_api = bool(self.api_key and self.api_key != "your_openai_api_key_here")
+        self.use_real_api = self.settings.use_real_api
         
         if not self.use_real_api:
             logger.warning("OpenAI API key not configured. Using mock teacher services.")
@@ -70,8 +65,7 @@ class TeacherServices:
             
             # Save assignment
             assignment_file = self.assignments_dir / f"{assignment_id}.json"
-            with open(assignment_file, 'w', encoding='utf-8') as f:
-                json.dump(assignment, f, indent=2, ensure_ascii=False)
+            await async_write_json(assignment_file, assignment)
             
             logger.info(f"Generated assignment {assignment_id} with {len(assignment_data)} questions")
             return assignment
@@ -129,8 +123,8 @@ class TeacherServices:
                 }}
             ]"""
             
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
+            ai_response = await chat_completion(
+                "assignment",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are an expert teacher and assessment creator. Create comprehensive, well-structured questions that properly assess student understanding."},
@@ -140,9 +134,6 @@ class TeacherServices:
                 temperature=0.3
             )
             
-            # Parse AI response
-            ai_response = response.choices[0].message.content
-            
             # Try to extract JSON from response
             try:
                 start_idx = ai_response.find('[')
@@ -157,6 +148,8 @@ class TeacherServices:
                 logger.warning("Could not parse AI response as JSON, falling back to mock questions")
                 return await self._generate_mock_assignment(difficulty, question_types, question_count)
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error generating AI assignment: {e}")
             return await self._generate_mock_assignment(difficulty, question_types, question_count)
@@ -249,12 +242,11 @@ class TeacherServices:
         try:
             # Load assignment
             assignment_file = self.assignments_dir / f"{assignment_id}.json"
-            if not assignment_file.exists():
+            try:
+                assignment = await async_read_json(assignment_file)
+            except FileNotFoundError:
                 raise ValueError(f"Assignment {assignment_id} not found")
             
-            with open(assignment_file, 'r', encoding='utf-8') as f:
-                assignment = json.load(f)
-            
             # Grade each question
             total_marks = 0
             earned_marks = 0
@@ -316,8 +308,7 @@ class TeacherServices:
             
             # Save grade record
             grade_file = self.grades_dir / f"{grade_id}.json"
-            with open(grade_file, 'w', encoding='utf-8') as f:
-                json.dump(grade_record, f, indent=2, ensure_ascii=False)
+            await async_write_json(grade_file, grade_record)
             
             logger.info(f"Graded assignment {assignment_id}: {percentage:.1f}% ({earned_marks}/{total_marks})")
             return grade_record
@@ -347,8 +338,8 @@ class TeacherServices:
             
             Format: MARKS: X/{question['marks']} | FEEDBACK: [detailed feedback]"""
             
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
+            ai_response = await chat_completion(
+                "grading",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are an expert teacher grading student assignments. Be fair but thorough in your evaluation."},
@@ -358,8 +349,6 @@ class TeacherServices:
                 temperature=0.3
             )
             
-            ai_response = response.choices[0].message.content
-            
             # Parse marks and feedback
             try:
                 if "MARKS:" in ai_response and "FEEDBACK:" in ai_response:
@@ -375,6 +364,9 @@ class TeacherServices:
             except:
                 return question['marks'] * 0.6, "AI grading encountered an error. Manual review recommended."
                 
+        except DeadlineExceeded:
+            # No partial grade record: the whole request failed
+            raise
         except Exception as e:
             logger.error(f"Error in AI grading: {e}")
             return question['marks'] * 0.5, f"Error in AI grading: {str(e)}"
@@ -440,23 +432,27 @@ class TeacherServices:
             return "Significant improvement needed. Consider seeking additional help and reviewing all materials."
 
     # Get teacher's assignments
+    def _scan_assignments(self, teacher_id: str) -> List[Dict[str, Any]]:
+        """Summaries of a teacher's assignments (runs in a worker thread)"""
+        assignments = []
+        for assignment_file in self.assignments_dir.glob("*.json"):
+            assignment_data = read_json(assignment_file)
+            if assignment_data.get("teacherId") == teacher_id:
+                # Return summary info
+                assignments.append({
+                    "id": assignment_data["id"],
+                    "title": assignment_data["title"],
+                    "difficulty": assignment_data["difficulty"],
+                    "totalQuestions": assignment_data["totalQuestions"],
+                    "createdAt": assignment_data["createdAt"],
+                    "status": assignment_data.get("status", "active")
+                })
+        return assignments
+    
     async def get_teacher_assignments(self, teacher_id: str) -> List[Dict[str, Any]]:
         """Get all assignments created by a teacher"""
         try:
-            assignments = []
-            for assignment_file in self.assignments_dir.glob("*.json"):
-                with open(assignment_file, 'r', encoding='utf-8') as f:
-                    assignment_data = json.load(f)
-                    if assignment_data.get("teacherId") == teacher_id:
-                        # Return summary info
-                        assignments.append({
-                            "id": assignment_data["id"],
-                            "title": assignment_data["title"],
-                            "difficulty": assignment_data["difficulty"],
-                            "totalQuestions": assignment_data["totalQuestions"],
-                            "createdAt": assignment_data["createdAt"],
-                            "status": assignment_data.get("status", "active")
-                        })
+            assignments = await asyncio.to_thread(self._scan_assignments, teacher_id)
             
             # Sort by creation date (newest first)
             assignments.sort(key=lambda x: x["createdAt"], reverse=True)
@@ -0,0 +1,243 @@
+import os
+import io
+import json
+import time
+import queue
+import random
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Trace:
+    """Spans recorded while serving one request"""
+
+    def __init__(self, route: str, method: str):
+        self.id = os.urandom(8).hex()
+        self.route = route
+        self.method = method
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[Dict[str, Any]] = []
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, one entry per span name with summed duration"""
+        totals: Dict[str, float] = {}
+        for recorded in self.spans:
+            totals[recorded["name"]] = totals.get(recorded["name"], 0.0) + recorded["duration"]
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+        entries.append(f"total;dur={self.duration * 1000:.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.id,
+            "method": self.method,
+            "route": self.route,
+            "startedAt": self.started_at,
+            "durationMs": round(self.duration * 1000, 3),
+            "spans": [
+                {**recorded, "offset": round(recorded["offset"] * 1000, 3),
+                 "duration": round(recorded["duration"] * 1000, 3)}
+                for recorded in self.spans
+            ],
+        }
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("span", default=None)
+
+def start_trace(route: str, method: str) -> Trace:
+    trace = Trace(route, method)
+    _current_trace.set(trace)
+    return trace
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def span(name: str, **attrs: Any):
+    """Record a timed span on the current request's trace.
+
+    Outside a request (background work, scripts) this is a no-op. Spans
+    opened inside asyncio.to_thread still land on the request's trace
+    because the context is copied into the worker thread.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    parent = _current_span.get()
+    token = _current_span.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_span.reset(token)
+        recorded = {"name": name, "offset": start - trace.start, "duration": time.perf_counter() - start}
+        if parent:
+            recorded["parent"] = parent
+        if attrs:
+            recorded["attrs"] = attrs
+        trace.spans.append(recorded)
+
+class TraceLog:
+    """Appends sampled traces as JSON lines from a background thread"""
+
+    def __init__(self, path: Path, sample_rate: float = 1.0):
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self._queue: "queue.SimpleQueue[Dict[str, Any]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, trace: Trace):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if self._thread is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="trace-log", daemon=True)
+            self._thread.start()
+        self._queue.put(trace.to_dict())
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write("".join(json.dumps(item) + "\n" for item in batch))
+            except OSError as e:
+                logger.warning(f"Could not write trace log {self.path}: {e}")
+
+class RouteProfiler:
+    """Runs cProfile for the next N requests on selected routes.
+
+    cProfile follows a single thread, so it sees the event loop: parsing,
+    serialization, file reads done inline and any CPU-heavy handler code.
+    LLM calls and work in asyncio.to_thread (storage I/O) appear as await
+    time; use the trace spans for those. Other requests interleaved on the
+    loop during a profiled request are included in its profile.
+
+    The armed routes live in a shared file so arming reaches every worker;
+    each worker re-reads it at most once per REFRESH_INTERVAL.
+    """
+    REFRESH_INTERVAL = 1.0
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = Path(output_dir)
+        self.armed_file = self.output_dir / "armed.json"
+        self.armed: Dict[str, int] = {}
+        self._active = False
+        self._checked_at = 0.0
+        self._armed_mtime = None
+
+    def _read_armed(self) -> Dict[str, int]:
+        from .storage import read_json
+        try:
+            return read_json(self.armed_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _update_armed(self, update) -> Any:
+        from .storage import file_lock, atomic_write_json
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.armed_file):
+            armed = self._read_armed()
+            result = update(armed)
+            armed = {route: count for route, count in armed.items() if count > 0}
+            atomic_write_json(self.armed_file, armed)
+        self.armed = armed
+        return result
+
+    def arm(self, route: str, count: int):
+        def add(armed):
+            armed[route] = armed.get(route, 0) + count
+        self._update_armed(add)
+
+    def disarm(self, route: str):
+        self._update_armed(lambda armed: armed.pop(route, None))
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.REFRESH_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = self.armed_file.stat().st_mtime_ns
+        except OSError:
+            self.armed = {}
+            return
+        if mtime != self._armed_mtime:
+            self._armed_mtime = mtime
+            self.armed = self._read_armed()
+
+    async def claim(self, route: str) -> bool:
+        """True if this request should be profiled (one profile at a time per worker)"""
+        self._refresh()
+        if self.armed.get(route, 0) <= 0 or self._active:
+            return False
+
+        def take(armed):
+            if armed.get(route, 0) <= 0:
+                return False
+            armed[route] -= 1
+            return True
+
+        # Taken before the lock is, so concurrent requests here do not both claim
+        self._active = True
+        try:
+            # Another worker may have used up the remaining budget
+            claimed = await asyncio.to_thread(self._update_armed, take)
+        except BaseException:
+            self._active = False
+            raise
+        self._active = claimed
+        return claimed
+
+    async def profile(self, route: str, call):
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return await call()
+        finally:
+            profiler.disable()
+            self._active = False
+            name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{route.strip('/').replace('/', '_').replace('{', '').replace('}', '').replace(':', '_') or 'root'}"
+            await asyncio.to_thread(self._save, profiler, name, route, pstats)
+
+    def _save(self, profiler, name: str, route: str, pstats):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(self.output_dir / f"{name}.prof"))
+        report = io.StringIO()
+        report.write(f"Route: {route}\n\n")
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(40)
+        (self.output_dir / f"{name}.txt").write_text(report.getvalue(), encoding='utf-8')
+        logger.info(f"Saved profile {name} for {route}")
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        if not self.output_dir.exists():
+            return []
+        profiles = []
+        for report in sorted(self.output_dir.glob("*.txt"), reverse=True):
+            profiles.append({
+                "name": report.stem,
+                "size": report.with_suffix(".prof").stat().st_size if report.with_suffix(".prof").exists() else 0,
+                "createdAt": datetime.fromtimestamp(report.stat().st_mtime).isoformat(),
+            })
+        return profiles
@@ -0,0 +1,172 @@
+import os
+import asyncio
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional, Tuple
+import logging
+from .settings import Settings, get_settings
+from .llm_client import transcribe_audio, get_scheduler
+from .metrics import TRANSCRIPTIONS
+
+logger = logging.getLogger(__name__)
+
+# Local queue depth, per pool process, past which auto routing stops adding to it
+LOCAL_QUEUE_PER_WORKER = 2
+
+class TranscriptionBackend:
+    """Turns an audio file into text"""
+    name = ""
+
+    def available(self) -> bool:
+        raise NotImplementedError
+
+    async def transcribe(self, audio_path: Path) -> str:
+        raise NotImplementedError
+
+class RemoteTranscriber(TranscriptionBackend):
+    """The OpenAI transcription API, through the shared scheduler and transport"""
+    name = "remote"
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+
+    def available(self) -> bool:
+        return self.settings.use_real_api
+
+    def saturated(self) -> bool:
+        return get_scheduler().is_saturated(self.settings.transcribe_model)
+
+    async def transcribe(self, audio_path: Path) -> str:
+        with open(audio_path, "rb") as audio_file:
+            return await transcribe_audio(
+                "transcription",
+                model=self.settings.transcribe_model,
+                file=audio_file,
+                response_format="text"
+            )
+
+# Per pool process: the model is loaded once by the initializer and reused
+_local_model = None
+
+def _load_local_model(model_size: str, compute_type: str, cpu_threads: int):
+    global _local_model
+    from faster_whisper import WhisperModel
+    _local_model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+def _transcribe_local(audio_path: str) -> str:
+    segments, _ = _local_model.transcribe(audio_path, beam_size=1)
+    return " ".join(segment.text.strip() for segment in segments)
+
+class LocalTranscriber(TranscriptionBackend):
+    """faster-whisper on the CPU, in a pool of processes each holding a loaded model.
+
+    The pool starts on first use. Models are int8-quantized by default, and
+    the CPU threads are split between the pool processes. If the pool breaks
+    (the model fails to load, a process is killed), it is shut down and the
+    backend reports itself unavailable from then on.
+    """
+    name = "local"
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+        self.failed = False
+
+    def available(self) -> bool:
+        return not self.failed and importlib.util.find_spec("faster_whisper") is not None
+
+    def busy(self) -> bool:
+        return self.pending >= self.settings.local_transcribe_workers * LOCAL_QUEUE_PER_WORKER
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            workers = self.settings.local_transcribe_workers
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # Spawned, not forked: the server process has threads running
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_load_local_model,
+                initargs=(self.settings.local_transcribe_model, self.settings.local_transcribe_compute_type, threads))
+        return self._pool
+
+    async def transcribe(self, audio_path: Path) -> str:
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor(), _transcribe_local, str(audio_path))
+        except BrokenProcessPool:
+            logger.error("Local transcription pool failed (model load error or a worker died); disabling it")
+            self.failed = True
+            self.close()
+            raise
+        finally:
+            self.pending -= 1
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+class TranscriptionRouter:
+    """Chooses the transcription backend for each file.
+
+    TRANSCRIBE_BACKEND=remote or local pins one backend. With auto, local
+    takes files of up to LOCAL_TRANSCRIBE_MAX_SECONDS, and any file while
+    the API is saturated (paused after a 429, calls queued, or out of
+    per-minute capacity), as long as the local queue is not backed up;
+    everything else goes to the API. Each backend is the fallback when the
+    other is unavailable, and a file whose local transcription fails because
+    the pool broke is retried on the API.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None, remote: Optional[RemoteTranscriber] = None,
+                 local: Optional[LocalTranscriber] = None):
+        self.settings = settings or get_settings()
+        self.remote = remote or RemoteTranscriber(self.settings)
+        self.local = local or LocalTranscriber(self.settings)
+        self.mode = self.settings.transcribe_backend
+        self._local_available = self.mode != "remote" and self.local.available()
+        if self.mode != "remote" and not self._local_available:
+            logger.warning("faster-whisper is not installed; transcribing with the API only")
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any real backend can run; without one, callers use mock transcripts"""
+        return self.remote.available() or self._local_available
+
+    def choose(self, duration: Optional[float]) -> Tuple[TranscriptionBackend, str]:
+        """(backend, reason) for a file of `duration` seconds (None if unknown)"""
+        if not self._local_available:
+            return self.remote, "pinned" if self.mode == "remote" else "no_local"
+        if self.mode == "local":
+            return self.local, "pinned"
+        if not self.remote.available():
+            return self.local, "no_api"
+        if self.local.busy():
+            return self.remote, "local_busy"
+        if duration is not None and duration <= self.settings.local_transcribe_max_seconds:
+            return self.local, "short"
+        if self.remote.saturated():
+            return self.local, "api_saturated"
+        return self.remote, "long"
+
+    async def transcribe(self, audio_path: Path, duration: Optional[float] = None) -> str:
+        backend, reason = self.choose(duration)
+        TRANSCRIPTIONS.inc(backend=backend.name, reason=reason)
+        logger.info(f"Transcribing {audio_path.name} with the {backend.name} backend ({reason})")
+        try:
+            return await backend.transcribe(audio_path)
+        except BrokenProcessPool:
+            self._local_available = False
+            if backend is not self.local or not self.remote.available():
+                raise
+        TRANSCRIPTIONS.inc(backend=self.remote.name, reason="local_failed")
+        logger.info(f"Transcribing {audio_path.name} with the remote backend (local_failed)")
+        return await self.remote.transcribe(audio_path)
+
+    def close(self):
+        self.local.close()
@@ -1,17 +1,138 @@
-import json
-import os
+import re
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict
-from datetime import datetime
+from typing import Any, List, Dict, Optional, Tuple
+from datetime import date, datetime
 import logging
+from .settings import Settings, get_settings
+from .storage import atomic_write_json, read_json, read_text
+from .chunking import iter_chunks
+from .search_cache import IndexGeneration, SearchCache
 
 logger = logging.getLogger(__name__)
 
+INDEX_VERSION = 2
+EXCERPT_CHARS = 200
+SNIPPET_CHARS = 240
+FILE_TYPES = ("pdf", "video", "audio")
+# Index change counter; outside vector-search/, which a rebuild replaces
+GENERATION_FILE = "vector-search.generation"
+
+def index_file_name(source: str) -> str:
+    """Index entry file for a document path relative to the storage root"""
+    return source.replace('/', '_').replace('\\', '_') + ".json"
+
+def index_entry(source: str, title: str, text: str, max_tokens: int, overlap_tokens: int) -> Dict:
+    """Index entry for a document: its title and chunk offsets, not its text"""
+    return {
+        "version": INDEX_VERSION,
+        "source": source,
+        "title": title,
+        "textLength": len(text),
+        "chunks": list(iter_chunks(text, max_tokens, overlap_tokens)),
+        "chunking": {"maxTokens": max_tokens, "overlapTokens": overlap_tokens},
+        "timestamp": str(datetime.now())
+    }
+
+def normalize_query(query: str) -> str:
+    """Lowercase, single-spaced and without surrounding punctuation; equal for equivalent queries"""
+    return " ".join(query.lower().split()).strip(" ?!.,;:\"'")
+
+def query_terms(query: str) -> List[str]:
+    """Distinct lowercase words of a query, ignoring one- and two-letter words"""
+    return list(dict.fromkeys(word for word in re.findall(r"\w+", query.lower()) if len(word) > 2))
+
+def document_facets(source: str) -> Tuple[Optional[str], Optional[date]]:
+    """File type and processing date of a document, from its processed/<type>/<Y>/<m>/<d>/ path"""
+    parts = source.split('/')
+    if len(parts) < 6 or parts[0] != "processed":
+        return None, None
+    try:
+        return parts[1], date(int(parts[2]), int(parts[3]), int(parts[4]))
+    except ValueError:
+        return parts[1], None
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """Restrictions on which documents a search covers; empty fields match everything"""
+    file_types: Tuple[str, ...] = ()
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    sources: Tuple[str, ...] = ()
+
+    def matches(self, source: str) -> bool:
+        if self.sources and source not in self.sources:
+            return False
+        file_type, processed = document_facets(source)
+        if self.file_types and file_type not in self.file_types:
+            return False
+        if self.date_from or self.date_to:
+            if processed is None:
+                return False
+            if (self.date_from and processed < self.date_from) or (self.date_to and processed > self.date_to):
+                return False
+        return True
+
+def make_snippet(chunk: str, chunk_start: int, phrase: str, terms: List[str],
+                 width: int = SNIPPET_CHARS) -> Dict[str, Any]:
+    """The passage of a chunk around its densest run of matches.
+
+    Returns the snippet text, its (start, end) in the document and the
+    (start, end) of each match within the snippet, for highlighting.
+    """
+    needles = sorted({phrase, *terms}, key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(needle) for needle in needles if needle), re.IGNORECASE)
+    matches = [(m.start(), m.end(), m.group().lower()) for m in pattern.finditer(chunk)][:200]
+
+    # Window start: the match with the most distinct terms within `width` after it
+    anchor, best = 0, 0
+    for i, (start, _, _) in enumerate(matches):
+        distinct = len({text for s, e, text in matches[i:] if e <= start + width})
+        if distinct > best:
+            anchor, best = start, distinct
+    start = max(0, anchor - width // 4)
+    if start > 0:
+        space = chunk.find(" ", start, anchor)
+        start = space + 1 if space != -1 else start
+    end = min(len(chunk), start + width)
+    if end < len(chunk):
+        space = chunk.rfind(" ", max(start, anchor), end)
+        end = space if space != -1 else end
+
+    return {
+        "snippet": chunk[start:end],
+        "snippetRange": [chunk_start + start, chunk_start + end],
+        "highlights": [[s - start, e - start] for s, e, _ in matches if s >= start and e <= end],
+    }
+
 class VectorSearchService:
-    def __init__(self):
-        self.storage_root = Path("../storage")
+    """File-based search index over the processed documents.
+
+    Each document has one entry in storage/vector-search/ holding the
+    (start, end) offsets of its chunks in the processed .txt file; the
+    text itself is read from that file when searching, never copied into
+    the index.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.storage_root = self.settings.storage_root
         self.vector_dir = self.storage_root / "vector-search"
         self.processed_dir = self.storage_root / "processed"
+        self.vector_dir.mkdir(parents=True, exist_ok=True)
+        self.generation = IndexGeneration(self.storage_root / GENERATION_FILE)
+        self.cache = SearchCache(int(self.settings.search_cache_mb * 1024 * 1024))
+    
+    def _source(self, content_path: str) -> str:
+        """Document path relative to the storage root, the form stored in the index"""
+        path = Path(content_path)
+        try:
+            return path.relative_to(self.storage_root).as_posix()
+        except ValueError:
+            return path.as_posix()
+    
+    def _vector_file(self, content_path: str) -> Path:
+        return self.vector_dir / index_file_name(self._source(content_path))
         
     def add_content(self, content_path: str, content: str, title: str):
         """Add content to vector search index"""
@@ -20,52 +141,106 @@ class VectorSearchService:
             # In a real implementation, you would use a vector database like ChromaDB
             
             # Create content entry
-            content_entry = {
-                "path": content_path,
-                "title": title,
-                "content": content,
-                "chunks": self._chunk_content(content),
-                "timestamp": str(datetime.now())
-            }
-            
-            # Save to file
-            content_id = content_path.replace('/', '_').replace('\\', '_')
-            vector_file = self.vector_dir / f"{content_id}.json"
+            content_entry = index_entry(self._source(content_path), title, content,
+                                        self.settings.chunk_max_tokens, self.settings.chunk_overlap_tokens)
             
-            with open(vector_file, 'w', encoding='utf-8') as f:
-                json.dump(content_entry, f, indent=2)
+            # Atomic so searches in other workers never read a partial file
+            atomic_write_json(self._vector_file(content_path), content_entry)
+            self.generation.bump()
             
             logger.info(f"Added content to vector index: {title}")
             
         except Exception as e:
             logger.error(f"Error adding content to vector index: {e}")
     
+    def _entry_chunks(self, content_entry: Dict) -> List[Tuple[str, Tuple[int, int]]]:
+        """(text, offsets) of an entry's chunks, read from its document"""
+        if content_entry.get("version") != INDEX_VERSION:
+            # Entries from before offsets carried their text inline
+            content = content_entry.get("content", "")
+            return [(content, (0, len(content)))] if content else []
+        text = read_text(self.storage_root / content_entry["source"])
+        if len(text) != content_entry["textLength"]:
+            logger.warning(f"Index entry for {content_entry['source']} is stale; rebuild the search index")
+            return []
+        return [(text[start:end], (start, end)) for start, end in content_entry["chunks"]]
+    
+    def search(self, query: str, filters: Optional[SearchFilters] = None, offset: int = 0,
+               limit: Optional[int] = 20) -> Tuple[List[Dict], int]:
+        """Best-matching chunk of each document, highest score first, and the number of matching documents.
+
+        A chunk scores the share of the query's words it contains, or 1.0
+        if it contains the whole query. Hits on the requested page carry a
+        snippet cut from their chunk with the matches marked. Results are
+        cached until the index next changes.
+        """
+        phrase = normalize_query(query)
+        if not phrase:
+            return [], 0
+        key = (phrase, filters, offset, limit)
+        generation = self.generation.current()
+        cached = self.cache.get(key, generation)
+        if cached is None:
+            cached = self._search(phrase, filters, offset, limit)
+            self.cache.put(key, generation, *cached)
+        hits, total = cached
+        # Callers may annotate their hits; the cached ones stay as they are
+        return [dict(hit) for hit in hits], total
+    
+    def _search(self, phrase: str, filters: Optional[SearchFilters], offset: int,
+                limit: Optional[int]) -> Tuple[List[Dict], int]:
+        terms = query_terms(phrase) or [phrase]
+        
+        hits = []
+        for vector_file in self.vector_dir.glob("*.json"):
+            try:
+                content_entry = read_json(vector_file)
+                source = content_entry.get('source', "")
+                if filters and not filters.matches(source):
+                    continue
+                best, matching = None, 0
+                for chunk, offsets in self._entry_chunks(content_entry):
+                    lowered = chunk.lower()
+                    score = 1.0 if phrase in lowered else sum(term in lowered for term in terms) / len(terms)
+                    if score > 0:
+                        matching += 1
+                        if best is None or score > best[0]:
+                            best = (score, chunk, offsets)
+                if best:
+                    score, chunk, offsets = best
+                    file_type, processed = document_facets(source)
+                    hits.append({
+                        "title": content_entry['title'],
+                        "source": source,
+                        "fileType": file_type,
+                        "date": processed.isoformat() if processed else None,
+                        "content": chunk,
+                        "range": list(offsets),
+                        "matchingChunks": matching,
+                        "score": round(score, 3)
+                    })
+                    
+            except FileNotFoundError:
+                logger.warning(f"Skipping index entry {vector_file.name}: its document is gone")
+            except Exception as e:
+                logger.error(f"Error reading vector file {vector_file}: {e}")
+                continue
+        
+        hits.sort(key=lambda hit: (-hit["score"], hit["title"]))
+        end = None if limit is None else offset + limit
+        page = hits[offset:end]
+        for hit in page:
+            hit.update(make_snippet(hit["content"], hit["range"][0], phrase, terms))
+        return page, len(hits)
+    
     def search_content(self, query: str, limit: int = 5) -> List[Dict]:
-        """Search content using vector similarity"""
+        """Best-matching chunk of each document, for the chatbot's context"""
         try:
-            results = []
-            
-            # Simple text-based search for now
-            # In a real implementation, you would use vector embeddings
-            
-            for vector_file in self.vector_dir.glob("*.json"):
-                try:
-                    with open(vector_file, 'r', encoding='utf-8') as f:
-                        content_entry = json.load(f)
-                    
-                    # Simple keyword matching
-                    if query.lower() in content_entry['content'].lower():
-                        results.append({
-                            "title": content_entry['title'],
-                            "excerpt": content_entry['content'][:200] + "...",
-                            "score": 0.8
-                        })
-                        
-                except Exception as e:
-                    logger.error(f"Error reading vector file {vector_file}: {e}")
-                    continue
-            
-            return results[:limit]
+            results, _ = self.search(query, limit=limit)
+            for result in results:
+                snippet = result["snippet"]
+                result["excerpt"] = snippet[:EXCERPT_CHARS] + ("..." if len(snippet) > EXCERPT_CHARS else "")
+            return results
             
         except Exception as e:
             logger.error(f"Error searching content: {e}")
@@ -74,23 +249,12 @@ class VectorSearchService:
     def delete_content(self, content_path: str):
         """Delete content from vector index"""
         try:
-            content_id = content_path.replace('/', '_').replace('\\', '_')
-            vector_file = self.vector_dir / f"{content_id}.json"
+            vector_file = self._vector_file(content_path)
             
             if vector_file.exists():
                 vector_file.unlink()
+                self.generation.bump()
                 logger.info(f"Deleted content from vector index: {content_path}")
                 
         except Exception as e:
             logger.error(f"Error deleting content from vector index: {e}")
-    
-    def _chunk_content(self, content: str, chunk_size: int = 500) -> List[str]:
-        """Split content into chunks for vector search"""
-        words = content.split()
-        chunks = []
-        
-        for i in range(0, len(words), chunk_size):
-            chunk = ' '.join(words[i:i + chunk_size])
-            chunks.append(chunk)
-        
-        return chunks
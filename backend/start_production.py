@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+EduAssist FastAPI Backend Production Launcher
+
+Runs several uvicorn worker processes (one per core by default) with
+uvloop/httptools, no reloader, and a graceful shutdown that lets in-flight
+requests finish before a worker exits.
+
+Environment overrides:
+    WEB_CONCURRENCY            number of worker processes (default: CPU cores)
+    HOST / PORT                bind address (default: 0.0.0.0:8000)
+    GRACEFUL_SHUTDOWN_TIMEOUT  seconds to drain in-flight requests (default: 30)
+"""
+
+import importlib.util
+import uvicorn
+import sys
+import os
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.resolve()
+sys.path.insert(0, str(backend_dir))
+
+def available_cores() -> int:
+    """Cores this process may run on (respects CPU affinity / container limits)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def pick_implementation(preferred: str, fallback: str) -> str:
+    """Use the fast implementation when installed (uvloop is not available on Windows)"""
+    return preferred if importlib.util.find_spec(preferred) else fallback
+
+if __name__ == "__main__":
+    # Storage paths are relative to the backend directory
+    os.chdir(backend_dir)
+
+    workers = int(os.getenv("WEB_CONCURRENCY", available_cores()))
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+    graceful_timeout = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+    loop = pick_implementation("uvloop", "asyncio")
+    http = pick_implementation("httptools", "h11")
+
+    # Workers inherit this so per-process limits can be divided between them
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    print("🚀 Starting EduAssist FastAPI Backend (production)...")
+    print(f"👷 Workers: {workers} | loop: {loop} | http: {http}")
+    print(f"🛑 Graceful shutdown timeout: {graceful_timeout}s")
+    print(f"🌐 Listening on http://{host}:{port}")
+    print("=" * 50)
+
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        reload=False,
+        backlog=2048,
+        timeout_keep_alive=5,
+        timeout_graceful_shutdown=graceful_timeout,
+        access_log=False,
+        log_level="info"
+    )
@@ -0,0 +1,51 @@
+import re
+
+from services.chunking import CHARS_PER_TOKEN, iter_chunks, iter_sentences
+
+TEXT = (
+    "Photosynthesis turns light into chemical energy. It happens in the chloroplasts! "
+    "Why does it matter? Because nearly all food chains start with it.\n\n"
+    "The light reactions split water and release oxygen. The Calvin cycle then fixes carbon "
+    "dioxide into sugars (glucose, mostly.) Plants store the surplus as starch.\n\n"
+    + "A sentence about cellular respiration and ATP synthase in the mitochondria. " * 40
+    + "\n\n" + "averyveryverylongwordwithoutanyspaces " * 60
+)
+
+def test_sentence_offsets_round_trip_to_the_text():
+    sentences = list(iter_sentences(TEXT))
+    for start, end, _ in sentences:
+        piece = TEXT[start:end]
+        assert piece and piece == piece.strip()
+    # Between sentences there is only the boundary: whitespace after the punctuation
+    for (_, end, _), (start, _, _) in zip(sentences, sentences[1:]):
+        assert re.fullmatch(r"[\"')\]]*\s+", TEXT[end:start])
+    assert sentences[-1][1] == len(TEXT.rstrip())
+
+def test_chunk_offsets_cover_the_text_in_order_and_within_budget():
+    max_tokens, overlap_tokens = 64, 16
+    chunks = list(iter_chunks(TEXT, max_tokens, overlap_tokens))
+    assert len(chunks) > 1
+    for start, end in chunks:
+        piece = TEXT[start:end]
+        assert piece == piece.strip()
+        assert len(piece) <= max_tokens * CHARS_PER_TOKEN
+    assert [start for start, _ in chunks] == sorted(start for start, _ in chunks)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(TEXT.rstrip())
+    # No gaps: every sentence lies inside some chunk
+    for start, end, _ in iter_sentences(TEXT):
+        assert any(chunk_start <= start and end <= chunk_end or chunk_start < end and start < chunk_end
+                   for chunk_start, chunk_end in chunks)
+    # Consecutive chunks overlap by at most the overlap budget
+    for (_, previous_end), (start, _) in zip(chunks, chunks[1:]):
+        assert previous_end - start <= overlap_tokens * CHARS_PER_TOKEN
+
+def test_chunks_without_overlap_do_not_overlap():
+    chunks = list(iter_chunks(TEXT, 64, 0))
+    for (_, previous_end), (start, _) in zip(chunks, chunks[1:]):
+        assert previous_end <= start
+
+def test_short_and_empty_text():
+    assert list(iter_chunks("One short sentence.")) == [(0, 19)]
+    assert list(iter_chunks("")) == []
+    assert list(iter_chunks("   \n\n  ")) == []
+    assert list(iter_sentences("  Leading and trailing space.  ")) == [(2, 29, True)]
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from services.chunking import CHARS_PER_TOKEN, iter_sentences
+from services.extractive import MIN_SENTENCE_CHARS, condense, rank_sentences
+
+TOPICS = [
+    "Photosynthesis in the chloroplast converts light energy into chemical energy stored in glucose.",
+    "The light reactions of photosynthesis split water and release oxygen from the chloroplast.",
+    "The Calvin cycle uses the energy from the light reactions to fix carbon dioxide into glucose.",
+    "Chlorophyll absorbs red and blue light most strongly during photosynthesis.",
+    "The French Revolution began in 1789 with the storming of the Bastille.",
+    "Medieval castles were often built on hills to make them easier to defend.",
+    "Volcanoes form where magma rises through weak points in the crust.",
+]
+
+def document(sentences=300, seed=1):
+    rng = random.Random(seed)
+    paragraphs, current = [], []
+    for number in range(sentences):
+        current.append(f"{rng.choice(TOPICS)[:-1]}, as note {number} explains.")
+        if len(current) == 6:
+            paragraphs.append(" ".join(current))
+            current = []
+    return "\n\n".join(paragraphs + [" ".join(current)])
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_tokens", [20, 50, 93, 200, 1000])
+def test_condense_stays_within_budget(max_tokens, seed):
+    text = document(seed=seed)
+    extract = condense(text, max_tokens)
+    assert len(extract) <= max_tokens * CHARS_PER_TOKEN
+    assert len(extract) >= MIN_SENTENCE_CHARS
+
+def test_condense_keeps_original_sentence_order():
+    text = document()
+    extract = condense(text, 300)
+    positions = []
+    for part in extract.split("\n\n"):
+        for start, end, _ in iter_sentences(part):
+            positions.append(text.index(part[start:end]))
+    assert len(positions) > 1
+    assert positions == sorted(positions)
+
+def test_condense_returns_text_that_fits_unchanged():
+    text = "A short document about photosynthesis. It fits in the budget."
+    assert condense(text, 1000) == text
+
+def test_rank_sentences_prefers_central_sentences():
+    sentences = TOPICS[:4] * 2 + TOPICS[4:]
+    scores = rank_sentences(sentences)
+    assert scores.shape == (len(sentences),)
+    # The photosynthesis sentences share vocabulary; the unrelated ones share none
+    assert min(scores[:8]) > max(scores[8:])
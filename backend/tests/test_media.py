@@ -0,0 +1,80 @@
+import sys
+
+import numpy as np
+import pytest
+
+from services.media import AUDIO_SAMPLE_RATE, VAD_PADDING_SECONDS, TimeMap, speech_segments
+
+RATE = AUDIO_SAMPLE_RATE
+
+def tone(seconds):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+
+def silence(seconds):
+    rng = np.random.default_rng(0)
+    return rng.integers(-3, 4, int(seconds * RATE)).astype(np.int16)
+
+def build_time_map(segments, total_samples):
+    # As AudioExtractor._condition does
+    entries, position = [], 0
+    for start, end in segments:
+        entries.append((position / RATE, start / RATE, (end - start) / RATE))
+        position += end - start
+    return TimeMap(entries, total_samples / RATE)
+
+def test_long_silences_are_cut_and_short_pauses_kept():
+    samples = np.concatenate([tone(2), silence(3), tone(2), silence(0.5), tone(1)])
+    segments = speech_segments(samples, min_silence=1.0)
+    assert len(segments) == 2
+    (first_start, first_end), (second_start, second_end) = segments
+    assert first_start == 0
+    # Speech ends at 2 s and resumes at 5 s; each side keeps about the padding
+    assert first_end / RATE == pytest.approx(2 + VAD_PADDING_SECONDS, abs=0.05)
+    assert second_start / RATE == pytest.approx(5 - VAD_PADDING_SECONDS, abs=0.05)
+    assert second_end == len(samples)
+
+def test_silent_and_empty_recordings():
+    assert speech_segments(silence(5), min_silence=1.0) == []
+    assert speech_segments(np.zeros(0, dtype=np.int16), min_silence=1.0) == []
+    assert speech_segments(tone(0.01), min_silence=1.0) == [(0, int(0.01 * RATE))]
+
+def test_time_map_maps_trimmed_times_back_to_the_recording():
+    samples = np.concatenate([tone(2), silence(3), tone(2), silence(0.5), tone(1)])
+    segments = speech_segments(samples, min_silence=1.0)
+    time_map = build_time_map(segments, len(samples))
+    (_, first_end), (second_start, _) = segments
+
+    assert time_map.original_seconds == pytest.approx(8.5)
+    assert time_map.kept_seconds == pytest.approx(8.5 - (second_start - first_end) / RATE)
+    assert time_map.to_original(0.0) == 0.0
+    assert time_map.to_original(1.0) == pytest.approx(1.0)
+    # Just past the cut, the original time jumps over the removed silence
+    boundary = first_end / RATE
+    assert time_map.to_original(boundary + 0.5) == pytest.approx(second_start / RATE + 0.5)
+    # Past the end, it is clamped to the end of the recording
+    assert time_map.to_original(1000.0) == pytest.approx(len(samples) / RATE)
+
+def test_time_map_round_trips_through_dict():
+    time_map = TimeMap([(0.0, 0.0, 2.25), (2.25, 4.75, 3.75)], 8.5)
+    restored = TimeMap.from_dict(time_map.to_dict())
+    assert restored.to_original(3.0) == time_map.to_original(3.0) == pytest.approx(5.5)
+    assert TimeMap([], 10.0).to_original(4.0) == 4.0
+
+def test_streamed_encoder_input_is_the_kept_stretches(tmp_path):
+    from services.media import AudioExtractor
+    from services.settings import get_settings
+
+    samples = tone(1)
+    segments = [(0, 100), (4000, 9000), (12000, len(samples))]
+    output = tmp_path / "stdin.raw"
+    copy_stdin = f"import sys; open({str(output)!r}, 'wb').write(sys.stdin.buffer.read())"
+    extractor = AudioExtractor(get_settings())
+    extractor._run_streamed([sys.executable, "-c", copy_stdin], tmp_path / "lecture.mp4",
+                            (memoryview(samples[start:end]) for start, end in segments))
+    expected = np.concatenate([samples[start:end] for start, end in segments])
+    assert np.array_equal(np.fromfile(output, dtype=np.int16), expected)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        extractor._run_streamed([sys.executable, "-c", "import sys; sys.exit('boom')"], tmp_path / "lecture.mp4",
+                                (memoryview(samples) for _ in range(20)))
@@ -0,0 +1,109 @@
+import asyncio
+import dataclasses
+import hashlib
+import os
+import threading
+
+import pytest
+
+from services.resumable_uploads import ResumableUploads, UploadConflict, UploadNotFound
+from services.settings import get_settings
+
+CHUNK = 1024 * 1024
+
+@pytest.fixture
+def uploads(tmp_path):
+    settings = dataclasses.replace(get_settings(), storage_root=tmp_path, upload_chunk_mb=1, storage_fsync=False)
+    return ResumableUploads(settings)
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def start(uploads, data):
+    upload_id = uploads.create("lecture.mp3", len(data))["uploadId"]
+    chunks = [data[offset:offset + CHUNK] for offset in range(0, len(data), CHUNK)]
+    return upload_id, chunks
+
+def test_chunks_in_any_order_assemble_the_file(uploads):
+    data = os.urandom(2 * CHUNK + 123)
+    upload_id, chunks = start(uploads, data)
+    for index in (2, 0):
+        status = uploads.write_chunk(upload_id, index, chunks[index], sha256(chunks[index]))
+    assert status["missing"] == [1] and status["committedOffset"] == CHUNK
+    with pytest.raises(UploadConflict):
+        uploads.finalize(upload_id)
+
+    uploads.write_chunk(upload_id, 1, chunks[1], sha256(chunks[1]))
+    file_path, metadata = uploads.finalize(upload_id)
+    assert file_path.read_bytes() == data
+    assert metadata["originalName"] == "lecture.mp3" and metadata["fileType"] == "audio"
+
+def test_chunks_must_match_their_hash_and_length(uploads):
+    upload_id, chunks = start(uploads, os.urandom(CHUNK + 10))
+    with pytest.raises(ValueError):
+        uploads.write_chunk(upload_id, 0, chunks[0], "0" * 64)
+    with pytest.raises(ValueError):
+        uploads.write_chunk(upload_id, 1, chunks[1] + b"x", sha256(chunks[1] + b"x"))
+    assert uploads.status(upload_id)["received"] == 0
+
+def test_unknown_and_malformed_ids(uploads):
+    with pytest.raises(UploadNotFound):
+        uploads.status("../../etc")
+    with pytest.raises(UploadNotFound):
+        uploads.status("6c026fc0-de45-4b0f-9fb1-c4d52c5a9088")
+
+def test_chunk_writes_racing_finalize_are_refused_not_failed(uploads):
+    data = os.urandom(3 * CHUNK)
+    upload_id, chunks = start(uploads, data)
+    for index, chunk in enumerate(chunks):
+        uploads.write_chunk(upload_id, index, chunk, sha256(chunk))
+
+    errors = []
+
+    def resend():
+        for _ in range(20):
+            try:
+                uploads.write_chunk(upload_id, 0, chunks[0], sha256(chunks[0]))
+            except UploadConflict:
+                pass
+            except Exception as e:  # anything else is the race this guards against
+                errors.append(e)
+
+    threads = [threading.Thread(target=resend) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    file_path, _ = uploads.finalize(upload_id)
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert file_path.read_bytes() == data
+    with pytest.raises(UploadConflict):
+        uploads.write_chunk(upload_id, 0, chunks[0], sha256(chunks[0]))
+
+def test_finalize_resumes_an_upload_whose_processing_was_interrupted(uploads):
+    data = os.urandom(CHUNK + 5)
+    upload_id, chunks = start(uploads, data)
+    for index, chunk in enumerate(chunks):
+        uploads.write_chunk(upload_id, index, chunk, sha256(chunk))
+    file_path, metadata = uploads.finalize(upload_id)
+    # The worker died here, before complete(): the session is left in processing
+    assert uploads.status(upload_id)["status"] == "processing"
+    assert uploads.finalize(upload_id) == (file_path, metadata)
+
+    uploads.complete(upload_id, {"status": "processed"})
+    assert uploads.status(upload_id)["result"] == {"status": "processed"}
+    with pytest.raises(UploadConflict):
+        uploads.finalize(upload_id)
+
+def test_only_one_request_at_a_time_claims_an_upload(uploads):
+    upload_id, _ = start(uploads, os.urandom(10))
+
+    async def scenario():
+        async with uploads.claim(upload_id):
+            with pytest.raises(UploadConflict):
+                async with uploads.claim(upload_id):
+                    pass
+        async with uploads.claim(upload_id):
+            pass
+
+    asyncio.run(scenario())
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "loadtest"))
+
+from run_load import percentile  # noqa: E402
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 1.0) == 100
+    assert percentile(values, 0.0) == 1
+    assert percentile(list(range(1, 21)), 0.95) == 19
+    assert percentile([7.0], 0.99) == 7.0
+    assert percentile([], 0.5) == 0.0
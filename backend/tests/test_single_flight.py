@@ -0,0 +1,57 @@
+import asyncio
+import dataclasses
+
+import pytest
+
+from services.settings import get_settings
+from services.single_flight import SingleFlight
+
+@pytest.fixture
+def settings(tmp_path):
+    return dataclasses.replace(get_settings(), storage_root=tmp_path)
+
+def counting_work(calls, seconds=0.3):
+    async def work():
+        calls.append(None)
+        await asyncio.sleep(seconds)
+        return len(calls)
+    return work
+
+def test_concurrent_requests_in_two_workers_share_one_result(settings):
+    calls = []
+
+    async def scenario():
+        # Two instances stand in for two worker processes sharing storage
+        first, second = SingleFlight(settings), SingleFlight(settings)
+        work = counting_work(calls)
+        return await asyncio.gather(first.run("quiz-a", work), second.run("quiz-a", work))
+
+    assert asyncio.run(scenario()) == [1, 1]
+
+def test_back_to_back_requests_generate_anew(settings):
+    calls = []
+
+    async def scenario():
+        first, second = SingleFlight(settings), SingleFlight(settings)
+        work = counting_work(calls, 0.01)
+        return [await first.run("quiz-a", work), await second.run("quiz-a", work)]
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+def test_cancelled_follower_leaves_the_key_usable(settings):
+    calls = []
+
+    async def scenario():
+        leader, follower = SingleFlight(settings), SingleFlight(settings)
+        work = counting_work(calls)
+        leading = asyncio.create_task(leader.run("quiz-a", work))
+        await asyncio.sleep(0.05)
+        following = asyncio.create_task(follower.run("quiz-a", work))
+        await asyncio.sleep(0.05)
+        following.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await following
+        assert await leading == 1
+        return await asyncio.wait_for(follower.run("quiz-a", counting_work(calls, 0.01)), timeout=2)
+
+    assert asyncio.run(scenario()) == 2
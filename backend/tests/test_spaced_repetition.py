@@ -0,0 +1,65 @@
+import pytest
+
+from services.spaced_repetition import DAY, RELEARN_SECONDS, StudentCards, parse_grade, sm2
+
+NOW = 1_700_000_000
+
+def test_sm2_intervals_grow_with_successful_reviews():
+    state = sm2(None, 4, NOW)
+    assert state == [NOW + DAY, 1.0, 2.5, 1, 0]
+    state = sm2(state, 4, NOW)
+    assert state[1] == 6.0 and state[0] == NOW + 6 * DAY
+    state = sm2(state, 4, NOW)
+    assert state[1] == 15.0 and state[3] == 3
+
+def test_sm2_lapse_resets_repetitions_and_lowers_ease():
+    state = sm2(sm2(None, 5, NOW), 1, NOW)
+    due, interval, ease, reps, lapses = state
+    assert due == NOW + RELEARN_SECONDS
+    assert (interval, reps, lapses) == (0.0, 0, 1)
+    assert ease < 2.6
+
+def test_sm2_ease_never_drops_below_floor():
+    state = None
+    for _ in range(20):
+        state = sm2(state, 0, NOW)
+    assert state[2] == 1.3
+
+def test_parse_grade():
+    assert parse_grade("Good") == 4
+    assert parse_grade("again") == 1
+    assert parse_grade(3) == 3
+    with pytest.raises(ValueError):
+        parse_grade(6)
+
+def test_due_skips_stale_heap_entries():
+    cards = StudentCards()
+    cards.set("doc#qa#a", [100, 0.0, 2.5, 0, 0])
+    cards.set("doc#qa#a", [500, 1.0, 2.5, 1, 0])  # rescheduled: the entry due at 100 is stale
+    assert cards.due(200, 10) == []
+    assert cards.due(600, 10) == ["doc#qa#a"]
+
+def test_due_orders_by_due_date_and_respects_limit_and_document():
+    cards = StudentCards()
+    cards.set("a#qa#1", [300, 0.0, 2.5, 0, 0])
+    cards.set("b#qa#2", [100, 0.0, 2.5, 0, 0])
+    cards.set("a#qa#3", [200, 0.0, 2.5, 0, 0])
+    cards.set("a#qa#4", [900, 0.0, 2.5, 0, 0])
+    assert cards.due(400, 10) == ["b#qa#2", "a#qa#3", "a#qa#1"]
+    assert cards.due(400, 2) == ["b#qa#2", "a#qa#3"]
+    assert cards.due(400, 10, document="a") == ["a#qa#3", "a#qa#1"]
+    # Looking does not consume: the same cards are due again
+    assert cards.due(400, 10) == ["b#qa#2", "a#qa#3", "a#qa#1"]
+
+def test_due_ignores_forgotten_cards():
+    cards = StudentCards()
+    cards.set("a#qa#1", [100, 0.0, 2.5, 0, 0])
+    cards.forget("a#qa#1")
+    assert cards.due(200, 10) == []
+
+def test_heaps_are_rebuilt_when_stale_entries_pile_up():
+    cards = StudentCards()
+    for step in range(500):
+        cards.set("a#qa#1", [step, 0.0, 2.5, 0, 0])
+    assert len(cards.heaps[""]) <= 2 * len(cards.cards) + 64 + 1
+    assert cards.due(1000, 10) == ["a#qa#1"]
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from services.storage import async_file_lock, file_lock
+
+async def take(path, errors=None):
+    try:
+        async with async_file_lock(path):
+            pass
+    except asyncio.CancelledError as e:
+        if errors is not None:
+            # Kept like a logged error would be: its traceback holds the frames alive
+            errors.append(e)
+        raise
+
+def test_cancelled_waiter_does_not_keep_the_lock(tmp_path):
+    path = tmp_path / "session"
+    errors = []
+
+    async def scenario():
+        async with async_file_lock(path):
+            waiter = asyncio.create_task(take(path, errors))
+            await asyncio.sleep(0.1)  # blocked in its thread on the held lock
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        # The abandoned acquire completes once the holder leaves; it must let go again
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            try:
+                with file_lock(path, blocking=False):
+                    return
+            except BlockingIOError:
+                continue
+        pytest.fail("the lock is still held after its waiter was cancelled")
+
+    asyncio.run(scenario())
+
+def test_non_blocking_lock_reports_a_held_lock(tmp_path):
+    path = tmp_path / "key"
+
+    async def scenario():
+        async with async_file_lock(path):
+            with pytest.raises(BlockingIOError):
+                async with async_file_lock(path, blocking=False):
+                    pass
+        async with async_file_lock(path, blocking=False):
+            pass
+
+    asyncio.run(scenario())
+
+def test_file_lock_is_exclusive_and_released(tmp_path):
+    path = tmp_path / "data.json"
+    with file_lock(path):
+        with pytest.raises(BlockingIOError):
+            with file_lock(path, blocking=False):
+                pass
+    with file_lock(path, blocking=False):
+        pass
@@ -41,6 +41,11 @@ function initializeUploadFunctionality() {
 
     let uploadQueue = [];
 
+    // Files this large go up as resumable uploads, in hashed chunks sent several at a time
+    const RESUMABLE_THRESHOLD = 32 * 1024 * 1024;
+    const PARALLEL_CHUNKS = 4;
+    const CHUNK_RETRIES = 5;
+
     // Drag and drop events
     ['dragenter', 'dragover'].forEach(eventName => {
         dropzone.addEventListener(eventName, handleDragOver);
@@ -156,27 +161,46 @@ function initializeUploadFunctionality() {
         uploadBtn.innerHTML = '<span class="spinner"></span>Uploading...';
         
         try {
-            const formData = new FormData();
-            uploadQueue.forEach(fileInfo => {
-                formData.append('files', fileInfo.file);
-            });
+            // Hashing chunks needs a secure context (https or localhost)
+            const resumable = fileInfo => fileInfo.size >= RESUMABLE_THRESHOLD && window.crypto && crypto.subtle;
+            const small = uploadQueue.filter(fileInfo => !resumable(fileInfo));
+            const large = uploadQueue.filter(resumable);
+            const processed = new Map();
+            let success = true;
             
-            const response = await fetch('http://localhost:8000/api/upload', {
-                method: 'POST',
-                body: formData
-            });
+            if (small.length > 0) {
+                const formData = new FormData();
+                small.forEach(fileInfo => {
+                    formData.append('files', fileInfo.file);
+                });
+                
+                const response = await fetch('http://localhost:8000/api/upload', {
+                    method: 'POST',
+                    body: formData
+                });
+                
+                const result = await response.json();
+                success = Boolean(result.success);
+                if (success) {
+                    result.files.forEach((file, index) => {
+                        if (small[index]) {
+                            processed.set(small[index].id, file.processed);
+                        }
+                    });
+                }
+            }
             
-            const result = await response.json();
+            for (const fileInfo of large) {
+                processed.set(fileInfo.id, await uploadResumable(fileInfo));
+            }
             
-            if (result.success) {
-                showMessage(`Successfully uploaded ${result.count} files!`, 'success');
+            if (success) {
+                const count = [...processed.values()].filter(Boolean).length;
+                showMessage(`Successfully uploaded ${count} files!`, 'success');
                 
                 // Update file statuses
-                result.files.forEach((file, index) => {
-                    const fileInfo = uploadQueue[index];
-                    if (fileInfo) {
-                        updateFileStatus(fileInfo.id, file.processed ? 'Completed' : 'Failed');
-                    }
+                uploadQueue.forEach(fileInfo => {
+                    updateFileStatus(fileInfo.id, processed.get(fileInfo.id) ? 'Completed' : 'Failed');
                 });
                 
                 uploadQueue = [];
@@ -200,6 +224,100 @@ function initializeUploadFunctionality() {
         }
     }
 
+    // Resumable upload: a dropped chunk is retried on its own, and picking the same
+    // file again after a failure (or a reload) sends only the chunks still missing
+    async function uploadResumable(fileInfo) {
+        const api = 'http://localhost:8000/api/uploads';
+        const resumeKey = `upload:${fileInfo.name}:${fileInfo.size}:${fileInfo.file.lastModified}`;
+        
+        try {
+            let session = null;
+            const savedId = localStorage.getItem(resumeKey);
+            if (savedId) {
+                const response = await fetch(`${api}/${savedId}`);
+                if (response.ok) {
+                    session = await response.json();
+                }
+            }
+            if (!session || session.status !== 'uploading') {
+                const response = await fetch(api, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ filename: fileInfo.name, size: fileInfo.size })
+                });
+                if (!response.ok) {
+                    return false;
+                }
+                session = await response.json();
+                localStorage.setItem(resumeKey, session.uploadId);
+            }
+            
+            const missing = [...session.missing];
+            let sent = session.chunks - missing.length;
+            updateFileStatus(fileInfo.id, 'Uploading', Math.round(100 * sent / session.chunks));
+            
+            const sendChunk = async (index) => {
+                const start = index * session.chunkSize;
+                const body = await fileInfo.file.slice(start, start + session.chunkSize).arrayBuffer();
+                const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', body));
+                const sha256 = Array.from(digest, byte => byte.toString(16).padStart(2, '0')).join('');
+                
+                for (let attempt = 1; ; attempt++) {
+                    let response = null;
+                    try {
+                        response = await fetch(`${api}/${session.uploadId}/chunks/${index}`, {
+                            method: 'PUT',
+                            headers: { 'X-Chunk-SHA256': sha256 },
+                            body: body
+                        });
+                    } catch (error) {
+                        // Connection dropped: send the chunk again
+                    }
+                    if (response && response.ok) {
+                        return;
+                    }
+                    if (response && (response.status === 404 || response.status === 409)) {
+                        throw new Error(`Upload session ended (${response.status})`);
+                    }
+                    if (attempt >= CHUNK_RETRIES) {
+                        throw new Error(`Chunk ${index} failed after ${attempt} attempts`);
+                    }
+                    await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** (attempt - 1)));
+                }
+            };
+            
+            const worker = async () => {
+                while (missing.length > 0) {
+                    await sendChunk(missing.shift());
+                    sent++;
+                    updateFileStatus(fileInfo.id, 'Uploading', Math.round(100 * sent / session.chunks));
+                }
+            };
+            await Promise.all(Array.from({ length: PARALLEL_CHUNKS }, worker));
+            
+            updateFileStatus(fileInfo.id, 'Processing', 100);
+            let response = await fetch(`${api}/${session.uploadId}/finalize`, { method: 'POST' });
+            // 409 while another request is still processing it: ask again until it is done
+            while (response.status === 409) {
+                const current = await (await fetch(`${api}/${session.uploadId}`)).json();
+                if (current.status !== 'processing') {
+                    break;
+                }
+                await new Promise(resolve => setTimeout(resolve, 5000));
+                response = await fetch(`${api}/${session.uploadId}/finalize`, { method: 'POST' });
+            }
+            if (!response.ok) {
+                return false;
+            }
+            localStorage.removeItem(resumeKey);
+            const result = await response.json();
+            return result.status === 'processed';
+        } catch (error) {
+            console.error(`Resumable upload of ${fileInfo.name} stopped:`, error);
+            return false;
+        }
+    }
+
     function updateUploadButton() {
         uploadBtn.disabled = uploadQueue.length === 0;
     }
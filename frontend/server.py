@@ -1,51 +1,282 @@
 #!/usr/bin/env python3
 """
 Simple HTTP server with URL rewriting for EduAssist frontend
+
+Two modes are available:
+- development (default): serves files straight from disk, no caching
+- production (--production or FRONTEND_MODE=production): serves every asset
+  from an in-memory cache with precompressed gzip/brotli variants,
+  content-hash cache-busting and long-lived Cache-Control headers
 """
 
+import argparse
+import gzip
+import hashlib
 import http.server
-import socketserver
+import mimetypes
+import re
 import urllib.parse
 import os
+from email.utils import formatdate
 from pathlib import Path
 
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+FRONTEND_DIR = Path(__file__).resolve().parent
+
+# Pretty routes served without the .html extension
+PRETTY_ROUTES = {
+    '/quiz': '/quiz.html',
+    '/chat': '/chat.html',
+    '/upload': '/index.html',
+    '/flashcards': '/flashcards.html',
+    '/signup': '/signup.html',
+}
+
+# Files the production cache serves; anything else under the frontend directory
+# (server code, bytecode, docs, dotfiles) stays private
+WEB_ASSET_SUFFIXES = {
+    '.html', '.css', '.js', '.mjs', '.json', '.map',
+    '.svg', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico',
+    '.woff', '.woff2', '.ttf', '.otf',
+}
+
+# Only text-like assets are worth compressing
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 512
+
+# Matches asset references in HTML, e.g. href="assets/css/main.css?v=6"
+ASSET_REF_RE = re.compile(r'((?:href|src)=")(/?assets/[^"?#]+)(\?v=[^"#]*)?(")')
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+SHORT_CACHE = 'public, max-age=300'
+
+
+def rewrite_route(path):
+    """Map pretty routes to their HTML files"""
+    return PRETTY_ROUTES.get(path, path)
+
+
 class EduAssistHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def do_GET(self):
         # Parse the URL
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
-        
+
         # Handle root path - redirect to landing page
         if path == '/':
             self.send_response(302)
             self.send_header('Location', '/landing.html')
             self.end_headers()
             return
-        
+
         # Handle routes without .html extension
-        elif path == '/quiz':
-            path = '/quiz.html'
-        elif path == '/chat':
-            path = '/chat.html'
-        elif path == '/upload':
-            path = '/index.html'
-        elif path == '/flashcards':
-            path = '/flashcards.html'
-        elif path == '/signup':
-            path = '/signup.html'
-            
+        path = rewrite_route(path)
+
         # Update the path
         self.path = path
-        
+
         # Call the parent handler
         return super().do_GET()
 
-def run_server(port=3001):
+
+class CachedAsset:
+    """A single frontend file held in memory with its encoded variants.
+
+    Each variant has its own strong ETag, since their bytes differ.
+    """
+
+    def __init__(self, body, content_type, digest):
+        self.content_type = content_type
+        self.digest = digest
+        self.variants = {'identity': body}
+
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(body) >= MIN_COMPRESS_SIZE:
+            gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gzipped) < len(body):
+                self.variants['gzip'] = gzipped
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants['br'] = compressed
+
+    def etag(self, encoding):
+        if encoding == 'identity':
+            return f'"{self.digest}"'
+        return f'"{self.digest}-{encoding}"'
+
+    def negotiate(self, accept_encoding):
+        """Pick the smallest variant the client accepts"""
+        accepted = {token.split(';')[0].strip() for token in accept_encoding.lower().split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and encoding in accepted:
+                return encoding, self.variants[encoding]
+        return 'identity', self.variants['identity']
+
+
+class AssetCache:
+    """Loads the whole frontend into memory once at startup"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.assets = {}
+        self.hashes = {}
+        self.load()
+
+    def load(self):
+        files = [p for p in self.root.rglob('*') if p.is_file() and self._is_web_asset(p)]
+
+        # Hash static assets first so HTML can reference them by content hash
+        pages = []
+        for file_path in files:
+            url_path = '/' + file_path.relative_to(self.root).as_posix()
+            if file_path.suffix == '.html':
+                pages.append((url_path, file_path))
+                continue
+            body = file_path.read_bytes()
+            digest = hashlib.sha256(body).hexdigest()[:12]
+            self.hashes[url_path] = digest
+            self.assets[url_path] = CachedAsset(body, self._content_type(file_path), digest)
+
+        for url_path, file_path in pages:
+            html = file_path.read_text(encoding='utf-8')
+            body = ASSET_REF_RE.sub(self._versioned_ref, html).encode('utf-8')
+            digest = hashlib.sha256(body).hexdigest()[:12]
+            self.assets[url_path] = CachedAsset(body, 'text/html; charset=utf-8', digest)
+
+    def _is_web_asset(self, file_path):
+        parts = file_path.relative_to(self.root).parts
+        if any(part.startswith('.') or part == '__pycache__' for part in parts):
+            return False
+        return file_path.suffix.lower() in WEB_ASSET_SUFFIXES
+
+    def _versioned_ref(self, match):
+        prefix, ref, _, suffix = match.groups()
+        digest = self.hashes.get('/' + ref.lstrip('/'))
+        if digest is None:
+            return match.group(0)
+        return f'{prefix}{ref}?v={digest}{suffix}'
+
+    @staticmethod
+    def _content_type(file_path):
+        content_type = mimetypes.guess_type(file_path.name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        return content_type
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def is_current_version(self, path, version):
+        return version is not None and self.hashes.get(path) == version
+
+    @property
+    def total_bytes(self):
+        return sum(len(v) for asset in self.assets.values() for v in asset.variants.values())
+
+
+class ProductionRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the frontend from an AssetCache, never touching the disk"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'EduAssistFrontend'
+    cache = None
+
+    def do_GET(self):
+        self._serve(include_body=True)
+
+    def do_HEAD(self):
+        self._serve(include_body=False)
+
+    def _serve(self, include_body):
+        parsed_path = urllib.parse.urlparse(self.path)
+        path = urllib.parse.unquote(parsed_path.path)
+
+        # Handle root path - redirect to landing page
+        if path == '/':
+            self.send_response(302)
+            self.send_header('Location', '/landing.html')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        path = rewrite_route(path)
+        asset = self.cache.get(path)
+        if asset is None:
+            self.send_error(404, 'File not found')
+            return
+
+        version = urllib.parse.parse_qs(parsed_path.query).get('v', [None])[0]
+        if asset.content_type.startswith('text/html'):
+            cache_control = REVALIDATE_CACHE
+        elif self.cache.is_current_version(path, version):
+            cache_control = IMMUTABLE_CACHE
+        else:
+            cache_control = SHORT_CACHE
+
+        encoding, body = asset.negotiate(self.headers.get('Accept-Encoding', ''))
+        etag = asset.etag(encoding)
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Last-Modified', self.server.started_at)
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Per-request logging to stderr is the bottleneck under load
+        pass
+
+
+class EduAssistHTTPServer(http.server.ThreadingHTTPServer):
+    """One thread per connection so a slow client never blocks the others"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    # A whole classroom connects at once; the default backlog of 5 drops SYNs
+    request_queue_size = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.started_at = formatdate(usegmt=True)
+
+
+def run_server(port=3001, production=False):
     """Run the EduAssist frontend server"""
-    os.chdir(Path(__file__).parent)
-    
-    with socketserver.TCPServer(("", port), EduAssistHTTPRequestHandler) as httpd:
+    os.chdir(FRONTEND_DIR)
+
+    if production:
+        ProductionRequestHandler.cache = AssetCache(FRONTEND_DIR)
+        handler = ProductionRequestHandler
+    else:
+        handler = EduAssistHTTPRequestHandler
+
+    with EduAssistHTTPServer(("", port), handler) as httpd:
         print(f"EduAssist Frontend Server running at http://localhost:{port}/")
+        if production:
+            cache = ProductionRequestHandler.cache
+            print(f"Mode: production ({len(cache.assets)} assets cached, "
+                  f"{cache.total_bytes / 1024:.0f} KiB in memory, brotli {'on' if brotli else 'off'})")
+        else:
+            print(f"Mode: development (files served from disk)")
         print(f"Pages available:")
         print(f"   - Landing: http://localhost:{port}/")
         print(f"   - Login: http://localhost:{port}/login.html")
@@ -56,11 +287,17 @@ def run_server(port=3001):
         print(f"   - Flashcards: http://localhost:{port}/flashcards")
         print(f"\nBackend should be running at http://localhost:8000/")
         print(f"Press Ctrl+C to stop the server")
-        
+
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print(f"\nServer stopped")
 
 if __name__ == "__main__":
-    run_server()
+    parser = argparse.ArgumentParser(description="EduAssist frontend server")
+    parser.add_argument("--port", type=int, default=int(os.getenv("FRONTEND_PORT", "3001")))
+    parser.add_argument("--production", action="store_true",
+                        default=os.getenv("FRONTEND_MODE", "").lower() == "production",
+                        help="serve from an in-memory, precompressed asset cache")
+    args = parser.parse_args()
+    run_server(port=args.port, production=args.production)